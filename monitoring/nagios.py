@@ -36,7 +36,10 @@ options:
                "silence_nagios", "unsilence_nagios", "command" ]
   host:
     description:
-      - Host to operate on in Nagios.
+      - Host to operate on in Nagios. A list, or hosts separated by commas,
+        may be given to act on several hosts in one task.
+      - Shell-style patterns such as C(web*) are expanded against the hosts
+        in the Nagios object cache.
     required: false
     default: null
   cmdfile:
@@ -45,6 +48,41 @@ options:
         Only required if auto-detection fails.
     required: false
     default: auto-detected
+  config_file:
+    description:
+      - Path to the main Nagios configuration, from which the command file,
+        object cache, status file and Livestatus socket are read when they
+        are not given. Only required if auto-detection fails.
+    required: false
+    default: auto-detected
+    version_added: "1.9"
+  transport:
+    description:
+      - How commands reach Nagios. C(fifo) writes them to the command file.
+        C(livestatus) sends them over the MK Livestatus socket, which also
+        lets the module read the current notification and downtime state
+        instead of the status file, and confirm downtimes with C(verify).
+    required: false
+    default: fifo
+    choices: [ "fifo", "livestatus" ]
+    version_added: "1.9"
+  livestatus_socket:
+    description:
+      - Path to the MK Livestatus unix socket.
+        Only required when C(transport=livestatus) and auto-detection from
+        the livestatus C(broker_module) line of the main configuration fails.
+    required: false
+    default: auto-detected
+    version_added: "1.9"
+  verify:
+    description:
+      - After scheduling downtime over Livestatus, query the downtimes
+        Nagios holds and fail unless every one that was sent is there.
+        Only usable with C(transport=livestatus).
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+    version_added: "1.9"
   author:
     description:
      - Author to leave downtime comments as.
@@ -62,6 +100,8 @@ options:
       - What to manage downtime/alerts for. Separate multiple services with commas.
         C(service) is an alias for C(services).
         B(Required) option when using the C(downtime), C(enable_alerts), and C(disable_alerts) actions.
+      - Shell-style patterns such as C(disk*) are expanded against the
+        services each host has in the Nagios object cache.
     aliases: [ "service" ]
     required: true
     default: null
@@ -72,6 +112,42 @@ options:
         B(Required) option when using the C(command) action.
     required: true
     default: null
+  object_cache_file:
+    description:
+      - Path to the Nagios object cache, used to expand host and service
+        patterns. Only required if auto-detection fails.
+    required: false
+    default: auto-detected
+    version_added: "1.9"
+  status_file:
+    description:
+      - Path to the Nagios status file, read by C(skip_unchanged).
+        Only required if auto-detection fails.
+    required: false
+    default: auto-detected
+    version_added: "1.9"
+  skip_unchanged:
+    description:
+      - Do not send commands that would change nothing, such as disabling
+        notifications that are already disabled or scheduling downtime
+        already covered by an existing one, and do not count them as a
+        change. The state is read from the status file, or from Livestatus
+        with C(transport=livestatus).
+      - Nagios rewrites the status file only every C(status_update_interval),
+        so nothing is skipped while it is older than the last write to the
+        command file.
+    required: false
+    default: "no"
+    choices: [ "yes", "no" ]
+    version_added: "1.9"
+  cache_dir:
+    description:
+      - Directory in which the parsed main configuration, object cache and
+        status file are kept, so that later tasks reuse them until one of
+        the files they were read from changes instead of parsing them again.
+    required: false
+    default: null
+    version_added: "1.9"
 
 author: Tim Bielawa
 requirements: [ "Nagios" ]
@@ -102,9 +178,20 @@ EXAMPLES = '''
 # silence ALL alerts
 - nagios: action=silence host={{ inventory_hostname }}
 
+# put every web server into downtime in one task
+- nagios: action=downtime minutes=60 service=all host={{ groups['webservers'] | join(',') }}
+
+# disable the disk alerts of every database server,
+# leaving out those that are already disabled
+- nagios: action=disable_alerts service=disk* host=db* skip_unchanged=yes
+
 # unsilence all alerts
 - nagios: action=unsilence host={{ inventory_hostname }}
 
+# schedule downtime through Livestatus and wait for Nagios to confirm it
+- nagios: action=downtime minutes=60 service=all host={{ inventory_hostname }}
+          transport=livestatus livestatus_socket=/var/lib/nagios/rw/live verify=yes
+
 # SHUT UP NAGIOS
 - nagios: action=silence_nagios
 
@@ -116,14 +203,29 @@ EXAMPLES = '''
 '''
 
 import ConfigParser
+import fnmatch
+import hashlib
+import socket
+import tempfile
 import types
 import time
 import os.path
 
+try:
+    from select import PIPE_BUF
+except ImportError:
+    # the smallest value POSIX allows
+    PIPE_BUF = 512
+
+# seconds to wait on the Livestatus socket
+LIVESTATUS_TIMEOUT = 10
+# seconds to wait for Nagios to show downtimes sent with verify
+VERIFY_TIMEOUT = 5
+
 ######################################################################
 
 
-def which_cmdfile():
+def which_cfgfile():
     locations = [
         # rhel
         '/etc/nagios/nagios.cfg',
@@ -150,12 +252,527 @@ def which_cmdfile():
 
     for path in locations:
         if os.path.exists(path):
-            for line in open(path):
-                if line.startswith('command_file'):
-                    return line.split('=')[1].strip()
+            return path
 
     return None
 
+
+def file_stamp(path):
+    st = os.stat(path)
+    return [st.st_mtime, st.st_size]
+
+
+def load_cached(cache_dir, key, parse):
+    """
+    Return the data parse() produces, reusing what an earlier call
+    stored in cache_dir under the same key for as long as none of the
+    files it was read from has changed.
+
+    parse returns the data along with the stamps of the files and
+    directories it read, taken before reading them.
+    """
+
+    cache_path = None
+    if cache_dir:
+        cache_dir = os.path.expanduser(cache_dir)
+        cache_path = os.path.join(cache_dir, 'nagios-%s.json' % hashlib.sha1(key).hexdigest())
+        try:
+            fp = open(cache_path)
+            try:
+                entry = json.load(fp)
+            finally:
+                fp.close()
+            for path, stamp in entry['sources'].items():
+                if file_stamp(path) != stamp:
+                    break
+            else:
+                return entry['data']
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+
+    data, sources = parse()
+
+    if cache_path is not None:
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir)
+            fp = os.fdopen(fd, 'w')
+            try:
+                json.dump({'sources': sources, 'data': data}, fp)
+            finally:
+                fp.close()
+            os.rename(tmp_path, cache_path)
+        except (IOError, OSError):
+            # the cache only saves work, parsing again is fine
+            pass
+    return data
+
+
+def is_pattern(name):
+    return any(c in name for c in '*?[')
+
+
+def resolve_names(patterns, names):
+    """
+    Expand the shell-style patterns among the given names against
+    the known names, keeping plain names as they are and the order
+    in which they were given.
+    """
+
+    resolved = []
+    for pattern in patterns:
+        if is_pattern(pattern):
+            matches = sorted(fnmatch.filter(names or [], pattern))
+        else:
+            matches = [pattern]
+        for name in matches:
+            if name not in resolved:
+                resolved.append(name)
+    return resolved
+
+
+def parse_blocks(path, separator=None):
+    """
+    Yield the type and attributes of every block in a Nagios object
+    cache, whose attributes are separated from their values by
+    whitespace, or in a status file, where the separator is '='.
+    """
+
+    kind = None
+    attrs = None
+    fp = open(path)
+    try:
+        for line in fp:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if kind is None:
+                if line.endswith('{'):
+                    # "define host {" or "hoststatus {"
+                    kind = line[:-1].split()[-1]
+                    attrs = {}
+            elif line == '}':
+                yield kind, attrs
+                kind = None
+            else:
+                parts = line.split(separator, 1)
+                if len(parts) == 2:
+                    attrs[parts[0].strip()] = parts[1].strip()
+    finally:
+        fp.close()
+
+
+def parse_object_cache(path):
+    hosts = {}
+    for kind, attrs in parse_blocks(path):
+        if kind == 'host' and 'host_name' in attrs:
+            hosts.setdefault(attrs['host_name'], [])
+        elif kind == 'service' and 'host_name' in attrs:
+            hosts.setdefault(attrs['host_name'], []).append(attrs.get('service_description'))
+    return {'hosts': hosts}
+
+
+def parse_status_file(path):
+    status = {'notifications': None, 'hosts': {}, 'services': {}, 'downtimes': {}}
+    for kind, attrs in parse_blocks(path, '='):
+        host = attrs.get('host_name')
+        if kind == 'programstatus':
+            status['notifications'] = attrs.get('enable_notifications') == '1'
+        elif kind == 'hoststatus':
+            status['hosts'][host] = attrs.get('notifications_enabled') == '1'
+        elif kind == 'servicestatus':
+            status['services'].setdefault(host, {})[attrs.get('service_description')] = \
+                attrs.get('notifications_enabled') == '1'
+        elif kind in ('hostdowntime', 'servicedowntime'):
+            # host downtimes are filed under the empty service name
+            svc = attrs.get('service_description', '')
+            status['downtimes'].setdefault(host, {}).setdefault(svc, []).append(
+                [int(attrs.get('start_time', 0)), int(attrs.get('end_time', 0))])
+    return status
+
+######################################################################
+
+
+class NagiosConfig(object):
+    """
+    The main Nagios configuration and the object definitions of the
+    files it includes through cfg_file and cfg_dir.
+
+    The settings of the main file are read when first needed, and the
+    included files only when the hosts and services they define are.
+    With a cache directory both are kept on disk together with the
+    stamps of every file and directory they were read from, and reused
+    until one of those changes.
+    """
+
+    # settings that may be given more than once
+    MULTI_VALUED = ('cfg_file', 'cfg_dir', 'broker_module')
+
+    def __init__(self, path, cache_dir=None):
+        self.path = path
+        self.cache_dir = cache_dir
+        self._settings = None
+        self._objects = None
+
+    def _parse_settings(self):
+        sources = {self.path: file_stamp(self.path)}
+        settings = {}
+        for line in open(self.path):
+            line = line.strip()
+            if not line or line[0] in '#;' or '=' not in line:
+                continue
+            key, value = [x.strip() for x in line.split('=', 1)]
+            if key in self.MULTI_VALUED:
+                settings.setdefault(key, []).append(value)
+            else:
+                settings[key] = value
+        return settings, sources
+
+    def _parse_objects(self):
+        # the main file decides which files are included
+        sources = {self.path: file_stamp(self.path)}
+        paths = self.include_paths('cfg_file')
+        for top in self.include_paths('cfg_dir'):
+            for root, dirs, names in os.walk(top):
+                # a file added to a directory changes its mtime
+                sources[root] = file_stamp(root)
+                dirs.sort()
+                paths.extend(os.path.join(root, n) for n in sorted(names) if n.endswith('.cfg'))
+
+        hosts = {}
+        for path in paths:
+            try:
+                sources[path] = file_stamp(path)
+                blocks = list(parse_blocks(path))
+            except (IOError, OSError):
+                continue
+            for kind, attrs in blocks:
+                # drop inline comments
+                attrs = dict((k, v.split(';')[0].strip()) for k, v in attrs.items())
+                if attrs.get('register') == '0':
+                    continue
+                if kind == 'host' and 'host_name' in attrs:
+                    hosts.setdefault(attrs['host_name'], [])
+                elif kind == 'service' and 'service_description' in attrs:
+                    for host in attrs.get('host_name', '').split(','):
+                        host = host.strip()
+                        if host and not host.startswith('!'):
+                            hosts.setdefault(host, []).append(attrs['service_description'])
+        return {'hosts': hosts}, sources
+
+    @property
+    def settings(self):
+        if self._settings is None:
+            self._settings = load_cached(self.cache_dir, 'cfg:' + self.path, self._parse_settings)
+        return self._settings
+
+    @property
+    def objects(self):
+        """
+        Hosts and services in the form of parse_object_cache. Services
+        assigned through host groups are not resolved.
+        """
+
+        if self._objects is None:
+            self._objects = load_cached(self.cache_dir, 'objects:' + self.path, self._parse_objects)
+        return self._objects
+
+    def get(self, key):
+        return self.settings.get(key)
+
+    def include_paths(self, key):
+        base = os.path.dirname(self.path)
+        return [os.path.join(base, value) for value in self.settings.get(key, [])]
+
+    def livestatus_socket(self):
+        """
+        The socket path given to the livestatus broker module.
+        """
+
+        for line in self.settings.get('broker_module', []):
+            args = line.split()
+            if 'livestatus' in os.path.basename(args[0]):
+                for arg in args[1:]:
+                    if '=' not in arg:
+                        return arg
+        return None
+
+######################################################################
+
+
+class FifoTransport(object):
+    """
+    Writes commands to the Nagios command file.
+
+    The file is opened once and each write carries as many whole
+    command lines as fit in PIPE_BUF bytes, the most a write to a
+    FIFO is guaranteed to deliver atomically, so that commands are
+    never split or interleaved with those of other writers.
+    """
+
+    def __init__(self, module, cmdfile):
+        self.module = module
+        self.cmdfile = cmdfile
+
+    def send(self, commands):
+        chunks = []
+        chunk = []
+        size = 0
+        for cmd in commands:
+            if chunk and size + len(cmd) > PIPE_BUF:
+                chunks.append(chunk)
+                chunk = []
+                size = 0
+            chunk.append(cmd)
+            size += len(cmd)
+        if chunk:
+            chunks.append(chunk)
+
+        sent = []
+        if not chunks:
+            return sent
+
+        try:
+            fp = open(self.cmdfile, 'w')
+            try:
+                for chunk in chunks:
+                    data = ''.join(chunk)
+                    while data:
+                        data = data[os.write(fp.fileno(), data):]
+                    sent.extend(cmd.strip() for cmd in chunk)
+            finally:
+                fp.close()
+        except (IOError, OSError):
+            self.module.fail_json(msg='unable to write to nagios command file',
+                                  cmdfile=self.cmdfile,
+                                  nagios_commands=sent)
+        return sent
+
+
+class LivestatusTransport(object):
+    """
+    Talks to Nagios through an MK Livestatus unix socket.
+
+    All commands are pipelined over a single connection, and queries
+    are sent together over one keep-alive connection, each answer
+    being read back by the length in its fixed16 response header.
+    Unlike the command file, queries show the state Nagios holds now
+    rather than what it last wrote to the status file.
+    """
+
+    def __init__(self, module, path, timeout=LIVESTATUS_TIMEOUT):
+        self.module = module
+        self.path = path
+        self.timeout = timeout
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except socket.error, e:
+            sock.close()
+            self.module.fail_json(msg='unable to connect to the livestatus socket: %s' % e,
+                                  livestatus_socket=self.path)
+        return sock
+
+    def _recv(self, sock, size):
+        data = ''
+        while len(data) < size:
+            chunk = sock.recv(size - len(data))
+            if not chunk:
+                raise socket.error('livestatus closed the connection')
+            data += chunk
+        return data
+
+    def send(self, commands):
+        if not commands:
+            return []
+        sent = [cmd.strip() for cmd in commands]
+        # an empty line ends each request, commands included
+        data = ''.join('COMMAND %s\n\n' % cmd for cmd in sent)
+        sock = self._connect()
+        try:
+            try:
+                sock.sendall(data)
+                sock.shutdown(socket.SHUT_WR)
+                # commands have no answer; wait for livestatus to finish
+                while sock.recv(4096):
+                    pass
+            except socket.error, e:
+                self.module.fail_json(msg='unable to send commands to livestatus: %s' % e,
+                                      livestatus_socket=self.path)
+        finally:
+            sock.close()
+        return sent
+
+    def query(self, *queries):
+        """
+        Run the given GET queries and return the rows of each.
+        """
+
+        data = ''.join('%s\nOutputFormat: json\nResponseHeader: fixed16\nKeepAlive: on\n\n' % q.strip()
+                       for q in queries)
+        results = []
+        sock = self._connect()
+        try:
+            try:
+                sock.sendall(data)
+                for q in queries:
+                    header = self._recv(sock, 16)
+                    body = self._recv(sock, int(header[4:15]))
+                    if header[:3] != '200':
+                        self.module.fail_json(msg='livestatus query failed: %s' % body.strip(),
+                                              query=q)
+                    results.append(json.loads(body))
+            except (socket.error, ValueError), e:
+                self.module.fail_json(msg='unable to query livestatus: %s' % e,
+                                      livestatus_socket=self.path)
+        finally:
+            sock.close()
+        return results
+
+    def status(self):
+        """
+        The notification and downtime state in the form of
+        parse_status_file.
+        """
+
+        program, hosts, services, downtimes = self.query(
+            'GET status\nColumns: enable_notifications',
+            'GET hosts\nColumns: name notifications_enabled',
+            'GET services\nColumns: host_name description notifications_enabled',
+            'GET downtimes\nColumns: host_name service_description start_time end_time')
+
+        status = {'notifications': None, 'hosts': {}, 'services': {}, 'downtimes': {}}
+        if program:
+            status['notifications'] = program[0][0] == 1
+        for host, enabled in hosts:
+            status['hosts'][host] = enabled == 1
+        for host, svc, enabled in services:
+            status['services'].setdefault(host, {})[svc] = enabled == 1
+        for host, svc, start, end in downtimes:
+            status['downtimes'].setdefault(host, {}).setdefault(svc, []).append([start, end])
+        return status
+
+######################################################################
+
+
+class NagiosIndex(object):
+    """
+    Hosts and services known to Nagios, with their notification and
+    downtime state, read from its object cache and status file.
+
+    Each file is parsed only when first needed. With a cache directory
+    the parsed form is also kept on disk, stamped with the mtime and
+    size of its source, so that later tasks reuse it until Nagios
+    rewrites the file. Given a Livestatus transport, the state is
+    queried from it instead of read from the status file, and given
+    the main configuration, hosts and services are read from the files
+    it includes when the object cache cannot be read.
+    """
+
+    def __init__(self, object_cache_file, status_file, cache_dir=None, live=None, config=None):
+        self.object_cache_file = object_cache_file
+        self.status_file = status_file
+        self.cache_dir = cache_dir
+        self.live = live
+        self.config = config
+        self._objects = None
+        self._status = None
+
+    def _load(self, path, parse):
+        """
+        The parsed contents of path, from the cache when it is still
+        current, or None when the file cannot be read.
+        """
+
+        if not path:
+            return None
+
+        def read():
+            sources = {path: file_stamp(path)}
+            return parse(path), sources
+
+        try:
+            return load_cached(self.cache_dir, path, read)
+        except (IOError, OSError, ValueError):
+            return None
+
+    @property
+    def objects(self):
+        if self._objects is None:
+            self._objects = self._load(self.object_cache_file, parse_object_cache)
+            if self._objects is None and self.config is not None:
+                self._objects = self.config.objects
+            self._objects = self._objects or {}
+        return self._objects
+
+    @property
+    def status(self):
+        if self._status is None:
+            if self.live is not None:
+                self._status = self.live.status()
+            else:
+                self._status = self._load(self.status_file, parse_status_file) or {}
+        return self._status
+
+    def host_names(self):
+        if 'hosts' not in self.objects:
+            return None
+        return self.objects['hosts'].keys()
+
+    def service_names(self, host):
+        if 'hosts' not in self.objects:
+            return None
+        return self.objects['hosts'].get(host, [])
+
+    def host_services(self, host):
+        """
+        The services of host that the status file holds a state for.
+        """
+
+        return self.status.get('services', {}).get(host, {}).keys()
+
+    def notifications_enabled(self, host=None, svc=None):
+        """
+        Whether notifications are enabled for the service, the host
+        or, without either, globally; None when this is not known.
+        """
+
+        if host is None:
+            return self.status.get('notifications')
+        if svc is None:
+            return self.status.get('hosts', {}).get(host)
+        return self.status.get('services', {}).get(host, {}).get(svc)
+
+    def status_is_current(self, cmdfile):
+        """
+        Whether the state includes every command sent so far: always
+        when it comes from Livestatus, and for the status file only
+        when it was written after the command file last was.
+        """
+
+        if self.live is not None:
+            return True
+        try:
+            return os.stat(self.status_file).st_mtime >= os.stat(cmdfile).st_mtime
+        except (OSError, TypeError):
+            return False
+
+    def in_downtime(self, host, svc, end):
+        """
+        Whether the host, or its service, is in a downtime that has
+        started and lasts until end at least.
+        """
+
+        now = time.time()
+        for start, stop in self.status.get('downtimes', {}).get(host, {}).get(svc or '', []):
+            if start <= now and stop >= end:
+                return True
+        return False
+
 ######################################################################
 
 
@@ -175,14 +792,36 @@ def main():
         argument_spec=dict(
             action=dict(required=True, default=None, choices=ACTION_CHOICES),
             author=dict(default='Ansible'),
-            host=dict(required=False, default=None),
+            host=dict(required=False, default=None, type='list'),
             minutes=dict(default=30),
-            cmdfile=dict(default=which_cmdfile()),
-            services=dict(default=None, aliases=['service']),
+            cmdfile=dict(default=None),
+            services=dict(default=None, aliases=['service'], type='list'),
             command=dict(required=False, default=None),
-            )
+            config_file=dict(default=None),
+            object_cache_file=dict(default=None),
+            status_file=dict(default=None),
+            cache_dir=dict(default=None),
+            transport=dict(default='fifo', choices=['fifo', 'livestatus']),
+            livestatus_socket=dict(default=None),
+            verify=dict(default=False, type='bool'),
+            skip_unchanged=dict(default=False, type='bool'),
+            ),
+        supports_check_mode=True
         )
 
+    # fill in the paths that were not given from the main configuration
+    config = None
+    config_file = module.params['config_file'] or which_cfgfile()
+    if config_file:
+        config = NagiosConfig(config_file, module.params['cache_dir'])
+        for param, key in (('cmdfile', 'command_file'),
+                           ('object_cache_file', 'object_cache_file'),
+                           ('status_file', 'status_file')):
+            if module.params[param] is None:
+                module.params[param] = config.get(key)
+        if module.params['livestatus_socket'] is None and module.params['transport'] == 'livestatus':
+            module.params['livestatus_socket'] = config.livestatus_socket()
+
     action = module.params['action']
     host = module.params['host']
     minutes = module.params['minutes']
@@ -226,15 +865,17 @@ def main():
         if not command:
             module.fail_json(msg='no command passed for command action')
     ##################################################################
-    if not cmdfile:
-        module.fail_json('unable to locate nagios.cfg')
+    if module.params['transport'] == 'fifo':
+        if not cmdfile:
+            module.fail_json(msg='unable to locate nagios.cfg')
+        if module.params['verify']:
+            module.fail_json(msg='verify needs transport=livestatus')
+    elif not module.params['livestatus_socket']:
+        module.fail_json(msg='unable to locate the livestatus socket, set livestatus_socket')
 
     ##################################################################
-    ansible_nagios = Nagios(module, **module.params)
-    if module.check_mode:
-        module.exit_json(changed=True)
-    else:
-        ansible_nagios.act()
+    ansible_nagios = Nagios(module, config, **module.params)
+    ansible_nagios.act()
     ##################################################################
 
 
@@ -254,21 +895,40 @@ class Nagios(object):
     service argument should be passed as a list.
     """
 
-    def __init__(self, module, **kwargs):
+    def __init__(self, module, config=None, **kwargs):
         self.module = module
         self.action = kwargs['action']
         self.author = kwargs['author']
-        self.host = kwargs['host']
+        self.hosts = kwargs['host']
         self.minutes = int(kwargs['minutes'])
         self.cmdfile = kwargs['cmdfile']
         self.command = kwargs['command']
 
-        if (kwargs['services'] is None) or (kwargs['services'] == 'host') or (kwargs['services'] == 'all'):
+        if kwargs['services'] in (['host'], ['all']):
+            self.services = kwargs['services'][0]
+        else:
             self.services = kwargs['services']
+
+        self.verify = kwargs['verify']
+        self.skip_unchanged = kwargs['skip_unchanged']
+        self.status_current = None
+
+        live = None
+        if kwargs['transport'] == 'livestatus':
+            live = LivestatusTransport(module, kwargs['livestatus_socket'])
+            self.transport = live
         else:
-            self.services = kwargs['services'].split(',')
+            self.transport = FifoTransport(module, self.cmdfile)
+
+        self.index = NagiosIndex(kwargs['object_cache_file'],
+                                 kwargs['status_file'],
+                                 kwargs['cache_dir'],
+                                 live,
+                                 config)
 
+        self.command_queue = []
         self.command_results = []
+        self.command_skipped = []
 
     def _now(self):
         """
@@ -279,18 +939,98 @@ class Nagios(object):
 
     def _write_command(self, cmd):
         """
-        Write the given command to the Nagios command file
+        Queue the given command for the Nagios command file. Queued
+        commands are written by _flush_commands.
         """
 
-        try:
-            fp = open(self.cmdfile, 'w')
-            fp.write(cmd)
-            fp.flush()
-            fp.close()
-            self.command_results.append(cmd.strip())
-        except IOError:
-            self.module.fail_json(msg='unable to write to nagios command file',
-                                  cmdfile=self.cmdfile)
+        self.command_queue.append(cmd)
+
+    def _skip(self, cmd, host=None, svc=None, minutes=None):
+        """
+        Whether, with skip_unchanged, the known state shows that the
+        command would change nothing, in which case it is noted as
+        skipped rather than sent. Commands about state that is not
+        known, or that may lag behind commands already sent, are always
+        sent.
+        """
+
+        if not self.skip_unchanged:
+            return False
+        if self.status_current is None:
+            self.status_current = self.index.status_is_current(self.cmdfile)
+        if not self.status_current:
+            return False
+
+        index = self.index
+        enable = cmd.startswith('ENABLE_')
+        if cmd in ('SCHEDULE_HOST_DOWNTIME', 'SCHEDULE_SVC_DOWNTIME'):
+            noop = index.in_downtime(host, svc, self._now() + minutes * 60)
+        elif cmd == 'SCHEDULE_HOST_SVC_DOWNTIME':
+            services = index.host_services(host)
+            noop = bool(services) and all(
+                index.in_downtime(host, s, self._now() + minutes * 60) for s in services)
+        elif cmd in ('ENABLE_HOST_SVC_NOTIFICATIONS', 'DISABLE_HOST_SVC_NOTIFICATIONS'):
+            services = index.host_services(host)
+            noop = bool(services) and all(
+                index.notifications_enabled(host, s) is enable for s in services)
+        elif cmd in ('ENABLE_HOST_NOTIFICATIONS', 'DISABLE_HOST_NOTIFICATIONS',
+                     'ENABLE_SVC_NOTIFICATIONS', 'DISABLE_SVC_NOTIFICATIONS'):
+            noop = index.notifications_enabled(host, svc) is enable
+        elif cmd in ('ENABLE_NOTIFICATIONS', 'DISABLE_NOTIFICATIONS'):
+            noop = index.notifications_enabled() is enable
+        else:
+            noop = False
+
+        if noop:
+            self.command_skipped.append(';'.join(x for x in (cmd, host, svc) if x is not None))
+        return noop
+
+    def _flush_commands(self):
+        """
+        Send all queued commands through the transport
+        """
+
+        self.command_results.extend(self.transport.send(self.command_queue))
+        self.command_queue = []
+
+    def _verify_downtimes(self, commands):
+        """
+        Return the downtime commands among those sent for which Nagios
+        does not show a downtime, waiting up to VERIFY_TIMEOUT seconds
+        for them to appear.
+        """
+
+        expected = []
+        for cmd in commands:
+            parts = cmd.split(';')
+            name = parts[0].split()[-1]
+            if name == 'SCHEDULE_HOST_DOWNTIME':
+                expected.append((cmd, parts[1], '', int(parts[3])))
+            elif name == 'SCHEDULE_SVC_DOWNTIME':
+                expected.append((cmd, parts[1], parts[2], int(parts[4])))
+            elif name == 'SCHEDULE_HOST_SVC_DOWNTIME':
+                # any service downtime of the host will do
+                expected.append((cmd, parts[1], None, int(parts[3])))
+        if not expected:
+            return []
+
+        author = self.author.replace('\n', ' ')
+        deadline = time.time() + VERIFY_TIMEOUT
+        while True:
+            rows = self.transport.query('GET downtimes\n'
+                                        'Columns: host_name service_description end_time\n'
+                                        'Filter: author = %s' % author)[0]
+            missing = []
+            for cmd, host, svc, end in expected:
+                for r_host, r_svc, r_end in rows:
+                    if r_host == host and r_end == end and \
+                       (r_svc == svc or (svc is None and r_svc)):
+                        break
+                else:
+                    missing.append(cmd)
+            if not missing or time.time() >= deadline:
+                return missing
+            time.sleep(0.2)
 
     def _fmt_dt_str(self, cmd, host, duration, author=None,
                     comment="Scheduling downtime", start=None,
@@ -379,6 +1119,8 @@ class Nagios(object):
 
         cmd = "SCHEDULE_SVC_DOWNTIME"
         for service in services:
+            if self._skip(cmd, host, service, minutes):
+                continue
             dt_cmd_str = self._fmt_dt_str(cmd, host, minutes, svc=service)
             self._write_command(dt_cmd_str)
 
@@ -395,6 +1137,8 @@ class Nagios(object):
         """
 
         cmd = "SCHEDULE_HOST_DOWNTIME"
+        if self._skip(cmd, host, minutes=minutes):
+            return
         dt_cmd_str = self._fmt_dt_str(cmd, host, minutes)
         self._write_command(dt_cmd_str)
 
@@ -411,6 +1155,8 @@ class Nagios(object):
         """
 
         cmd = "SCHEDULE_HOST_SVC_DOWNTIME"
+        if self._skip(cmd, host, minutes=minutes):
+            return
         dt_cmd_str = self._fmt_dt_str(cmd, host, minutes)
         self._write_command(dt_cmd_str)
 
@@ -500,6 +1246,8 @@ class Nagios(object):
         """
 
         cmd = "DISABLE_HOST_SVC_NOTIFICATIONS"
+        if self._skip(cmd, host):
+            return
         notif_str = self._fmt_notif_str(cmd, host)
         self._write_command(notif_str)
 
@@ -515,6 +1263,8 @@ class Nagios(object):
         """
 
         cmd = "DISABLE_HOST_NOTIFICATIONS"
+        if self._skip(cmd, host):
+            return
         notif_str = self._fmt_notif_str(cmd, host)
         self._write_command(notif_str)
 
@@ -531,6 +1281,8 @@ class Nagios(object):
 
         cmd = "DISABLE_SVC_NOTIFICATIONS"
         for service in services:
+            if self._skip(cmd, host, service):
+                continue
             notif_str = self._fmt_notif_str(cmd, host, svc=service)
             self._write_command(notif_str)
 
@@ -607,6 +1359,8 @@ class Nagios(object):
         """
 
         cmd = "ENABLE_HOST_NOTIFICATIONS"
+        if self._skip(cmd, host):
+            return
         notif_str = self._fmt_notif_str(cmd, host)
         self._write_command(notif_str)
 
@@ -620,6 +1374,8 @@ class Nagios(object):
         """
 
         cmd = "ENABLE_HOST_SVC_NOTIFICATIONS"
+        if self._skip(cmd, host):
+            return
         notif_str = self._fmt_notif_str(cmd, host)
         nagios_return = self._write_command(notif_str)
 
@@ -641,6 +1397,8 @@ class Nagios(object):
         nagios_return = True
         return_str_list = []
         for service in services:
+            if self._skip(cmd, host, service):
+                continue
             notif_str = self._fmt_notif_str(cmd, host, svc=service)
             nagios_return = self._write_command(notif_str) and nagios_return
             return_str_list.append(notif_str)
@@ -748,6 +1506,8 @@ class Nagios(object):
         nagios_return = True
         return_str_list = []
         for c in cmd:
+            if self._skip(c, host):
+                continue
             notif_str = self._fmt_notif_str(c, host)
             nagios_return = self._write_command(notif_str) and nagios_return
             return_str_list.append(notif_str)
@@ -776,6 +1536,8 @@ class Nagios(object):
         nagios_return = True
         return_str_list = []
         for c in cmd:
+            if self._skip(c, host):
+                continue
             notif_str = self._fmt_notif_str(c, host)
             nagios_return = self._write_command(notif_str) and nagios_return
             return_str_list.append(notif_str)
@@ -793,6 +1555,8 @@ class Nagios(object):
         This is a 'SHUT UP, NAGIOS' command
         """
         cmd = 'DISABLE_NOTIFICATIONS'
+        if self._skip(cmd):
+            return
         self._write_command(self._fmt_notif_str(cmd))
     
     def unsilence_nagios(self):
@@ -803,6 +1567,8 @@ class Nagios(object):
         This is a 'OK, NAGIOS, GO'' command
         """
         cmd = 'ENABLE_NOTIFICATIONS'
+        if self._skip(cmd):
+            return
         self._write_command(self._fmt_notif_str(cmd))
         
     def nagios_cmd(self, cmd):
@@ -820,43 +1586,90 @@ class Nagios(object):
         cmdstr = '%s %s %s' % (pre, cmd, post)
         self._write_command(cmdstr)
         
-    def act(self):
+    def resolve_hosts(self):
         """
-        Figure out what you want to do from ansible, and then do the
-        needful (at the earliest).
+        Expand the host patterns against the object cache.
+        """
+
+        # the object cache is only read when there are patterns
+        host_names = None
+        if any(is_pattern(h) for h in self.hosts):
+            host_names = self.index.host_names()
+            if host_names is None:
+                self.module.fail_json(msg='host patterns need a readable object cache',
+                                      object_cache_file=self.index.object_cache_file)
+        hosts = resolve_names(self.hosts, host_names)
+        if not hosts:
+            self.module.fail_json(msg='no hosts match %s' % ','.join(self.hosts))
+        return hosts
+
+    def resolve_services(self, host):
         """
+        Expand the service patterns against the services of host in the
+        object cache. The special host and all values are kept as is.
+        """
+
+        if self.services in ('host', 'all'):
+            return self.services
+        service_names = None
+        if any(is_pattern(s) for s in self.services):
+            service_names = self.index.service_names(host)
+            if service_names is None:
+                self.module.fail_json(msg='service patterns need a readable object cache',
+                                      object_cache_file=self.index.object_cache_file)
+        return resolve_names(self.services, service_names)
+
+    def act_host(self, host):
+        """
+        Queue the commands of a host level action for one host.
+        """
+        services = None
+        if self.services is not None:
+            services = self.resolve_services(host)
+
         # host or service downtime?
         if self.action == 'downtime':
-            if self.services == 'host':
-                self.schedule_host_downtime(self.host, self.minutes)
-            elif self.services == 'all':
-                self.schedule_host_svc_downtime(self.host, self.minutes)
+            if services == 'host':
+                self.schedule_host_downtime(host, self.minutes)
+            elif services == 'all':
+                self.schedule_host_svc_downtime(host, self.minutes)
             else:
-                self.schedule_svc_downtime(self.host,
-                                           services=self.services,
+                self.schedule_svc_downtime(host,
+                                           services=services,
                                            minutes=self.minutes)
 
         # toggle the host AND service alerts
         elif self.action == 'silence':
-            self.silence_host(self.host)
+            self.silence_host(host)
 
         elif self.action == 'unsilence':
-            self.unsilence_host(self.host)
+            self.unsilence_host(host)
 
         # toggle host/svc alerts
         elif self.action == 'enable_alerts':
-            if self.services == 'host':
-                self.enable_host_notifications(self.host)
+            if services == 'host':
+                self.enable_host_notifications(host)
             else:
-                self.enable_svc_notifications(self.host,
-                                              services=self.services)
+                self.enable_svc_notifications(host,
+                                              services=services)
 
         elif self.action == 'disable_alerts':
-            if self.services == 'host':
-                self.disable_host_notifications(self.host)
+            if services == 'host':
+                self.disable_host_notifications(host)
             else:
-                self.disable_svc_notifications(self.host,
-                                               services=self.services)
+                self.disable_svc_notifications(host,
+                                               services=services)
+
+    def act(self):
+        """
+        Figure out what you want to do from ansible, and then do the
+        needful (at the earliest).
+        """
+        if self.action in ['downtime', 'silence', 'unsilence',
+                           'enable_alerts', 'disable_alerts']:
+            for host in self.resolve_hosts():
+                self.act_host(host)
+
         elif self.action == 'silence_nagios':
             self.silence_nagios()
             
@@ -871,8 +1684,25 @@ class Nagios(object):
             self.module.fail_json(msg="unknown action specified: '%s'" % \
                                       self.action)
 
+        # commands the status file shows to be no-ops were never queued
+        changed = bool(self.command_queue)
+        if self.module.check_mode:
+            self.module.exit_json(nagios_commands=[cmd.strip() for cmd in self.command_queue],
+                                  nagios_skipped=self.command_skipped,
+                                  changed=changed)
+
+        self._flush_commands()
+
+        if self.verify:
+            missing = self._verify_downtimes(self.command_results)
+            if missing:
+                self.module.fail_json(msg='Nagios did not confirm every downtime sent',
+                                      unconfirmed=missing,
+                                      nagios_commands=self.command_results)
+
         self.module.exit_json(nagios_commands=self.command_results,
-                              changed=True)
+                              nagios_skipped=self.command_skipped,
+                              changed=changed)
 
 ######################################################################
 # import module snippets
@@ -81,7 +81,8 @@ options:
     name:
         description:
             - Unique name of maintenance window.
-        required: true
+              B(Required) unless C(maintenances) is given.
+        required: false
         default: null
     desc:
         description:
@@ -93,6 +94,29 @@ options:
             - Type of maintenance. With data collection, or without.
         required: false
         default: "true"
+    update:
+        description:
+            - Update an existing maintenance window of the same name in place
+              when its hosts, groups, type or description differ, when it is
+              not C(minutes) minutes long, or when it has already ended. A
+              window that is still open keeps its start time. Only one
+              maintenance.update call is made, and none when nothing differs.
+              Without it, an existing window is left alone.
+        required: false
+        default: "false"
+        version_added: "1.9"
+    maintenances:
+        description:
+            - List of maintenance windows to manage in one task, each a
+              dictionary with a C(name) and any of C(host_names),
+              C(host_groups), C(minutes), C(desc), C(collect_data) and
+              C(state), which default to the module options of the same name.
+              Hosts and groups of all windows are resolved with one call each,
+              and all windows are created, updated and removed with one call
+              each.
+        required: false
+        default: null
+        version_added: "1.9"
 notes:
     - Useful for setting hosts in maintenance mode before big update,
       and removing maintenance window after update.
@@ -134,6 +158,31 @@ EXAMPLES = '''
                       login_user=ansible
                       login_password=pAsSwOrD
 
+# Extend maintenance window "update" to cover the next hour,
+# or change its hosts, without recreating it
+- zabbix_maintenance: name=update
+                      host_names=www1.example.com,db1.example.com
+                      minutes=60
+                      update=yes
+                      server_url=https://monitoring.example.com
+                      login_user=ansible
+                      login_password=pAsSwOrD
+
+# Manage several maintenance windows at once
+- zabbix_maintenance:
+    server_url: https://monitoring.example.com
+    login_user: ansible
+    login_password: pAsSwOrD
+    update: yes
+    maintenances:
+      - name: web
+        host_names: [ www1.example.com, www2.example.com ]
+        minutes: 90
+      - name: office
+        host_groups: [ Office ]
+      - name: Test1
+        state: absent
+
 # Remove maintenance window named "Test1"
 - zabbix_maintenance: name=Test1
                       state=absent
@@ -152,28 +201,110 @@ except ImportError:
     HAS_ZABBIX_API = False
 
 
-def create_maintenance(zbx, group_ids, host_ids, start_time, maintenance_type, period, name, desc):
+def maintenance_params(group_ids, host_ids, start_time, maintenance_type, period, name, desc):
     end_time = start_time + period
+    return {
+        "groupids": group_ids,
+        "hostids": host_ids,
+        "name": name,
+        "maintenance_type": maintenance_type,
+        "active_since": str(start_time),
+        "active_till": str(end_time),
+        "description": desc,
+        "timeperiods":  [{
+            "timeperiod_type": "0",
+            "start_date": str(start_time),
+            "period": str(period),
+        }]
+    }
+
+
+def create_maintenance(zbx, group_ids, host_ids, start_time, maintenance_type, period, name, desc):
+    return create_maintenances(zbx, [maintenance_params(group_ids, host_ids, start_time,
+                                                        maintenance_type, period, name, desc)])
+
+
+def create_maintenances(zbx, params):
+    try:
+        zbx.maintenance.create(params)
+    except BaseException as e:
+        return 1, None, str(e)
+    return 0, None, None
+
+
+def update_maintenances(zbx, params):
+    try:
+        zbx.maintenance.update(params)
+    except BaseException as e:
+        return 1, None, str(e)
+    return 0, None, None
+
+
+def get_maintenances(zbx, names):
     try:
-        zbx.maintenance.create(
+        result = zbx.maintenance.get(
             {
-                "groupids": group_ids,
-                "hostids": host_ids,
-                "name": name,
-                "maintenance_type": maintenance_type,
-                "active_since": str(start_time),
-                "active_till": str(end_time),
-                "description": desc,
-                "timeperiods":  [{
-                    "timeperiod_type": "0",
-                    "start_date": str(start_time),
-                    "period": str(period),
-                }]
+                "output": "extend",
+                "selectGroups": ["groupid"],
+                "selectHosts": ["hostid"],
+                "selectTimeperiods": "extend",
+                "filter":
+                {
+                    "name": names,
+                }
             }
         )
     except BaseException as e:
         return 1, None, str(e)
-    return 0, None, None
+
+    return 0, dict((maintenance["name"], maintenance) for maintenance in result), None
+
+
+def diff_maintenance(maintenance, params):
+    """
+    Return the parts of an existing maintenance that differ from the
+    desired params. The window is compared by its length and anchored at
+    its existing start, so that rerunning the same task while the window
+    is still open finds it unchanged; it only differs when its length
+    differs or it has already ended.
+    """
+    changes = []
+    if set(host["hostid"] for host in maintenance.get("hosts", [])) != set(params["hostids"]):
+        changes.append("hosts")
+    if set(group["groupid"] for group in maintenance.get("groups", [])) != set(params["groupids"]):
+        changes.append("groups")
+    if str(maintenance.get("maintenance_type")) != str(params["maintenance_type"]):
+        changes.append("maintenance_type")
+    if maintenance.get("description") != params["description"]:
+        changes.append("description")
+
+    now = float(params["active_since"])
+    length = float(params["active_till"]) - now
+    covered = False
+    for period in maintenance.get("timeperiods", []):
+        if str(period.get("timeperiod_type")) != "0":
+            continue
+        start = float(period["start_date"])
+        end = start + float(period["period"])
+        # the active range alone does not put hosts in maintenance
+        if float(period["period"]) == length and end > now and \
+           float(maintenance.get("active_since", 0)) <= start and \
+           float(maintenance.get("active_till", 0)) >= end:
+            covered = True
+            break
+    if not covered:
+        changes.append("period")
+
+    return changes
+
+
+def update_params(maintenance, params, changes):
+    params = dict(params, maintenanceid=maintenance["maintenanceid"])
+    if "period" not in changes:
+        # keep the existing window
+        for key in ("active_since", "active_till", "timeperiods"):
+            del params[key]
+    return params
 
 
 def get_maintenance_id(zbx, name):
@@ -217,53 +348,149 @@ def check_maintenance(zbx, name):
 
 
 def get_group_ids(zbx, host_groups):
-    group_ids = []
-    for group in host_groups:
-        try:
-            result = zbx.hostgroup.get(
+    try:
+        result = zbx.hostgroup.get(
+            {
+                "output": ["groupid", "name"],
+                "filter":
                 {
-                    "output": "extend",
-                    "filter":
-                    {
-                        "name": group
-                    }
+                    "name": host_groups
                 }
-            )
-        except BaseException as e:
-            return 1, None, str(e)
+            }
+        )
+    except BaseException as e:
+        return 1, None, str(e)
 
-        if not result:
-            return 1, None, "Group id for group %s not found" % group
+    found = dict((group["name"], group["groupid"]) for group in result)
+    missing = [group for group in host_groups if group not in found]
+    if missing:
+        return 1, None, "Group ids for groups %s not found" % ", ".join(missing)
 
-        group_ids.append(result[0]["groupid"])
+    group_ids = [found[group] for group in host_groups]
 
     return 0, group_ids, None
 
 
 def get_host_ids(zbx, host_names):
-    host_ids = []
-    for host in host_names:
-        try:
-            result = zbx.host.get(
+    try:
+        result = zbx.host.get(
+            {
+                "output": ["hostid", "name"],
+                "filter":
                 {
-                    "output": "extend",
-                    "filter":
-                    {
-                        "name": host
-                    }
+                    "name": host_names
                 }
-            )
-        except BaseException as e:
-            return 1, None, str(e)
+            }
+        )
+    except BaseException as e:
+        return 1, None, str(e)
 
-        if not result:
-            return 1, None, "Host id for host %s not found" % host
+    found = dict((host["name"], host["hostid"]) for host in result)
+    missing = [host for host in host_names if host not in found]
+    if missing:
+        return 1, None, "Host ids for hosts %s not found" % ", ".join(missing)
 
-        host_ids.append(result[0]["hostid"])
+    host_ids = [found[host] for host in host_names]
 
     return 0, host_ids, None
 
 
+def reconcile_maintenances(module, zbx, items, update, start_time):
+    """
+    Bring the listed maintenance windows to their desired state with one
+    call to resolve all hosts, one for all groups, one to read all
+    windows and at most one each to create, update and delete them.
+    """
+    defaults = module.params
+    for item in items:
+        if not item.get("name"):
+            module.fail_json(msg="each maintenance in the maintenances list must have a name")
+        for key in ("host_names", "host_groups"):
+            value = item.get(key, defaults[key]) or []
+            if isinstance(value, basestring):
+                value = [x.strip() for x in value.split(",") if x.strip()]
+            item[key] = value
+
+    present = [item for item in items if item.get("state", defaults["state"]) == "present"]
+
+    host_ids = {}
+    host_names = []
+    for item in present:
+        host_names.extend(host for host in item["host_names"] if host not in host_names)
+    if host_names:
+        (rc, ids, error) = get_host_ids(zbx, host_names)
+        if rc != 0:
+            module.fail_json(msg="Failed to get host_ids: %s" % error)
+        host_ids = dict(zip(host_names, ids))
+
+    group_ids = {}
+    group_names = []
+    for item in present:
+        group_names.extend(group for group in item["host_groups"] if group not in group_names)
+    if group_names:
+        (rc, ids, error) = get_group_ids(zbx, group_names)
+        if rc != 0:
+            module.fail_json(msg="Failed to get group_ids: %s" % error)
+        group_ids = dict(zip(group_names, ids))
+
+    (rc, existing, error) = get_maintenances(zbx, [item["name"] for item in items])
+    if rc != 0:
+        module.fail_json(msg="Failed to get maintenances: %s" % error)
+
+    to_create = []
+    to_update = []
+    to_delete = []
+    created = []
+    updated = {}
+    deleted = []
+    for item in items:
+        name = item["name"]
+        if item.get("state", defaults["state"]) == "absent":
+            if name in existing:
+                to_delete.append(existing[name]["maintenanceid"])
+                deleted.append(name)
+            continue
+
+        if not item["host_names"] and not item["host_groups"]:
+            module.fail_json(msg="At least one host_name or host_group must be defined for maintenance %s." % name)
+
+        if module.boolean(item.get("collect_data", defaults["collect_data"])):
+            maintenance_type = 0
+        else:
+            maintenance_type = 1
+        period = 60 * int(item.get("minutes", defaults["minutes"]))
+        params = maintenance_params([group_ids[group] for group in item["host_groups"]],
+                                    [host_ids[host] for host in item["host_names"]],
+                                    start_time, maintenance_type, period, name,
+                                    item.get("desc", defaults["desc"]))
+
+        if name not in existing:
+            to_create.append(params)
+            created.append(name)
+        elif update:
+            changes = diff_maintenance(existing[name], params)
+            if changes:
+                to_update.append(update_params(existing[name], params, changes))
+                updated[name] = changes
+
+    if not module.check_mode:
+        if to_create:
+            (rc, _, error) = create_maintenances(zbx, to_create)
+            if rc != 0:
+                module.fail_json(msg="Failed to create maintenances: %s" % error)
+        if to_update:
+            (rc, _, error) = update_maintenances(zbx, to_update)
+            if rc != 0:
+                module.fail_json(msg="Failed to update maintenances: %s" % error)
+        if to_delete:
+            (rc, _, error) = delete_maintenance(zbx, to_delete)
+            if rc != 0:
+                module.fail_json(msg="Failed to remove maintenances: %s" % error)
+
+    return dict(changed=bool(created or updated or deleted),
+                created=created, updated=updated, deleted=deleted)
+
+
 def main():
     module = AnsibleModule(
         argument_spec=dict(
@@ -274,10 +501,14 @@ def main():
             host_groups=dict(type='list', required=False, default=None, aliases=['host_group']),
             login_user=dict(required=True, default=None),
             login_password=dict(required=True, default=None),
-            name=dict(required=True, default=None),
+            name=dict(required=False, default=None),
             desc=dict(required=False, default="Created by Ansible"),
             collect_data=dict(type='bool', required=False, default=True),
+            update=dict(type='bool', required=False, default=False),
+            maintenances=dict(type='list', required=False, default=None),
         ),
+        required_one_of=[['name', 'maintenances']],
+        mutually_exclusive=[['name', 'maintenances']],
         supports_check_mode=True,
     )
 
@@ -294,6 +525,8 @@ def main():
     desc = module.params['desc']
     server_url = module.params['server_url']
     collect_data = module.params['collect_data']
+    update = module.params['update']
+    maintenances = module.params['maintenances']
     if collect_data:
         maintenance_type = 0
     else:
@@ -305,12 +538,17 @@ def main():
     except BaseException as e:
         module.fail_json(msg="Failed to connect to Zabbix server: %s" % e)
 
+    now = datetime.datetime.now()
+    start_time = time.mktime(now.timetuple())
+
+    if maintenances is not None:
+        module.exit_json(**reconcile_maintenances(module, zbx, maintenances, update, start_time))
+
     changed = False
+    changes = []
 
     if state == "present":
 
-        now = datetime.datetime.now()
-        start_time = time.mktime(now.timetuple())
         period = 60 * int(minutes)  # N * 60 seconds
 
         if host_groups:
@@ -344,6 +582,26 @@ def main():
                 else:
                     module.fail_json(msg="Failed to create maintenance: %s" % error)
 
+        elif update:
+            (rc, existing, error) = get_maintenances(zbx, [name])
+            if rc != 0:
+                module.fail_json(msg="Failed to get maintenance: %s" % error)
+
+            params = maintenance_params(group_ids, host_ids, start_time, maintenance_type, period, name, desc)
+            changes = diff_maintenance(existing[name], params)
+            if changes:
+                if not params["hostids"] and not params["groupids"]:
+                    module.fail_json(msg="At least one host_name or host_group must be defined for each updated maintenance.")
+
+                if module.check_mode:
+                    changed = True
+                else:
+                    (rc, _, error) = update_maintenances(zbx, update_params(existing[name], params, changes))
+                    if rc == 0:
+                        changed = True
+                    else:
+                        module.fail_json(msg="Failed to update maintenance: %s" % error)
+
     if state == "absent":
 
         (rc, exists, error) = check_maintenance(zbx, name)
@@ -365,7 +623,7 @@ def main():
                     else:
                         module.fail_json(msg="Failed to remove maintenance: %s" % error)
 
-    module.exit_json(changed=changed)
+    module.exit_json(changed=changed, changes=changes)
 
 from ansible.module_utils.basic import *
 main()
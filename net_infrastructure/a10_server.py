@@ -55,8 +55,8 @@ options:
     choices: []
   server_name:
     description:
-      - slb server name
-    required: true
+      - slb server name. Required unless I(servers) is given.
+    required: false
     default: null
     aliases: ['server']
     choices: []
@@ -79,7 +79,9 @@ options:
       - A list of ports to create for the server. Each list item should be a
         dictionary which specifies the C(port:) and C(protocol:), but can also optionally
         specify the C(status:). See the examples below for details. This parameter is
-        required when C(state) is C(present).
+        required when C(state) is C(present). On an existing server only the ports
+        that were added, removed or changed are sent, and that diff is returned
+        as C(ports).
     required: false
     default: null
     aliases: []
@@ -91,6 +93,42 @@ options:
     default: present
     aliases: []
     choices: ['present', 'absent']
+  servers:
+    description:
+      - List of servers to manage in one task, each a dictionary with
+        C(name) and C(ip), and optionally C(status), C(ports) and C(state).
+        C(ports) takes the same form as I(server_ports), and C(state)
+        defaults to the task value. All servers are read with a single
+        call and only those that differ are created, updated or deleted;
+        with I(write_config) the configuration is saved once for the
+        whole list. Servers that are not listed are left alone. Mutually
+        exclusive with I(server_name).
+    required: false
+    default: null
+    aliases: []
+    choices: []
+    version_added: "1.9"
+  session_cache_dir:
+    description:
+      - Directory in which the aXAPI session is cached, so that consecutive
+        tasks against the same device share one login instead of logging in
+        and out every time. The cache file holds a live session id and is
+        created readable by its owner only.
+    required: false
+    default: null
+    aliases: []
+    choices: []
+    version_added: "1.9"
+  session_ttl:
+    description:
+      - Seconds a cached session may stay unused before a new one is opened.
+        Keep it below the idle timeout of the device; a cached session the
+        device has already expired is replaced automatically.
+    required: false
+    default: 300
+    aliases: []
+    choices: []
+    version_added: "1.9"
 '''
 
 EXAMPLES = '''
@@ -107,8 +145,140 @@ EXAMPLES = '''
       - port_num: 8443
         protocol: TCP
 
+# Manage several servers in one task, reusing the login across tasks
+- a10_server:
+    host: a10.mydomain.com
+    username: myadmin
+    password: mypassword
+    session_cache_dir: ~/.ansible/a10
+    write_config: yes
+    servers:
+      - name: web1
+        ip: 1.1.1.101
+        ports:
+          - port_num: 80
+            protocol: tcp
+      - name: web2
+        ip: 1.1.1.102
+        status: disabled
+      - name: old-web
+        state: absent
+
 '''
 
+import hashlib
+import os
+import tempfile
+import time
+
+# aXAPI error code for a session id the device no longer knows
+AXAPI_INVALID_SESSION = 1009
+
+class AxapiSession(object):
+    """aXAPI session class.
+
+    Logs in to an A10 Networks device and makes aXAPI calls through the
+    resulting session. With a cache directory, the session is kept open
+    and its URL stored on disk so that later tasks against the same device
+    reuse it until it has been idle for the TTL; a cached session that the
+    device expired in the meantime is replaced on first use.
+
+    Attributes:
+        module: AnsibleModule instance.
+        base_url: aXAPI URL of the device.
+        username: Device username.
+        password: Device password.
+        cache_path: Session cache file, or None when caching is disabled.
+        ttl: Seconds a cached session may stay idle before it is replaced.
+        session_url: aXAPI URL including the session id.
+        reused: Whether the session was loaded from the cache.
+    """
+
+    def __init__(self, module, host, username, password, cache_dir=None, ttl=300):
+        self.module = module
+        self.base_url = 'https://%s/services/rest/V2.1/?format=json' % host
+        self.username = username
+        self.password = password
+        self.cache_path = None
+        if cache_dir:
+            # keyed by host and username only, so that nothing about the
+            # password can be learned from the file name; a cached session
+            # is validated by using it
+            key = hashlib.sha1('\0'.join([host, username])).hexdigest()
+            self.cache_path = os.path.join(os.path.expanduser(cache_dir), 'a10-session-%s.json' % key)
+        self.ttl = ttl
+        self.session_url = None
+        self.reused = False
+
+    def open(self):
+        if self.cache_path is not None:
+            self.session_url = self.load()
+            self.reused = self.session_url is not None
+        if self.session_url is None:
+            self.authenticate()
+
+    def authenticate(self):
+        self.session_url = axapi_authenticate(self.module, self.base_url, self.username, self.password)
+        self.reused = False
+        if self.cache_path is not None:
+            self.save()
+
+    def load(self):
+        try:
+            f = open(self.cache_path)
+            try:
+                entry = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+        if entry.get('expires', 0) < time.time():
+            return None
+        return entry.get('session_url')
+
+    def save(self):
+        cache_dir = os.path.dirname(self.cache_path)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0700)
+        # mkstemp creates the file readable by the owner only, which
+        # matters as it holds a live session id
+        fd, path = tempfile.mkstemp(dir=cache_dir)
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump({'session_url': self.session_url, 'expires': time.time() + self.ttl}, f)
+        finally:
+            f.close()
+        os.rename(path, self.cache_path)
+
+    def call(self, method, post=None):
+        if post is not None:
+            post = json.dumps(post)
+        result = axapi_call(self.module, '%s&method=%s' % (self.session_url, method), post)
+        if self.reused and axapi_failure(result) and \
+           result['response'].get('err', {}).get('code') == AXAPI_INVALID_SESSION:
+            self.authenticate()
+            result = axapi_call(self.module, '%s&method=%s' % (self.session_url, method), post)
+        return result
+
+    def get_all(self, method, key):
+        result = self.call(method)
+        if axapi_failure(result):
+            self.module.fail_json(msg="failed to read the %s: %s" % (key, result['response']['err']['msg']))
+        return dict((x['name'], x) for x in result.get(key, []))
+
+    def write_memory(self):
+        result = self.call('system.action.write_memory')
+        if axapi_failure(result):
+            self.module.fail_json(msg="failed to save the configuration: %s" % result['response']['err']['msg'])
+
+    def close(self):
+        # a cached session stays open for the next task; only its idle
+        # deadline moves
+        if self.cache_path is None:
+            self.call('session.close')
+        else:
+            self.save()
+
 VALID_PORT_FIELDS = ['port_num', 'protocol', 'status']
 
 def validate_ports(module, ports):
@@ -144,22 +314,130 @@ def validate_ports(module, ports):
             item['status'] = 1
 
 
+def diff_ports(defined_ports, desired_ports):
+    '''
+    Indexes the ports defined on the device by port number and returns the
+    desired ports that are missing (added), the defined ports that are not
+    desired (removed) and the desired ports whose fields differ (changed).
+    '''
+    defined = dict((port['port_num'], port) for port in defined_ports)
+    desired = set()
+    added = []
+    changed = []
+    for port in desired_ports:
+        desired.add(port['port_num'])
+        defined_port = defined.get(port['port_num'])
+        if defined_port is None:
+            added.append(port)
+        else:
+            for valid_field in VALID_PORT_FIELDS:
+                if port[valid_field] != defined_port.get(valid_field):
+                    changed.append(port)
+                    break
+    removed = []
+    for port in defined_ports:
+        if port['port_num'] not in desired:
+            removed.append(dict((k, port[k]) for k in VALID_PORT_FIELDS if k in port))
+    return dict(added=added, removed=removed, changed=changed)
+
+def update_ports(module, session, slb_server, port_diff):
+    '''
+    Applies a diff from diff_ports with one call per added, removed or
+    changed port, rather than rewriting the full server definition.
+    '''
+    for method, key in (('slb.server.port.delete', 'removed'),
+                        ('slb.server.port.create', 'added'),
+                        ('slb.server.port.update', 'changed')):
+        for port in port_diff[key]:
+            result = session.call(method, {'name': slb_server, 'port': port})
+            if axapi_failure(result):
+                module.fail_json(msg="failed to update port %s of the server %s: %s" % (port['port_num'], slb_server, result['response']['err']['msg']))
+
+def reconcile_servers(module, session, state, servers):
+    '''
+    Reads every server with a single slb.server.getAll call and creates,
+    updates or deletes only the listed servers that differ from it.
+    '''
+    defined_servers = session.get_all('slb.server.getAll', 'server_list')
+
+    created = []
+    updated = []
+    deleted = []
+    port_diffs = {}
+    for item in servers:
+        name = item.get('name')
+        if not name:
+            module.fail_json(msg="each server in the servers list must have a name")
+
+        if item.get('state', state) == 'absent':
+            if name in defined_servers:
+                result = session.call('slb.server.delete', {'name': name})
+                if axapi_failure(result):
+                    module.fail_json(msg="failed to delete the server %s: %s" % (name, result['response']['err']['msg']))
+                deleted.append(name)
+            continue
+
+        if not item.get('ip'):
+            module.fail_json(msg="you must specify an IP address for the server %s" % name)
+        ports = item.get('ports', [])
+        validate_ports(module, ports)
+        json_post = {
+            'server': {
+                'name': name,
+                'host': item['ip'],
+                'status': axapi_enabled_disabled(item.get('status', 'enabled')),
+                'port_list': ports,
+            }
+        }
+
+        defined = defined_servers.get(name)
+        if defined is None:
+            result = session.call('slb.server.create', json_post)
+            if axapi_failure(result):
+                module.fail_json(msg="failed to create the server %s: %s" % (name, result['response']['err']['msg']))
+            created.append(name)
+        else:
+            if defined.get('host') != json_post['server']['host'] or \
+               defined.get('status') != json_post['server']['status']:
+                # ports are left out so that they are not rewritten
+                server_post = dict((k, json_post['server'][k]) for k in ('name', 'host', 'status'))
+                result = session.call('slb.server.update', {'server': server_post})
+                if axapi_failure(result):
+                    module.fail_json(msg="failed to update the server %s: %s" % (name, result['response']['err']['msg']))
+                updated.append(name)
+            port_diff = diff_ports(defined.get('port_list', []), ports)
+            if port_diff['added'] or port_diff['removed'] or port_diff['changed']:
+                update_ports(module, session, name, port_diff)
+                port_diffs[name] = port_diff
+                if name not in updated:
+                    updated.append(name)
+
+    return dict(changed=bool(created or updated or deleted),
+                created=created, updated=updated, deleted=deleted,
+                ports=port_diffs)
+
+
 def main():
     argument_spec = a10_argument_spec()
     argument_spec.update(url_argument_spec())
     argument_spec.update(
         dict(
             state=dict(type='str', default='present', choices=['present', 'absent']),
-            server_name=dict(type='str', aliases=['server'], required=True),
+            server_name=dict(type='str', aliases=['server']),
             server_ip=dict(type='str', aliases=['ip', 'address']),
             server_status=dict(type='str', default='enabled', aliases=['status'], choices=['enabled', 'disabled']),
             server_ports=dict(type='list', aliases=['port'], default=[]),
+            servers=dict(type='list'),
+            session_cache_dir=dict(type='str'),
+            session_ttl=dict(type='int', default=300),
         )
     )
 
     module = AnsibleModule(
         argument_spec=argument_spec,
-        supports_check_mode=False
+        supports_check_mode=False,
+        required_one_of=[['server_name', 'servers']],
+        mutually_exclusive=[['server_name', 'servers']]
     )
 
     host = module.params['host']
@@ -171,94 +449,89 @@ def main():
     slb_server_ip = module.params['server_ip']
     slb_server_status = module.params['server_status']
     slb_server_ports = module.params['server_ports']
+    slb_servers = module.params['servers']
+
+    session = AxapiSession(module, host, username, password,
+                           module.params['session_cache_dir'], module.params['session_ttl'])
+    session.open()
+
+    if slb_servers is not None:
+        batch = reconcile_servers(module, session, state, slb_servers)
 
-    if slb_server is None:
-        module.fail_json(msg='server_name is required')
+        # save the config once for the whole batch
+        if batch['changed'] and write_config:
+            session.write_memory()
 
-    axapi_base_url = 'https://%s/services/rest/V2.1/?format=json' % host
-    session_url = axapi_authenticate(module, axapi_base_url, username, password)
+        session.close()
+        module.exit_json(**batch)
 
     # validate the ports data structure
     validate_ports(module, slb_server_ports)
 
     json_post = {
         'server': {
-            'name': slb_server, 
-            'host': slb_server_ip, 
+            'name': slb_server,
+            'host': slb_server_ip,
             'status': axapi_enabled_disabled(slb_server_status),
             'port_list': slb_server_ports,
         }
     }
 
-    slb_server_data = axapi_call(module, session_url + '&method=slb.server.search', json.dumps({'name': slb_server}))
+    slb_server_data = session.call('slb.server.search', {'name': slb_server})
     slb_server_exists = not axapi_failure(slb_server_data)
 
     changed = False
+    port_diff = None
     if state == 'present':
         if not slb_server_ip:
             module.fail_json(msg='you must specify an IP address when creating a server')
 
         if not slb_server_exists:
-            result = axapi_call(module, session_url + '&method=slb.server.create', json.dumps(json_post))
+            result = session.call('slb.server.create', json_post)
             if axapi_failure(result):
                 module.fail_json(msg="failed to create the server: %s" % result['response']['err']['msg'])
             changed = True
         else:
-            def needs_update(src_ports, dst_ports):
-                '''
-                Checks to determine if the port definitions of the src_ports
-                array are in or different from those in dst_ports. If there is
-                a difference, this function returns true, otherwise false.
-                '''
-                for src_port in src_ports:
-                    found = False
-                    different = False
-                    for dst_port in dst_ports:
-                        if src_port['port_num'] == dst_port['port_num']:
-                            found = True
-                            for valid_field in VALID_PORT_FIELDS:
-                                if src_port[valid_field] != dst_port[valid_field]:
-                                    different = True
-                                    break
-                            if found or different:
-                                break
-                    if not found or different:
-                        return True
-                # every port from the src exists in the dst, and none of them were different
-                return False
-
-            defined_ports = slb_server_data.get('server', {}).get('port_list', [])
-
-            # we check for a needed update both ways, in case ports
-            # are missing from either the ones specified by the user
-            # or from those on the device
-            if needs_update(defined_ports, slb_server_ports) or needs_update(slb_server_ports, defined_ports):
-                result = axapi_call(module, session_url + '&method=slb.server.update', json.dumps(json_post))
+            defined = slb_server_data.get('server', {})
+            defined_ports = defined.get('port_list', [])
+
+            if defined.get('host') != json_post['server']['host'] or \
+               defined.get('status') != json_post['server']['status']:
+                # ports are left out so that they are not rewritten
+                server_post = dict((k, json_post['server'][k]) for k in ('name', 'host', 'status'))
+                result = session.call('slb.server.update', {'server': server_post})
                 if axapi_failure(result):
                     module.fail_json(msg="failed to update the server: %s" % result['response']['err']['msg'])
                 changed = True
 
+            # only the ports that were added, removed or changed
+            # are sent to the device
+            port_diff = diff_ports(defined_ports, slb_server_ports)
+            if port_diff['added'] or port_diff['removed'] or port_diff['changed']:
+                update_ports(module, session, slb_server, port_diff)
+                changed = True
+
         # if we changed things, get the full info regarding
         # the service group for the return data below
         if changed:
-            result = axapi_call(module, session_url + '&method=slb.server.search', json.dumps({'name': slb_server}))
+            result = session.call('slb.server.search', {'name': slb_server})
         else:
             result = slb_server_data
     elif state == 'absent':
         if slb_server_exists:
-            result = axapi_call(module, session_url + '&method=slb.server.delete', json.dumps({'name': slb_server}))
+            result = session.call('slb.server.delete', {'name': slb_server})
             changed = True
         else:
             result = dict(msg="the  server was not present")
 
     # if the config has changed, save the config unless otherwise requested
     if changed and write_config:
-        write_result = axapi_call(module, session_url + '&method=system.action.write_memory')
-        if axapi_failure(write_result):
-            module.fail_json(msg="failed to save the configuration: %s" % write_result['response']['err']['msg'])
+        session.write_memory()
 
-    # log out of the session nicely and exit
-    axapi_call(module, session_url + '&method=session.close')
+    # log out of the session nicely (or keep a cached one open) and exit
+    session.close()
+    if port_diff is not None:
+        module.exit_json(changed=changed, content=result, ports=port_diff)
     module.exit_json(changed=changed, content=result)
 
 # standard ansible module imports
@@ -56,8 +56,8 @@ options:
     choices: []
   service_group:
     description:
-      - slb service-group name
-    required: true
+      - slb service-group name. Required unless I(service_groups) is given.
+    required: false
     default: null
     aliases: ['service', 'pool', 'group']
     choices: []
@@ -79,7 +79,9 @@ options:
     description:
       - A list of servers to add to the service group. Each list item should be a
         dictionary which specifies the C(server:) and C(port:), but can also optionally
-        specify the C(status:). See the examples below for details.
+        specify the C(status:). See the examples below for details. Members are
+        matched by server and port; only those that were added, removed or
+        changed are sent, and that diff is returned as C(members).
     required: false
     default: null
     aliases: []
@@ -100,6 +102,43 @@ options:
     required: false
     default: 'yes'
     choices: ['yes', 'no']
+  service_groups:
+    description:
+      - List of service groups to manage in one task, each a dictionary with
+        C(name) and optionally C(protocol), C(method), C(servers) and
+        C(state). C(servers) takes the same form as I(servers), and
+        C(state) defaults to the task value. All service groups, and the
+        servers they reference, are read with one call apiece and only the
+        groups and members that differ are changed; with I(write_config)
+        the configuration is saved once for the whole list. Service groups
+        that are not listed are left alone. Mutually exclusive with
+        I(service_group).
+    required: false
+    default: null
+    aliases: []
+    choices: []
+    version_added: "1.9"
+  session_cache_dir:
+    description:
+      - Directory in which the aXAPI session is cached, so that consecutive
+        tasks against the same device share one login instead of logging in
+        and out every time. The cache file holds a live session id and is
+        created readable by its owner only.
+    required: false
+    default: null
+    aliases: []
+    choices: []
+    version_added: "1.9"
+  session_ttl:
+    description:
+      - Seconds a cached session may stay unused before a new one is opened.
+        Keep it below the idle timeout of the device; a cached session the
+        device has already expired is replaced automatically.
+    required: false
+    default: 300
+    aliases: []
+    choices: []
+    version_added: "1.9"
 
 '''
 
@@ -121,8 +160,140 @@ EXAMPLES = '''
         port: 8080
         status: disabled
 
+# Manage several service groups in one task, reusing the login across tasks
+- a10_service_group:
+    host: a10.mydomain.com
+    username: myadmin
+    password: mypassword
+    session_cache_dir: ~/.ansible/a10
+    service_groups:
+      - name: sg-80-tcp
+        method: least-connection
+        servers:
+          - server: foo1.mydomain.com
+            port: 8080
+          - server: foo2.mydomain.com
+            port: 8080
+      - name: sg-53-udp
+        protocol: udp
+      - name: sg-old
+        state: absent
+
 '''
 
+import hashlib
+import os
+import tempfile
+import time
+
+# aXAPI error code for a session id the device no longer knows
+AXAPI_INVALID_SESSION = 1009
+
+class AxapiSession(object):
+    """aXAPI session class.
+
+    Logs in to an A10 Networks device and makes aXAPI calls through the
+    resulting session. With a cache directory, the session is kept open
+    and its URL stored on disk so that later tasks against the same device
+    reuse it until it has been idle for the TTL; a cached session that the
+    device expired in the meantime is replaced on first use.
+
+    Attributes:
+        module: AnsibleModule instance.
+        base_url: aXAPI URL of the device.
+        username: Device username.
+        password: Device password.
+        cache_path: Session cache file, or None when caching is disabled.
+        ttl: Seconds a cached session may stay idle before it is replaced.
+        session_url: aXAPI URL including the session id.
+        reused: Whether the session was loaded from the cache.
+    """
+
+    def __init__(self, module, host, username, password, cache_dir=None, ttl=300):
+        self.module = module
+        self.base_url = 'https://%s/services/rest/V2.1/?format=json' % host
+        self.username = username
+        self.password = password
+        self.cache_path = None
+        if cache_dir:
+            # keyed by host and username only, so that nothing about the
+            # password can be learned from the file name; a cached session
+            # is validated by using it
+            key = hashlib.sha1('\0'.join([host, username])).hexdigest()
+            self.cache_path = os.path.join(os.path.expanduser(cache_dir), 'a10-session-%s.json' % key)
+        self.ttl = ttl
+        self.session_url = None
+        self.reused = False
+
+    def open(self):
+        if self.cache_path is not None:
+            self.session_url = self.load()
+            self.reused = self.session_url is not None
+        if self.session_url is None:
+            self.authenticate()
+
+    def authenticate(self):
+        self.session_url = axapi_authenticate(self.module, self.base_url, self.username, self.password)
+        self.reused = False
+        if self.cache_path is not None:
+            self.save()
+
+    def load(self):
+        try:
+            f = open(self.cache_path)
+            try:
+                entry = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+        if entry.get('expires', 0) < time.time():
+            return None
+        return entry.get('session_url')
+
+    def save(self):
+        cache_dir = os.path.dirname(self.cache_path)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0700)
+        # mkstemp creates the file readable by the owner only, which
+        # matters as it holds a live session id
+        fd, path = tempfile.mkstemp(dir=cache_dir)
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump({'session_url': self.session_url, 'expires': time.time() + self.ttl}, f)
+        finally:
+            f.close()
+        os.rename(path, self.cache_path)
+
+    def call(self, method, post=None):
+        if post is not None:
+            post = json.dumps(post)
+        result = axapi_call(self.module, '%s&method=%s' % (self.session_url, method), post)
+        if self.reused and axapi_failure(result) and \
+           result['response'].get('err', {}).get('code') == AXAPI_INVALID_SESSION:
+            self.authenticate()
+            result = axapi_call(self.module, '%s&method=%s' % (self.session_url, method), post)
+        return result
+
+    def get_all(self, method, key):
+        result = self.call(method)
+        if axapi_failure(result):
+            self.module.fail_json(msg="failed to read the %s: %s" % (key, result['response']['err']['msg']))
+        return dict((x['name'], x) for x in result.get(key, []))
+
+    def write_memory(self):
+        result = self.call('system.action.write_memory')
+        if axapi_failure(result):
+            self.module.fail_json(msg="failed to save the configuration: %s" % result['response']['err']['msg'])
+
+    def close(self):
+        # a cached session stays open for the next task; only its idle
+        # deadline moves
+        if self.cache_path is None:
+            self.call('session.close')
+        else:
+            self.save()
+
 VALID_SERVICE_GROUP_FIELDS = ['name', 'protocol', 'lb_method']
 VALID_SERVER_FIELDS = ['server', 'port', 'status']
 
@@ -152,13 +323,160 @@ def validate_servers(module, servers):
             item['status'] = 1
 
 
+LOAD_BALANCING_METHODS = {'round-robin': 0,
+                          'weighted-rr': 1,
+                          'least-connection': 2,
+                          'weighted-least-connection': 3,
+                          'service-least-connection': 4,
+                          'service-weighted-least-connection': 5,
+                          'fastest-response': 6,
+                          'least-request': 7,
+                          'round-robin-strict': 8,
+                          'src-ip-only-hash': 14,
+                          'src-ip-hash': 15}
+
+def service_group_post(name, proto, method):
+    if not proto or proto.lower() == 'tcp':
+        protocol = 2
+    else:
+        protocol = 3
+
+    return {
+        'service_group': {
+            'name': name,
+            'protocol': protocol,
+            'lb_method': LOAD_BALANCING_METHODS[method],
+        }
+    }
+
+def diff_members(defined_servers, slb_servers):
+    '''
+    Indexes the members defined on the device by server name and port and
+    returns the desired members that are missing (added), the defined
+    members that are not desired (removed) and the desired members whose
+    fields differ (changed).
+    '''
+    defined = dict(((server['server'], server['port']), server) for server in defined_servers)
+    desired = set()
+    added = []
+    changed = []
+    for server in slb_servers:
+        key = (server['server'], server['port'])
+        desired.add(key)
+        def_server = defined.get(key)
+        if def_server is None:
+            added.append(server)
+        else:
+            for valid_field in VALID_SERVER_FIELDS:
+                if server[valid_field] != def_server.get(valid_field):
+                    changed.append(server)
+                    break
+    removed = []
+    for server in defined_servers:
+        if (server['server'], server['port']) not in desired:
+            removed.append(dict((k, server[k]) for k in VALID_SERVER_FIELDS if k in server))
+    return dict(added=added, removed=removed, changed=changed)
+
+def sync_members(module, session, slb_service_group, slb_servers, defined_servers):
+    '''
+    Adds, updates and removes members of the service group so that they
+    match slb_servers with one call per differing member, and returns the
+    diff from diff_members, or None when nothing was changed.
+    '''
+    member_diff = diff_members(defined_servers, slb_servers)
+    if not (member_diff['added'] or member_diff['removed'] or member_diff['changed']):
+        return None
+
+    for method, key in (('slb.service_group.member.delete', 'removed'),
+                        ('slb.service_group.member.create', 'added'),
+                        ('slb.service_group.member.update', 'changed')):
+        for server in member_diff[key]:
+            server_data = {
+                "name": slb_service_group,
+                "member": server,
+            }
+            result = session.call(method, server_data)
+            if axapi_failure(result):
+                module.fail_json(msg="failed to update member %s:%s of the service group %s: %s" % (server['server'], server['port'], slb_service_group, result['response']['err']['msg']))
+    return member_diff
+
+def reconcile_service_groups(module, session, state, service_groups):
+    '''
+    Reads every service group, and every server they may reference, with
+    one getAll call apiece and creates, updates or deletes only the listed
+    service groups and members that differ from them.
+    '''
+    defined_groups = session.get_all('slb.service_group.getAll', 'service_group_list')
+    defined_server_names = None
+
+    created = []
+    updated = []
+    deleted = []
+    member_diffs = {}
+    for item in service_groups:
+        name = item.get('name')
+        if not name:
+            module.fail_json(msg="each service group in the service_groups list must have a name")
+
+        if item.get('state', state) == 'absent':
+            if name in defined_groups:
+                result = session.call('slb.service_group.delete', {'name': name})
+                if axapi_failure(result):
+                    module.fail_json(msg="failed to delete the service group %s: %s" % (name, result['response']['err']['msg']))
+                deleted.append(name)
+            continue
+
+        method = item.get('method', 'round-robin')
+        if method not in LOAD_BALANCING_METHODS:
+            module.fail_json(msg="invalid method %s for the service group %s, must be one of: %s" % (method, name, ','.join(sorted(LOAD_BALANCING_METHODS))))
+        json_post = service_group_post(name, item.get('protocol', 'tcp'), method)
+        servers = item.get('servers', [])
+        validate_servers(module, servers)
+
+        # the servers of all service groups are checked against one read
+        if servers and defined_server_names is None:
+            defined_server_names = session.get_all('slb.server.getAll', 'server_list')
+        for server in servers:
+            if server['server'] not in defined_server_names:
+                module.fail_json(msg="the server %s specified in the servers list of %s does not exist" % (server['server'], name))
+
+        defined = defined_groups.get(name)
+        if defined is None:
+            result = session.call('slb.service_group.create', json_post)
+            if axapi_failure(result):
+                module.fail_json(msg=result['response']['err']['msg'])
+            sync_members(module, session, name, servers, [])
+            created.append(name)
+            continue
+
+        do_update = False
+        for field in VALID_SERVICE_GROUP_FIELDS:
+            if json_post['service_group'][field] != defined[field]:
+                do_update = True
+                break
+        if do_update:
+            result = session.call('slb.service_group.update', json_post)
+            if axapi_failure(result):
+                module.fail_json(msg=result['response']['err']['msg'])
+        member_diff = sync_members(module, session, name, servers, defined.get('member_list', []))
+        if member_diff is not None:
+            member_diffs[name] = member_diff
+            do_update = True
+        if do_update:
+            updated.append(name)
+
+    return dict(changed=bool(created or updated or deleted),
+                created=created, updated=updated, deleted=deleted,
+                members=member_diffs)
+
+
 def main():
     argument_spec = a10_argument_spec()
     argument_spec.update(url_argument_spec())
     argument_spec.update(
         dict(
             state=dict(type='str', default='present', choices=['present', 'absent']),
-            service_group=dict(type='str', aliases=['service', 'pool', 'group'], required=True),
+            service_group=dict(type='str', aliases=['service', 'pool', 'group']),
             service_group_protocol=dict(type='str', default='tcp', aliases=['proto', 'protocol'], choices=['tcp', 'udp']),
             service_group_method=dict(type='str', default='round-robin',
                                       aliases=['method'],
@@ -174,12 +492,17 @@ def main():
                                                'src-ip-only-hash',
                                                'src-ip-hash']),
             servers=dict(type='list', aliases=['server', 'member'], default=[]),
+            service_groups=dict(type='list'),
+            session_cache_dir=dict(type='str'),
+            session_ttl=dict(type='int', default=300),
         )
     )
 
     module = AnsibleModule(
         argument_spec=argument_spec,
-        supports_check_mode=False
+        supports_check_mode=False,
+        required_one_of=[['service_group', 'service_groups']],
+        mutually_exclusive=[['service_group', 'service_groups']]
     )
 
     host = module.params['host']
@@ -191,59 +514,47 @@ def main():
     slb_service_group_proto = module.params['service_group_protocol']
     slb_service_group_method = module.params['service_group_method']
     slb_servers = module.params['servers']
+    slb_service_groups = module.params['service_groups']
 
-    if slb_service_group is None:
-        module.fail_json(msg='service_group is required')
-
-    axapi_base_url = 'https://' + host + '/services/rest/V2.1/?format=json'
-    load_balancing_methods = {'round-robin': 0,
-                              'weighted-rr': 1,
-                              'least-connection': 2,
-                              'weighted-least-connection': 3,
-                              'service-least-connection': 4,
-                              'service-weighted-least-connection': 5,
-                              'fastest-response': 6,
-                              'least-request': 7,
-                              'round-robin-strict': 8,
-                              'src-ip-only-hash': 14,
-                              'src-ip-hash': 15}
-
-    if not slb_service_group_proto or slb_service_group_proto.lower() == 'tcp':
-        protocol = 2
-    else:
-        protocol = 3
+    if slb_service_groups is None:
+        # validate the server data list structure
+        validate_servers(module, slb_servers)
 
-    # validate the server data list structure
-    validate_servers(module, slb_servers)
+    # first we authenticate to get a session id
+    session = AxapiSession(module, host, username, password,
+                           module.params['session_cache_dir'], module.params['session_ttl'])
+    session.open()
 
-    json_post = {
-        'service_group': {
-            'name': slb_service_group,
-            'protocol': protocol,
-            'lb_method': load_balancing_methods[slb_service_group_method],
-        }
-    }
+    if slb_service_groups is not None:
+        batch = reconcile_service_groups(module, session, state, slb_service_groups)
 
-    # first we authenticate to get a session id
-    session_url = axapi_authenticate(module, axapi_base_url, username, password)
+        # save the config once for the whole batch
+        if batch['changed'] and write_config:
+            session.write_memory()
+
+        session.close()
+        module.exit_json(**batch)
+
+    json_post = service_group_post(slb_service_group, slb_service_group_proto, slb_service_group_method)
 
     # then we check to see if the specified group exists
-    slb_result = axapi_call(module, session_url + '&method=slb.service_group.search', json.dumps({'name': slb_service_group}))
+    slb_result = session.call('slb.service_group.search', {'name': slb_service_group})
     slb_service_group_exist = not axapi_failure(slb_result)
 
     changed = False
+    member_diff = None
     if state == 'present':
         # before creating/updating we need to validate that servers
         # defined in the servers list exist to prevent errors
         checked_servers = []
         for server in slb_servers:
-            result = axapi_call(module, session_url + '&method=slb.server.search', json.dumps({'name': server['server']}))
+            result = session.call('slb.server.search', {'name': server['server']})
             if axapi_failure(result):
                 module.fail_json(msg="the server %s specified in the servers list does not exist" % server['server'])
             checked_servers.append(server['server'])
 
         if not slb_service_group_exist:
-            result = axapi_call(module, session_url + '&method=slb.service_group.create', json.dumps(json_post))
+            result = session.call('slb.service_group.create', json_post)
             if axapi_failure(result):
                 module.fail_json(msg=result['response']['err']['msg'])
             changed = True
@@ -258,7 +569,7 @@ def main():
                     break
 
             if do_update:
-                result = axapi_call(module, session_url + '&method=slb.service_group.update', json.dumps(json_post))
+                result = session.call('slb.service_group.update', json_post)
                 if axapi_failure(result):
                     module.fail_json(msg=result['response']['err']['msg'])
                 changed = True
@@ -267,70 +578,31 @@ def main():
         # results to make it a bit easier to iterate over
         defined_servers = slb_result.get('service_group', {}).get('member_list', [])
 
-        # next we add/update new member servers from the user-specified
-        # list if they're different or not on the target device
-        for server in slb_servers:
-            found = False
-            different = False
-            for def_server in defined_servers:
-                if server['server'] == def_server['server']:
-                    found = True
-                    for valid_field in VALID_SERVER_FIELDS:
-                        if server[valid_field] != def_server[valid_field]:
-                            different = True
-                            break
-                    if found or different:
-                        break
-            # add or update as required
-            server_data = {
-                "name": slb_service_group,
-                "member": server,
-            }
-            if not found:
-                result = axapi_call(module, session_url + '&method=slb.service_group.member.create', json.dumps(server_data))
-                changed = True
-            elif different:
-                result = axapi_call(module, session_url + '&method=slb.service_group.member.update', json.dumps(server_data))
-                changed = True
-
-        # finally, remove any servers that are on the target
-        # device but were not specified in the list given
-        for server in defined_servers:
-            found = False
-            for slb_server in slb_servers:
-                if server['server'] == slb_server['server']:
-                    found = True
-                    break
-            # remove if not found
-            server_data = {
-                "name": slb_service_group,
-                "member": server,
-            }
-            if not found:
-                result = axapi_call(module, session_url + '&method=slb.service_group.member.delete', json.dumps(server_data))
-                changed = True
+        member_diff = sync_members(module, session, slb_service_group, slb_servers, defined_servers)
+        if member_diff is not None:
+            changed = True
 
         # if we changed things, get the full info regarding
         # the service group for the return data below
         if changed:
-            result = axapi_call(module, session_url + '&method=slb.service_group.search', json.dumps({'name': slb_service_group}))
+            result = session.call('slb.service_group.search', {'name': slb_service_group})
         else:
             result = slb_result
     elif state == 'absent':
         if slb_service_group_exist:
-            result = axapi_call(module, session_url + '&method=slb.service_group.delete', json.dumps({'name': slb_service_group}))
+            result = session.call('slb.service_group.delete', {'name': slb_service_group})
             changed = True
         else:
             result = dict(msg="the service group was not present")
 
     # if the config has changed, save the config unless otherwise requested
     if changed and write_config:
-        write_result = axapi_call(module, session_url + '&method=system.action.write_memory')
-        if axapi_failure(write_result):
-            module.fail_json(msg="failed to save the configuration: %s" % write_result['response']['err']['msg'])
+        session.write_memory()
 
-    # log out of the session nicely and exit
-    axapi_call(module, session_url + '&method=session.close')
+    # log out of the session nicely (or keep a cached one open) and exit
+    session.close()
+    if member_diff is not None:
+        module.exit_json(changed=changed, content=result, members=member_diff)
     module.exit_json(changed=changed, content=result)
 
 # standard ansible module imports
@@ -58,14 +58,14 @@ options:
     choices: []
   virtual_server:
     description:
-      - slb virtual server name
-    required: true
+      - slb virtual server name. Required unless I(virtual_servers) is given.
+    required: false
     default: null
     aliases: ['vip', 'virtual']
     choices: []
   virtual_server_ip:
     description:
-      - slb virtual server ip address
+      - slb virtual server ip address. Required unless I(virtual_servers) is given.
     required: false
     default: null
     aliases: ['ip', 'address']
@@ -82,7 +82,9 @@ options:
       - A list of ports to create for the virtual server. Each list item should be a
         dictionary which specifies the C(port:) and C(type:), but can also optionally
         specify the C(service_group:) as well as the C(status:). See the examples
-        below for details. This parameter is required when C(state) is C(present).
+        below for details. Required unless I(virtual_servers) is given. On an
+        existing virtual server only the ports that were added, removed or
+        changed are sent, and that diff is returned as C(ports).
     required: false
   write_config:
     description:
@@ -100,6 +102,43 @@ options:
     required: false
     default: 'yes'
     choices: ['yes', 'no']
+  virtual_servers:
+    description:
+      - List of virtual servers to manage in one task, each a dictionary with
+        C(name) and C(ip), and optionally C(status), C(ports) and C(state).
+        C(ports) takes the same form as I(virtual_server_ports), and
+        C(state) defaults to the task value. All virtual servers, and the
+        service groups their ports reference, are read with one call apiece
+        and only the virtual servers that differ are created, updated or
+        deleted; with I(write_config) the configuration is saved once for
+        the whole list. Virtual servers that are not listed are left alone.
+        Mutually exclusive with I(virtual_server).
+    required: false
+    default: null
+    aliases: []
+    choices: []
+    version_added: "1.9"
+  session_cache_dir:
+    description:
+      - Directory in which the aXAPI session is cached, so that consecutive
+        tasks against the same device share one login instead of logging in
+        and out every time. The cache file holds a live session id and is
+        created readable by its owner only.
+    required: false
+    default: null
+    aliases: []
+    choices: []
+    version_added: "1.9"
+  session_ttl:
+    description:
+      - Seconds a cached session may stay unused before a new one is opened.
+        Keep it below the idle timeout of the device; a cached session the
+        device has already expired is replaced automatically.
+    required: false
+    default: 300
+    aliases: []
+    choices: []
+    version_added: "1.9"
 
 '''
 
@@ -122,8 +161,141 @@ EXAMPLES = '''
         protocol: http
         status: disabled
 
+# Manage several virtual servers in one task, reusing the login across tasks
+- a10_virtual_server:
+    host: a10.mydomain.com
+    username: myadmin
+    password: mypassword
+    session_cache_dir: ~/.ansible/a10
+    write_config: yes
+    virtual_servers:
+      - name: vserver1
+        ip: 1.1.1.1
+        ports:
+          - port: 80
+            protocol: TCP
+            service_group: sg-80-tcp
+      - name: vserver2
+        ip: 1.1.1.2
+        status: disabled
+      - name: vserver-old
+        state: absent
+
 '''
 
+import hashlib
+import os
+import tempfile
+import time
+
+# aXAPI error code for a session id the device no longer knows
+AXAPI_INVALID_SESSION = 1009
+
+class AxapiSession(object):
+    """aXAPI session class.
+
+    Logs in to an A10 Networks device and makes aXAPI calls through the
+    resulting session. With a cache directory, the session is kept open
+    and its URL stored on disk so that later tasks against the same device
+    reuse it until it has been idle for the TTL; a cached session that the
+    device expired in the meantime is replaced on first use.
+
+    Attributes:
+        module: AnsibleModule instance.
+        base_url: aXAPI URL of the device.
+        username: Device username.
+        password: Device password.
+        cache_path: Session cache file, or None when caching is disabled.
+        ttl: Seconds a cached session may stay idle before it is replaced.
+        session_url: aXAPI URL including the session id.
+        reused: Whether the session was loaded from the cache.
+    """
+
+    def __init__(self, module, host, username, password, cache_dir=None, ttl=300):
+        self.module = module
+        self.base_url = 'https://%s/services/rest/V2.1/?format=json' % host
+        self.username = username
+        self.password = password
+        self.cache_path = None
+        if cache_dir:
+            # keyed by host and username only, so that nothing about the
+            # password can be learned from the file name; a cached session
+            # is validated by using it
+            key = hashlib.sha1('\0'.join([host, username])).hexdigest()
+            self.cache_path = os.path.join(os.path.expanduser(cache_dir), 'a10-session-%s.json' % key)
+        self.ttl = ttl
+        self.session_url = None
+        self.reused = False
+
+    def open(self):
+        if self.cache_path is not None:
+            self.session_url = self.load()
+            self.reused = self.session_url is not None
+        if self.session_url is None:
+            self.authenticate()
+
+    def authenticate(self):
+        self.session_url = axapi_authenticate(self.module, self.base_url, self.username, self.password)
+        self.reused = False
+        if self.cache_path is not None:
+            self.save()
+
+    def load(self):
+        try:
+            f = open(self.cache_path)
+            try:
+                entry = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+        if entry.get('expires', 0) < time.time():
+            return None
+        return entry.get('session_url')
+
+    def save(self):
+        cache_dir = os.path.dirname(self.cache_path)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, 0700)
+        # mkstemp creates the file readable by the owner only, which
+        # matters as it holds a live session id
+        fd, path = tempfile.mkstemp(dir=cache_dir)
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump({'session_url': self.session_url, 'expires': time.time() + self.ttl}, f)
+        finally:
+            f.close()
+        os.rename(path, self.cache_path)
+
+    def call(self, method, post=None):
+        if post is not None:
+            post = json.dumps(post)
+        result = axapi_call(self.module, '%s&method=%s' % (self.session_url, method), post)
+        if self.reused and axapi_failure(result) and \
+           result['response'].get('err', {}).get('code') == AXAPI_INVALID_SESSION:
+            self.authenticate()
+            result = axapi_call(self.module, '%s&method=%s' % (self.session_url, method), post)
+        return result
+
+    def get_all(self, method, key):
+        result = self.call(method)
+        if axapi_failure(result):
+            self.module.fail_json(msg="failed to read the %s: %s" % (key, result['response']['err']['msg']))
+        return dict((x['name'], x) for x in result.get(key, []))
+
+    def write_memory(self):
+        result = self.call('system.action.write_memory')
+        if axapi_failure(result):
+            self.module.fail_json(msg="failed to save the configuration: %s" % result['response']['err']['msg'])
+
+    def close(self):
+        # a cached session stays open for the next task; only its idle
+        # deadline moves
+        if self.cache_path is None:
+            self.call('session.close')
+        else:
+            self.save()
+
 VALID_PORT_FIELDS = ['port', 'protocol', 'service_group', 'status']
 
 def validate_ports(module, ports):
@@ -162,22 +334,141 @@ def validate_ports(module, ports):
         if 'service_group' not in item:
             item['service_group'] = ''
 
+def diff_ports(defined_ports, desired_ports):
+    '''
+    Indexes the ports defined on the device by port number and returns the
+    desired ports that are missing (added), the defined ports that are not
+    desired (removed) and the desired ports whose fields differ (changed).
+    '''
+    defined = dict((port['port'], port) for port in defined_ports)
+    desired = set()
+    added = []
+    changed = []
+    for port in desired_ports:
+        desired.add(port['port'])
+        defined_port = defined.get(port['port'])
+        if defined_port is None:
+            added.append(port)
+        else:
+            for valid_field in VALID_PORT_FIELDS:
+                if port[valid_field] != defined_port.get(valid_field):
+                    changed.append(port)
+                    break
+    removed = []
+    for port in defined_ports:
+        if port['port'] not in desired:
+            removed.append(dict((k, port[k]) for k in VALID_PORT_FIELDS if k in port))
+    return dict(added=added, removed=removed, changed=changed)
+
+def update_ports(module, session, slb_virtual, port_diff):
+    '''
+    Applies a diff from diff_ports with one call per added, removed or
+    changed port, rather than rewriting the full virtual server definition.
+    '''
+    for method, key in (('slb.virtual_server.vport.delete', 'removed'),
+                        ('slb.virtual_server.vport.create', 'added'),
+                        ('slb.virtual_server.vport.update', 'changed')):
+        for port in port_diff[key]:
+            result = session.call(method, {'name': slb_virtual, 'vport': port})
+            if axapi_failure(result):
+                module.fail_json(msg="failed to update port %s of the virtual server %s: %s" % (port['port'], slb_virtual, result['response']['err']['msg']))
+
+def reconcile_virtual_servers(module, session, state, virtual_servers):
+    '''
+    Reads every virtual server, and every service group their ports may
+    reference, with one getAll call apiece and creates, updates or deletes
+    only the listed virtual servers that differ from them.
+    '''
+    defined_virtuals = session.get_all('slb.virtual_server.getAll', 'virtual_server_list')
+    defined_service_groups = None
+
+    created = []
+    updated = []
+    deleted = []
+    port_diffs = {}
+    for item in virtual_servers:
+        name = item.get('name')
+        if not name:
+            module.fail_json(msg="each virtual server in the virtual_servers list must have a name")
+
+        if item.get('state', state) == 'absent':
+            if name in defined_virtuals:
+                result = session.call('slb.virtual_server.delete', {'name': name})
+                if axapi_failure(result):
+                    module.fail_json(msg="failed to delete the virtual server %s: %s" % (name, result['response']['err']['msg']))
+                deleted.append(name)
+            continue
+
+        if not item.get('ip'):
+            module.fail_json(msg="you must specify an IP address for the virtual server %s" % name)
+        ports = item.get('ports', [])
+        validate_ports(module, ports)
+        json_post = {
+            'virtual_server': {
+                'name': name,
+                'address': item['ip'],
+                'status': axapi_enabled_disabled(item.get('status', 'enabled')),
+                'vport_list': ports,
+            }
+        }
+
+        # the service groups of all virtual servers are checked against one read
+        for port in ports:
+            if port['service_group'] == '':
+                continue
+            if defined_service_groups is None:
+                defined_service_groups = session.get_all('slb.service_group.getAll', 'service_group_list')
+            if port['service_group'] not in defined_service_groups:
+                module.fail_json(msg="the service group %s specified in the ports list of %s does not exist" % (port['service_group'], name))
+
+        defined = defined_virtuals.get(name)
+        if defined is None:
+            result = session.call('slb.virtual_server.create', json_post)
+            if axapi_failure(result):
+                module.fail_json(msg="failed to create the virtual server %s: %s" % (name, result['response']['err']['msg']))
+            created.append(name)
+        else:
+            if defined.get('address') != json_post['virtual_server']['address'] or \
+               defined.get('status') != json_post['virtual_server']['status']:
+                # ports are left out so that they are not rewritten
+                virtual_post = dict((k, json_post['virtual_server'][k]) for k in ('name', 'address', 'status'))
+                result = session.call('slb.virtual_server.update', {'virtual_server': virtual_post})
+                if axapi_failure(result):
+                    module.fail_json(msg="failed to update the virtual server %s: %s" % (name, result['response']['err']['msg']))
+                updated.append(name)
+            port_diff = diff_ports(defined.get('vport_list', []), ports)
+            if port_diff['added'] or port_diff['removed'] or port_diff['changed']:
+                update_ports(module, session, name, port_diff)
+                port_diffs[name] = port_diff
+                if name not in updated:
+                    updated.append(name)
+
+    return dict(changed=bool(created or updated or deleted),
+                created=created, updated=updated, deleted=deleted,
+                ports=port_diffs)
+
+
 def main():
     argument_spec = a10_argument_spec()
     argument_spec.update(url_argument_spec())
     argument_spec.update(
         dict(
             state=dict(type='str', default='present', choices=['present', 'absent']),
-            virtual_server=dict(type='str', aliases=['vip', 'virtual'], required=True),
-            virtual_server_ip=dict(type='str', aliases=['ip', 'address'], required=True),
+            virtual_server=dict(type='str', aliases=['vip', 'virtual']),
+            virtual_server_ip=dict(type='str', aliases=['ip', 'address']),
             virtual_server_status=dict(type='str', default='enabled', aliases=['status'], choices=['enabled', 'disabled']),
-            virtual_server_ports=dict(type='list', required=True),
+            virtual_server_ports=dict(type='list'),
+            virtual_servers=dict(type='list'),
+            session_cache_dir=dict(type='str'),
+            session_ttl=dict(type='int', default=300),
         )
     )
 
     module = AnsibleModule(
         argument_spec=argument_spec,
-        supports_check_mode=False
+        supports_check_mode=False,
+        required_one_of=[['virtual_server', 'virtual_servers']],
+        mutually_exclusive=[['virtual_server', 'virtual_servers']]
     )
 
     host = module.params['host']
@@ -189,19 +480,34 @@ def main():
     slb_virtual_ip = module.params['virtual_server_ip']
     slb_virtual_status = module.params['virtual_server_status']
     slb_virtual_ports = module.params['virtual_server_ports']
+    slb_virtuals = module.params['virtual_servers']
 
-    if slb_virtual is None:
-        module.fail_json(msg='virtual_server is required')
+    if slb_virtuals is None:
+        if not slb_virtual_ip:
+            module.fail_json(msg='virtual_server_ip is required')
+        if slb_virtual_ports is None:
+            module.fail_json(msg='virtual_server_ports is required')
+        validate_ports(module, slb_virtual_ports)
 
-    validate_ports(module, slb_virtual_ports)
+    session = AxapiSession(module, host, username, password,
+                           module.params['session_cache_dir'], module.params['session_ttl'])
+    session.open()
 
-    axapi_base_url = 'https://%s/services/rest/V2.1/?format=json' % host
-    session_url = axapi_authenticate(module, axapi_base_url, username, password)
+    if slb_virtuals is not None:
+        batch = reconcile_virtual_servers(module, session, state, slb_virtuals)
 
-    slb_virtual_data = axapi_call(module, session_url + '&method=slb.virtual_server.search', json.dumps({'name': slb_virtual}))
+        # save the config once for the whole batch
+        if batch['changed'] and write_config:
+            session.write_memory()
+
+        session.close()
+        module.exit_json(**batch)
+
+    slb_virtual_data = session.call('slb.virtual_server.search', {'name': slb_virtual})
     slb_virtual_exists = not axapi_failure(slb_virtual_data)
 
     changed = False
+    port_diff = None
     if state == 'present':
         json_post = {
             'virtual_server': {
@@ -222,72 +528,57 @@ def main():
                 # skip blank service group entries
                 if port['service_group'] == '':
                     continue
-                result = axapi_call(module, session_url + '&method=slb.service_group.search', json.dumps({'name': port['service_group']}))
+                result = session.call('slb.service_group.search', {'name': port['service_group']})
                 if axapi_failure(result):
                     module.fail_json(msg="the service group %s specified in the ports list does not exist" % port['service_group'])
                 checked_service_groups.append(port['service_group'])
 
         if not slb_virtual_exists:
-            result = axapi_call(module, session_url + '&method=slb.virtual_server.create', json.dumps(json_post))
+            result = session.call('slb.virtual_server.create', json_post)
             if axapi_failure(result):
                 module.fail_json(msg="failed to create the virtual server: %s" % result['response']['err']['msg'])
             changed = True
         else:
-            def needs_update(src_ports, dst_ports):
-                '''
-                Checks to determine if the port definitions of the src_ports
-                array are in or different from those in dst_ports. If there is
-                a difference, this function returns true, otherwise false.
-                '''
-                for src_port in src_ports:
-                    found = False
-                    different = False
-                    for dst_port in dst_ports:
-                        if src_port['port'] == dst_port['port']:
-                            found = True
-                            for valid_field in VALID_PORT_FIELDS:
-                                if src_port[valid_field] != dst_port[valid_field]:
-                                    different = True
-                                    break
-                            if found or different:
-                                break
-                    if not found or different:
-                        return True
-                # every port from the src exists in the dst, and none of them were different
-                return False
-
-            defined_ports = slb_virtual_data.get('virtual_server', {}).get('vport_list', [])
-
-            # we check for a needed update both ways, in case ports
-            # are missing from either the ones specified by the user
-            # or from those on the device
-            if needs_update(defined_ports, slb_virtual_ports) or needs_update(slb_virtual_ports, defined_ports):
-                result = axapi_call(module, session_url + '&method=slb.virtual_server.update', json.dumps(json_post))
+            defined = slb_virtual_data.get('virtual_server', {})
+            defined_ports = defined.get('vport_list', [])
+
+            if defined.get('address') != json_post['virtual_server']['address'] or \
+               defined.get('status') != json_post['virtual_server']['status']:
+                # ports are left out so that they are not rewritten
+                virtual_post = dict((k, json_post['virtual_server'][k]) for k in ('name', 'address', 'status'))
+                result = session.call('slb.virtual_server.update', {'virtual_server': virtual_post})
                 if axapi_failure(result):
-                    module.fail_json(msg="failed to create the virtual server: %s" % result['response']['err']['msg'])
+                    module.fail_json(msg="failed to update the virtual server: %s" % result['response']['err']['msg'])
+                changed = True
+
+            # only the ports that were added, removed or changed
+            # are sent to the device
+            port_diff = diff_ports(defined_ports, slb_virtual_ports)
+            if port_diff['added'] or port_diff['removed'] or port_diff['changed']:
+                update_ports(module, session, slb_virtual, port_diff)
                 changed = True
 
         # if we changed things, get the full info regarding
         # the service group for the return data below
         if changed:
-            result = axapi_call(module, session_url + '&method=slb.virtual_server.search', json.dumps({'name': slb_virtual}))
+            result = session.call('slb.virtual_server.search', {'name': slb_virtual})
         else:
             result = slb_virtual_data
     elif state == 'absent':
         if slb_virtual_exists:
-            result = axapi_call(module, session_url + '&method=slb.virtual_server.delete', json.dumps({'name': slb_virtual}))
+            result = session.call('slb.virtual_server.delete', {'name': slb_virtual})
             changed = True
         else:
             result = dict(msg="the virtual server was not present")
 
     # if the config has changed, save the config unless otherwise requested
     if changed and write_config:
-        write_result = axapi_call(module, session_url + '&method=system.action.write_memory')
-        if axapi_failure(write_result):
-            module.fail_json(msg="failed to save the configuration: %s" % write_result['response']['err']['msg'])
+        session.write_memory()
 
-    # log out of the session nicely and exit
-    axapi_call(module, session_url + '&method=session.close')
+    # log out of the session nicely (or keep a cached one open) and exit
+    session.close()
+    if port_diff is not None:
+        module.exit_json(changed=changed, content=result, ports=port_diff)
     module.exit_json(changed=changed, content=result)
 
 # standard ansible module imports
@@ -296,4 +587,3 @@ from ansible.module_utils.urls import *
 from ansible.module_utils.a10 import *
 
 main()
-
@@ -56,6 +56,17 @@ options:
         default: null
         choices: []
         aliases: []
+    wsdl_cache_dir:
+        description:
+            - Directory in which to cache the iControl WSDL files and parsed
+              SOAP client definitions, so that runs after the first, and every
+              concurrent worker, skip downloading and parsing them. Caching
+              is disabled when not set.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
     session:
         description:
             - BIG-IP session support; may be useful to avoid concurrency
@@ -71,8 +82,9 @@ options:
         default: null
         choices: ['address_class', 'certificate', 'client_ssl_profile',
                   'device_group', 'interface', 'key', 'node', 'pool', 'rule',
-                  'self_ip', 'software', 'system_info', 'traffic_group',
-                  'trunk', 'virtual_address', 'virtual_server', 'vlan']
+                  'self_ip', 'software', 'stats', 'system_info',
+                  'traffic_group', 'trunk', 'virtual_address',
+                  'virtual_server', 'vlan']
         aliases: []
     filter:
         description:
@@ -82,6 +94,169 @@ options:
         default: null
         choices: []
         aliases: []
+    exclude:
+        description:
+            - Shell-style glob matching string used to drop fact keys that
+              the filter would otherwise keep.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    include_filter:
+        description:
+            - Dictionary of fact category to filter, overriding I(filter)
+              for that category.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    partition:
+        description:
+            - Only collect objects from this partition. The device is
+              queried from the partition folder instead of the root folder,
+              so objects in other partitions are never downloaded. When not
+              set, a filter anchored to one partition, e.g. C(/Common/web*),
+              scopes the query the same way.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    recursive:
+        description:
+            - Whether to collect objects from subfolders, such as iApp
+              application folders, of the queried folder.
+        required: false
+        default: true
+        choices: ['yes', 'no']
+        aliases: []
+        version_added: "1.9"
+    max_workers:
+        description:
+            - Maximum number of fact categories collected concurrently. Each
+              worker opens its own iControl session, so raising this trades
+              extra connections on the device for shorter wall time when
+              several categories are included.
+        required: false
+        default: 1
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    fields:
+        description:
+            - List of fields to collect for each fact category, e.g.
+              C(lb_method,member). Each field costs one iControl call for the
+              whole object list, so trimming this list cuts round trips.
+              Not applicable for software, certificate and key fact
+              categories. Defaults to every field.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    cache_dir:
+        description:
+            - Directory on the host running the module in which to cache
+              collected fact categories. Cached categories are returned
+              without being re-collected until their TTL expires or the
+              device configuration changes, as tracked by the
+              Configsync.LocalConfigTime database variable and device group
+              sync status. Caching is disabled when not set.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    cache_ttl:
+        description:
+            - Lifetime in seconds of cached fact categories.
+        required: false
+        default: 300
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    cache_include_ttl:
+        description:
+            - Dictionary of fact category to cache lifetime in seconds,
+              overriding I(cache_ttl). A lifetime of 0 disables caching for
+              that category.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    output_file:
+        description:
+            - Write facts to this file, as JSON lines, instead of returning
+              them in C(ansible_facts). Each fact category is written as
+              soon as it is collected, one line per object holding the
+              C(include), object C(key) and C(facts), so large fact sets
+              are never held in memory at once. The module returns the file
+              path and a C(rows) count per fact category.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    previous:
+        description:
+            - Previously collected facts to compare against, e.g. the
+              registered result of an earlier run. When set, the module
+              returns only a C(delta) of added, removed and changed objects
+              per fact category, a C(summary) count per category, and a
+              C(digest) of per-object hashes which can be passed back as
+              I(previous) on the next run instead of the full facts.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    previous_file:
+        description:
+            - Like I(previous), but read from a JSON file of facts or digest,
+              or a JSON lines file written through I(output_file).
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    stats_samples:
+        description:
+            - Number of samples taken for the C(stats) fact category, which
+              reports runtime connection, throughput and request counters
+              per virtual server and pool member and CPU averages. Each
+              sample is one bulk statistics call per object type. With more
+              than one sample, every counter also gets a per-second
+              C(<name>_rate) computed over the sampling period, and gauges
+              are averaged.
+        required: false
+        default: 1
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    stats_interval:
+        description:
+            - Seconds to wait between C(stats) samples.
+        required: false
+        default: 10
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    timing:
+        description:
+            - Return a C(timing) report with the duration in seconds of the
+              iControl call behind each collected field, per fact category,
+              and a C(profile) report with the number of iControl round
+              trips and the wall time of each fact category, their totals,
+              and the peak resident memory of the module process in bytes
+              (C(peak_memory)).
+        required: false
+        default: false
+        choices: ['yes', 'no']
+        aliases: []
+        version_added: "1.9"
 '''
 
 EXAMPLES = '''
@@ -101,6 +276,76 @@ EXAMPLES = '''
       password=mysecret
       include=interface,vlan
 
+  - name: Collect virtual servers and pools of one partition, minus test objects
+    local_action: >
+      bigip_facts
+      server=lb.mydomain.com
+      user=admin
+      password=mysecret
+      include=virtual_server,pool
+      partition=tenant1
+      exclude=*test*
+
+  - name: Collect BIG-IP facts using four concurrent workers
+    local_action: >
+      bigip_facts
+      server=lb.mydomain.com
+      user=admin
+      password=mysecret
+      include=virtual_server,pool,node,virtual_address
+      max_workers=4
+
+  - name: Collect only pool load balancing method and members, timed
+    local_action: >
+      bigip_facts
+      server=lb.mydomain.com
+      user=admin
+      password=mysecret
+      include=pool
+      fields=lb_method,member
+      timing=yes
+
+  - name: Stream virtual server and pool facts to a JSON lines file
+    local_action: >
+      bigip_facts
+      server=lb.mydomain.com
+      user=admin
+      password=mysecret
+      include=virtual_server,pool,client_ssl_profile
+      output_file=/var/tmp/bigip-facts.jsonl
+
+  - name: Report virtual servers changed since the last digest
+    local_action: >
+      bigip_facts
+      server=lb.mydomain.com
+      user=admin
+      password=mysecret
+      include=virtual_server
+      previous_file=/var/tmp/bigip-digest.json
+    register: drift
+
+  - name: Sample virtual server and pool member throughput over 30 seconds
+    local_action: >
+      bigip_facts
+      server=lb.mydomain.com
+      user=admin
+      password=mysecret
+      include=stats
+      stats_samples=4
+      stats_interval=10
+
+  - name: Collect BIG-IP facts, reusing results cached in the last hour
+    local_action:
+      module: bigip_facts
+      server: lb.mydomain.com
+      user: admin
+      password: mysecret
+      include: virtual_server,pool,system_info
+      cache_dir: ~/.ansible/bigip_facts
+      cache_ttl: 3600
+      cache_include_ttl:
+        system_info: 0
+
 '''
 
 try:
@@ -114,6 +359,17 @@ else:
 import fnmatch
 import traceback
 import re
+import sys
+import threading
+import time
+import Queue
+import os
+import hashlib
+import tempfile
+try:
+    import json
+except ImportError:
+    import simplejson as json
 
 # ===========================================
 # bigip_facts module specific support methods.
@@ -126,10 +382,21 @@ class F5(object):
 
     Attributes:
         api: iControl API instance.
+        fetcher: FieldFetcher used for the fact category being collected.
+        stats_samples: Number of statistics samples to take.
+        stats_interval: Seconds between statistics samples.
     """
 
-    def __init__(self, host, user, password, session=False):
-        self.api = bigsuds.BIGIP(hostname=host, username=user, password=password)
+    def __init__(self, host, user, password, session=False, wsdl_cache_dir=None):
+        if wsdl_cache_dir:
+            self.api = bigsuds.BIGIP(hostname=host, username=user, password=password,
+                                     cachedir=os.path.expanduser(wsdl_cache_dir))
+        else:
+            self.api = bigsuds.BIGIP(hostname=host, username=user, password=password)
+        self.fetcher = FieldFetcher()
+        self.stats_samples = 1
+        self.stats_interval = 0
+        self.saved_active_folder = None
         if session:
             self.start_session()
 
@@ -157,6 +424,40 @@ class F5(object):
     def get_active_folder(self):
         return self.api.System.Session.get_active_folder()
 
+    def set_query_scope(self, folder="/", recursive=True):
+        """Scope list queries to a folder, saving the prior state once."""
+        if self.saved_active_folder is None:
+            self.saved_active_folder = self.get_active_folder()
+            self.saved_recursive_query_state = self.get_recursive_query_state()
+            self.active_folder = self.saved_active_folder
+            self.recursive_query_state = self.saved_recursive_query_state
+        if recursive:
+            state = "STATE_ENABLED"
+        else:
+            state = "STATE_DISABLED"
+        if self.active_folder != folder:
+            self.set_active_folder(folder)
+            self.active_folder = folder
+        if self.recursive_query_state != state:
+            self.set_recursive_query_state(state)
+            self.recursive_query_state = state
+
+    def enable_global_query(self):
+        """Query from the root folder recursively, saving the prior state."""
+        self.set_query_scope("/", True)
+
+    def restore_query_state(self):
+        """Restore the state saved by set_query_scope."""
+        if self.saved_active_folder is None:
+            return
+        if self.saved_active_folder and \
+           self.saved_active_folder != self.active_folder:
+            self.set_active_folder(self.saved_active_folder)
+        if self.saved_recursive_query_state and \
+           self.saved_recursive_query_state != self.recursive_query_state:
+            self.set_recursive_query_state(self.saved_recursive_query_state)
+        self.saved_active_folder = None
+
 
 class Interfaces(object):
     """Interfaces class.
@@ -620,6 +921,9 @@ class VirtualServers(object):
     def get_wildmask(self):
         return self.api.LocalLB.VirtualServer.get_wildmask(self.virtual_servers)
 
+    def get_statistics(self):
+        return self.api.LocalLB.VirtualServer.get_statistics(self.virtual_servers)
+
 
 class Pools(object):
     """Pools class.
@@ -725,6 +1029,9 @@ class Pools(object):
     def get_slow_ramp_time(self):
         return self.api.LocalLB.Pool.get_slow_ramp_time(self.pool_names)
 
+    def get_all_member_statistics(self):
+        return self.api.LocalLB.Pool.get_all_member_statistics(self.pool_names)
+
 
 class Devices(object):
     """Devices class.
@@ -942,7 +1249,7 @@ class Rules(object):
         self.rules = api.LocalLB.Rule.get_list()
         if regex:
             re_filter = re.compile(regex)
-            self.traffic_groups = filter(re_filter.search, self.rules)
+            self.rules = filter(re_filter.search, self.rules)
 
     def get_list(self):
         return self.rules
@@ -1355,31 +1662,112 @@ class SystemInfo(object):
     def get_uptime(self):
         return self.api.System.SystemInfo.get_uptime()
 
+    def get_global_cpu_usage_extended_information(self):
+        return self.api.System.SystemInfo.get_global_cpu_usage_extended_information()
+
+
+class RoundTripCounter(object):
+    """Round trip counter class.
+
+    Wraps an iControl API instance and counts the calls made through it,
+    each of which is one SOAP round trip to the device.
+
+    Attributes:
+        target: Wrapped API, namespace, interface or method.
+        root: RoundTripCounter holding the count.
+        round_trips: Number of calls made, on the root counter.
+    """
+
+    def __init__(self, target, root=None):
+        self.target = target
+        self.root = root or self
+        self.round_trips = 0
+
+    def __getattr__(self, name):
+        return RoundTripCounter(getattr(self.target, name), self.root)
+
+    def __call__(self, *args, **kwargs):
+        self.root.round_trips += 1
+        return self.target(*args, **kwargs)
+
+
+def get_peak_memory():
+    # peak resident set size of this process in bytes, or None where the
+    # resource module is unavailable; ru_maxrss is already in bytes on
+    # Mac OS X but in kilobytes on Linux and the BSDs
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak *= 1024
+    return peak
+
+
+class FieldFetcher(object):
+    """Field fetcher class.
 
-def generate_dict(api_obj, fields):
+    Fetches fact fields through the list-based iControl getters, one call
+    per field for the whole object list, optionally restricted to a subset
+    of fields and timed per field.
+
+    Attributes:
+        fields: List of field names to fetch, or None for all fields.
+        timing: Whether to record per-field timings.
+        timings: Dictionary of field name to call duration in seconds.
+    """
+
+    def __init__(self, fields=None, timing=False):
+        self.fields = fields
+        self.timing = timing
+        self.timings = {}
+
+    def select(self, fields):
+        if self.fields is None:
+            return fields
+        return [x for x in fields if x in self.fields]
+
+    def fetch(self, api_obj, field):
+        getter = getattr(api_obj, "get_" + field)
+        if not self.timing:
+            return getter()
+        start = time.time()
+        try:
+            return getter()
+        finally:
+            self.timings[field] = round(time.time() - start, 4)
+
+
+def generate_dict(api_obj, fields, fetcher=None):
+    if fetcher is None:
+        fetcher = FieldFetcher()
     result_dict = {}
     lists = []
     supported_fields = []
-    if api_obj.get_list():
-        for field in fields:
+    names = api_obj.get_list()
+    if names:
+        for field in fetcher.select(fields):
             try:
-                api_response = getattr(api_obj, "get_" + field)()
+                api_response = fetcher.fetch(api_obj, field)
             except MethodNotFound:
                 pass
             else:
                 lists.append(api_response)
                 supported_fields.append(field)
-        for i, j in enumerate(api_obj.get_list()):
+        for i, j in enumerate(names):
             temp = {}
             temp.update([(item[0], item[1][i]) for item in zip(supported_fields, lists)])
             result_dict[j] = temp
     return result_dict
 
-def generate_simple_dict(api_obj, fields):
+def generate_simple_dict(api_obj, fields, fetcher=None):
+    if fetcher is None:
+        fetcher = FieldFetcher()
     result_dict = {}
-    for field in fields:
+    for field in fetcher.select(fields):
         try:
-            api_response = getattr(api_obj, "get_" + field)()
+            api_response = fetcher.fetch(api_obj, field)
         except MethodNotFound:
             pass
         else:
@@ -1398,7 +1786,7 @@ def generate_interface_dict(f5, regex):
               'sfp_media_state', 'stp_active_edge_port_state',
               'stp_enabled_state', 'stp_link_type',
               'stp_protocol_detection_reset_state']
-    return generate_dict(interfaces, fields)
+    return generate_dict(interfaces, fields, f5.fetcher)
 
 def generate_self_ip_dict(f5, regex):
     self_ips = SelfIPs(f5.get_api(), regex)
@@ -1406,7 +1794,7 @@ def generate_self_ip_dict(f5, regex):
               'enforced_firewall_policy', 'floating_state', 'fw_rule',
               'netmask', 'staged_firewall_policy', 'traffic_group',
               'vlan', 'is_traffic_group_inherited']
-    return generate_dict(self_ips, fields)
+    return generate_dict(self_ips, fields, f5.fetcher)
 
 def generate_trunk_dict(f5, regex):
     trunks = Trunks(f5.get_api(), regex)
@@ -1415,7 +1803,7 @@ def generate_trunk_dict(f5, regex):
               'lacp_timeout_option', 'link_selection_policy', 'media_speed',
               'media_status', 'operational_member_count', 'stp_enabled_state',
               'stp_protocol_detection_reset_state']
-    return generate_dict(trunks, fields)
+    return generate_dict(trunks, fields, f5.fetcher)
 
 def generate_vlan_dict(f5, regex):
     vlans = Vlans(f5.get_api(), regex)
@@ -1426,7 +1814,7 @@ def generate_vlan_dict(f5, regex):
               'sflow_poll_interval', 'sflow_poll_interval_global',
               'sflow_sampling_rate', 'sflow_sampling_rate_global',
               'source_check_state', 'true_mac_address', 'vlan_id']
-    return generate_dict(vlans, fields)
+    return generate_dict(vlans, fields, f5.fetcher)
 
 def generate_vs_dict(f5, regex):
     virtual_servers = VirtualServers(f5.get_api(), regex)
@@ -1446,7 +1834,7 @@ def generate_vs_dict(f5, regex):
               'source_address_translation_type', 'source_port_behavior',
               'staged_firewall_policy', 'translate_address_state',
               'translate_port_state', 'type', 'vlan', 'wildmask']
-    return generate_dict(virtual_servers, fields)
+    return generate_dict(virtual_servers, fields, f5.fetcher)
 
 def generate_pool_dict(f5, regex):
     pools = Pools(f5.get_api(), regex)
@@ -1462,7 +1850,7 @@ def generate_pool_dict(f5, regex):
               'queue_on_connection_limit_state', 'queue_time_limit',
               'reselect_tries', 'server_ip_tos', 'server_link_qos',
               'simple_timeout', 'slow_ramp_time']
-    return generate_dict(pools, fields)
+    return generate_dict(pools, fields, f5.fetcher)
 
 def generate_device_dict(f5, regex):
     devices = Devices(f5.get_api(), regex)
@@ -1474,7 +1862,7 @@ def generate_device_dict(f5, regex):
               'optional_modules', 'platform_id', 'primary_mirror_address',
               'product', 'secondary_mirror_address', 'software_version',
               'timelimited_modules', 'timezone', 'unicast_addresses']
-    return generate_dict(devices, fields)
+    return generate_dict(devices, fields, f5.fetcher)
 
 def generate_device_group_dict(f5, regex):
     device_groups = DeviceGroups(f5.get_api(), regex)
@@ -1482,7 +1870,7 @@ def generate_device_group_dict(f5, regex):
               'device', 'full_load_on_sync_state',
               'incremental_config_sync_size_maximum',
               'network_failover_enabled_state', 'sync_status', 'type']
-    return generate_dict(device_groups, fields)
+    return generate_dict(device_groups, fields, f5.fetcher)
 
 def generate_traffic_group_dict(f5, regex):
     traffic_groups = TrafficGroups(f5.get_api(), regex)
@@ -1490,20 +1878,20 @@ def generate_traffic_group_dict(f5, regex):
               'default_device', 'description', 'ha_load_factor',
               'ha_order', 'is_floating', 'mac_masquerade_address',
               'unit_id']
-    return generate_dict(traffic_groups, fields)
+    return generate_dict(traffic_groups, fields, f5.fetcher)
 
 def generate_rule_dict(f5, regex):
     rules = Rules(f5.get_api(), regex)
     fields = ['definition', 'description', 'ignore_vertification',
               'verification_status']
-    return generate_dict(rules, fields)
+    return generate_dict(rules, fields, f5.fetcher)
 
 def generate_node_dict(f5, regex):
     nodes = Nodes(f5.get_api(), regex)
     fields = ['address', 'connection_limit', 'description', 'dynamic_ratio',
               'monitor_instance', 'monitor_rule', 'monitor_status',
               'object_status', 'rate_limit', 'ratio', 'session_status']
-    return generate_dict(nodes, fields)
+    return generate_dict(nodes, fields, f5.fetcher)
 
 def generate_virtual_address_dict(f5, regex):
     virtual_addresses = VirtualAddresses(f5.get_api(), regex)
@@ -1511,12 +1899,12 @@ def generate_virtual_address_dict(f5, regex):
               'description', 'enabled_state', 'icmp_echo_state',
               'is_floating_state', 'netmask', 'object_status',
               'route_advertisement_state', 'traffic_group']
-    return generate_dict(virtual_addresses, fields)
+    return generate_dict(virtual_addresses, fields, f5.fetcher)
 
 def generate_address_class_dict(f5, regex):
     address_classes = AddressClasses(f5.get_api(), regex)
     fields = ['address_class', 'description']
-    return generate_dict(address_classes, fields)
+    return generate_dict(address_classes, fields, f5.fetcher)
 
 def generate_certificate_dict(f5, regex):
     certificates = Certificates(f5.get_api(), regex)
@@ -1547,7 +1935,7 @@ def generate_client_ssl_profile_dict(f5, regex):
               'server_name', 'session_ticket_state', 'sni_default_state',
               'sni_require_state', 'ssl_option', 'strict_resume_state',
               'unclean_shutdown_state', 'is_base_profile', 'is_system_profile']
-    return generate_dict(profiles, fields)
+    return generate_dict(profiles, fields, f5.fetcher)
 
 def generate_system_info_dict(f5):
     system_info = SystemInfo(f5.get_api())
@@ -1559,7 +1947,7 @@ def generate_system_info_dict(f5):
               'product_information', 'pva_version', 'system_id',
               'system_information', 'time',
               'time_zone', 'uptime']
-    return generate_simple_dict(system_info, fields)
+    return generate_simple_dict(system_info, fields, f5.fetcher)
 
 def generate_software_list(f5):
     software = Software(f5.get_api())
@@ -1567,15 +1955,587 @@ def generate_software_list(f5):
     return software_list
 
 
+VIRTUAL_SERVER_STATISTICS = ['STATISTIC_CLIENT_SIDE_CURRENT_CONNECTIONS',
+                             'STATISTIC_CLIENT_SIDE_TOTAL_CONNECTIONS',
+                             'STATISTIC_CLIENT_SIDE_BYTES_IN',
+                             'STATISTIC_CLIENT_SIDE_BYTES_OUT',
+                             'STATISTIC_CLIENT_SIDE_PACKETS_IN',
+                             'STATISTIC_CLIENT_SIDE_PACKETS_OUT',
+                             'STATISTIC_TOTAL_REQUESTS']
+
+POOL_MEMBER_STATISTICS = ['STATISTIC_SERVER_SIDE_CURRENT_CONNECTIONS',
+                          'STATISTIC_SERVER_SIDE_TOTAL_CONNECTIONS',
+                          'STATISTIC_SERVER_SIDE_BYTES_IN',
+                          'STATISTIC_SERVER_SIDE_BYTES_OUT',
+                          'STATISTIC_SERVER_SIDE_PACKETS_IN',
+                          'STATISTIC_SERVER_SIDE_PACKETS_OUT',
+                          'STATISTIC_TOTAL_REQUESTS']
+
+def is_gauge_statistic(name):
+    # current connection counts and CPU averages are point-in-time values;
+    # everything else collected is a monotonically increasing counter
+    return 'current_connections' in name or '_avg_' in name
+
+def index_statistics(statistics, types=None):
+    result = {}
+    for statistic in statistics:
+        if types is None or statistic['type'] in types:
+            name = statistic['type'].replace('STATISTIC_', '').lower()
+            value = statistic['value']
+            result[name] = (long(value['high']) << 32) | long(value['low'])
+    return result
+
+def sample_statistics(virtual_servers, pools, system_info):
+    """Take one sample of runtime statistics, one call per object type.
+
+    Returns a dictionary keyed by (category, object[, member]) tuples.
+    """
+    sample = {}
+    if virtual_servers.get_list():
+        for entry in virtual_servers.get_statistics()['statistics']:
+            key = ('virtual_server', entry['virtual_server']['name'])
+            sample[key] = index_statistics(entry['statistics'], VIRTUAL_SERVER_STATISTICS)
+    if pools.get_list():
+        for pool, entries in zip(pools.get_list(), pools.get_all_member_statistics()):
+            for entry in entries['statistics']:
+                member = "%s:%s" % (entry['member']['address'], entry['member']['port'])
+                key = ('pool_member', pool, member)
+                sample[key] = index_statistics(entry['statistics'], POOL_MEMBER_STATISTICS)
+    try:
+        cpu = system_info.get_global_cpu_usage_extended_information()
+    except MethodNotFound:
+        pass
+    else:
+        sample[('cpu',)] = dict((k, v) for k, v in index_statistics(cpu['statistics']).items()
+                                if '_avg_' in k)
+    return sample
+
+def summarize_statistics(samples, elapsed):
+    """Reduce samples to one value per statistic plus per-second rates.
+
+    Gauges are averaged over all samples. Counters report their last
+    value and, given more than one sample, a <name>_rate computed from the
+    first and last samples; a counter that went backwards (cleared on the
+    device) gets no rate.
+    """
+    result = {}
+    for key, last in samples[-1].items():
+        stats = {}
+        for name, value in last.items():
+            values = [x[key][name] for x in samples if name in x.get(key, {})]
+            if is_gauge_statistic(name):
+                stats[name] = round(float(sum(values)) / len(values), 2)
+            else:
+                stats[name] = value
+                if elapsed > 0 and len(values) > 1 and values[-1] >= values[0]:
+                    stats[name + '_rate'] = round((values[-1] - values[0]) / elapsed, 2)
+        target = result
+        for part in key[:-1]:
+            target = target.setdefault(part, {})
+        target[key[-1]] = stats
+    return result
+
+def generate_stats_dict(f5, regex, samples=1, interval=0):
+    api = f5.get_api()
+    virtual_servers = VirtualServers(api, regex)
+    pools = Pools(api, regex)
+    system_info = SystemInfo(api)
+    taken = []
+    times = []
+    for i in range(max(1, samples)):
+        if i:
+            time.sleep(interval)
+        times.append(time.time())
+        taken.append(sample_statistics(virtual_servers, pools, system_info))
+    elapsed = times[-1] - times[0]
+    result = summarize_statistics(taken, elapsed)
+    result['samples'] = len(taken)
+    result['elapsed'] = round(elapsed, 2)
+    return result
+
+
+def generate_facts(f5, include, regex):
+    if include == 'interface':
+        return generate_interface_dict(f5, regex)
+    elif include == 'self_ip':
+        return generate_self_ip_dict(f5, regex)
+    elif include == 'trunk':
+        return generate_trunk_dict(f5, regex)
+    elif include == 'vlan':
+        return generate_vlan_dict(f5, regex)
+    elif include == 'virtual_server':
+        return generate_vs_dict(f5, regex)
+    elif include == 'pool':
+        return generate_pool_dict(f5, regex)
+    elif include == 'device':
+        return generate_device_dict(f5, regex)
+    elif include == 'device_group':
+        return generate_device_group_dict(f5, regex)
+    elif include == 'traffic_group':
+        return generate_traffic_group_dict(f5, regex)
+    elif include == 'rule':
+        return generate_rule_dict(f5, regex)
+    elif include == 'node':
+        return generate_node_dict(f5, regex)
+    elif include == 'virtual_address':
+        return generate_virtual_address_dict(f5, regex)
+    elif include == 'address_class':
+        return generate_address_class_dict(f5, regex)
+    elif include == 'software':
+        return generate_software_list(f5)
+    elif include == 'certificate':
+        return generate_certificate_dict(f5, regex)
+    elif include == 'key':
+        return generate_key_dict(f5, regex)
+    elif include == 'client_ssl_profile':
+        return generate_client_ssl_profile_dict(f5, regex)
+    elif include == 'system_info':
+        return generate_system_info_dict(f5)
+    elif include == 'stats':
+        return generate_stats_dict(f5, regex, f5.stats_samples,
+                                   f5.stats_interval)
+
+
+def get_config_generation(f5):
+    """Return a fingerprint of the device configuration generation.
+
+    Combines the Configsync.LocalConfigTime database variable, which the
+    device bumps on every configuration change, with the sync status of
+    each device group so that a sync from a peer also counts as a change.
+    """
+    api = f5.get_api()
+    generation = []
+    try:
+        generation.append(api.Management.DBVariable.query(variables=['Configsync.LocalConfigTime']))
+    except (MethodNotFound, bigsuds.OperationFailed):
+        pass
+    device_groups = DeviceGroups(api)
+    if device_groups.get_list():
+        generation.append(zip(device_groups.get_list(), device_groups.get_sync_status()))
+    return hashlib.sha1(json.dumps(generation, sort_keys=True, default=str)).hexdigest()
+
+
+class FactCache(object):
+    """Fact cache class.
+
+    On-disk cache of collected fact categories on the control host. Each
+    entry is keyed by server, user, fact category, query scope and field
+    list and is valid until its TTL expires or the device configuration
+    generation changes.
+
+    Attributes:
+        path: Cache directory.
+        ttl: Default entry lifetime in seconds.
+        include_ttl: Dictionary of fact category to entry lifetime.
+        key: List of values identifying the collection parameters.
+    """
+
+    def __init__(self, path, ttl, include_ttl=None, key=None):
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.include_ttl = include_ttl or {}
+        self.key = key or []
+
+    def entry_path(self, include, scope):
+        digest = hashlib.sha1(json.dumps(self.key + [include] + scope.key(), default=str)).hexdigest()
+        return os.path.join(self.path, "bigip_facts-%s.json" % digest)
+
+    def get_ttl(self, include):
+        return int(self.include_ttl.get(include, self.ttl))
+
+    def get(self, include, scope, generation):
+        try:
+            f = open(self.entry_path(include, scope))
+            try:
+                entry = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+        if entry.get('generation') != generation:
+            return None
+        if time.time() - entry.get('time', 0) > self.get_ttl(include):
+            return None
+        return entry.get('facts')
+
+    def set(self, include, scope, generation, facts):
+        if self.get_ttl(include) <= 0:
+            return
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, 0700)
+        entry = {'generation': generation, 'time': time.time(), 'facts': facts}
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix='.bigip_facts')
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump(entry, f, default=str)
+        finally:
+            f.close()
+        os.rename(tmp_path, self.entry_path(include, scope))
+
+
+class QueryScope(object):
+    """Query scope class.
+
+    Where and how a fact category is collected: the folder and recursion
+    state applied on the device before the object list is fetched, and the
+    regular expression applied to the returned names.
+
+    Attributes:
+        regex: Regular expression object names must match, or None.
+        folder: Active folder for list queries.
+        recursive: Whether list queries descend into subfolders.
+    """
+
+    def __init__(self, regex=None, folder="/", recursive=True):
+        self.regex = regex
+        self.folder = folder
+        self.recursive = recursive
+
+    def key(self):
+        return [self.regex, self.folder, self.recursive]
+
+
+def build_filter_regex(fact_filter=None, exclude=None):
+    """Combine shell-style include and exclude patterns into one regex.
+
+    Like the filter alone, each pattern is searched for anywhere in the
+    object name, so a name is kept when it matches the filter and does not
+    match the exclude pattern.
+    """
+    if not fact_filter and not exclude:
+        return None
+    regex = "^"
+    if exclude:
+        regex += "(?!.*?(?:%s))" % fnmatch.translate(exclude)
+    if fact_filter:
+        regex += "(?=.*?(?:%s))" % fnmatch.translate(fact_filter)
+    return regex
+
+
+def get_filter_folder(fact_filter):
+    """Return the folder and recursion a filter pattern confines itself to.
+
+    A pattern anchored to one partition, such as /Common/web*, can only
+    match objects under that partition, so only that folder needs to be
+    listed. Recursion is only needed when the rest of the pattern could
+    match a path separator.
+    """
+    match = re.match(r'^(/[^/*?\[]+)/(.*)$', fact_filter or '')
+    if not match:
+        return ("/", True)
+    recursive = re.search(r'[*?\[/]', match.group(2)) is not None
+    return (match.group(1), recursive)
+
+
+class FactWriter(object):
+    """JSON lines fact writer class.
+
+    Writes collected fact categories to a file, one JSON object per line,
+    as soon as each category is produced so that the full fact set never
+    has to be held in memory. Each line carries the fact category, the
+    object key and its facts. The file is written under a temporary name
+    and only moved into place once collection succeeds.
+
+    Attributes:
+        path: Output file path.
+        rows: Dictionary of fact category to number of lines written.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.rows = {}
+        self.lock = threading.Lock()
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path),
+                                             prefix='.bigip_facts')
+        self.file = os.fdopen(fd, 'w')
+
+    def write(self, include, facts):
+        if isinstance(facts, dict):
+            items = sorted(facts.items())
+        else:
+            items = enumerate(facts or [])
+        self.lock.acquire()
+        try:
+            count = 0
+            for key, value in items:
+                row = {'include': include, 'key': key, 'facts': value}
+                self.file.write(json.dumps(row, default=str) + "\n")
+                count += 1
+            self.rows[include] = count
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.file.close()
+        os.rename(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def hash_facts(facts):
+    return "sha1:" + hashlib.sha1(json.dumps(facts, sort_keys=True, default=str)).hexdigest()
+
+
+def index_facts(facts):
+    """Return category facts as a dictionary keyed by object."""
+    if isinstance(facts, dict):
+        return facts
+    return dict(enumerate(facts or []))
+
+
+def unwrap_snapshot(snapshot):
+    """Return the fact categories held by a snapshot.
+
+    A registered result of an earlier run holds them under digest (after a
+    delta run, whose ansible_facts is empty) or under ansible_facts; any
+    other snapshot is taken to be the categories themselves.
+    """
+    if 'digest' in snapshot:
+        return snapshot['digest']
+    if 'ansible_facts' in snapshot:
+        return snapshot['ansible_facts']
+    return snapshot
+
+
+def load_snapshot(path):
+    """Load previously collected facts from a file.
+
+    Accepts a JSON file holding the facts or a digest returned by an
+    earlier delta run, either on their own or as the whole registered
+    result, or a JSON lines file written through output_file.
+    """
+    f = open(os.path.expanduser(path))
+    try:
+        data = f.read()
+    finally:
+        f.close()
+    try:
+        snapshot = json.loads(data)
+    except ValueError:
+        snapshot = {}
+        for line in data.splitlines():
+            if line.strip():
+                row = json.loads(line)
+                snapshot.setdefault(row['include'], {})[row['key']] = row['facts']
+    return unwrap_snapshot(snapshot)
+
+
+def generate_delta(previous, name, facts):
+    """Compare one fact category against a previous snapshot.
+
+    Objects are compared by a hash of their collected fields. Previous
+    entries may hold either the facts themselves or the hash returned in
+    an earlier digest, so a digest is enough to detect changes.
+    """
+    current = index_facts(facts)
+    digest = dict((str(k), hash_facts(v)) for k, v in current.items())
+    old_digest = {}
+    for key, value in index_facts(previous.get(name)).items():
+        if isinstance(value, basestring) and value.startswith("sha1:"):
+            old_digest[str(key)] = value
+        else:
+            old_digest[str(key)] = hash_facts(value)
+    delta = {'added': {}, 'removed': [], 'changed': {}}
+    for key, value in current.items():
+        if str(key) not in old_digest:
+            delta['added'][key] = value
+        elif old_digest[str(key)] != digest[str(key)]:
+            delta['changed'][key] = value
+    delta['removed'] = sorted(x for x in old_digest if x not in digest)
+    summary = {'added': len(delta['added']),
+               'removed': len(delta['removed']),
+               'changed': len(delta['changed']),
+               'unchanged': len(current) - len(delta['added']) - len(delta['changed'])}
+    return delta, summary, digest
+
+
+# fact categories describing runtime state rather than configuration
+RUNTIME_INCLUDES = ('stats',)
+
+
+class FactCollector(object):
+    """Fact collection engine class.
+
+    Collects fact categories over a bounded pool of worker threads. Each
+    worker holds its own iControl connection and works through a shared
+    queue of categories; results are merged back in include order so the
+    returned facts do not depend on worker scheduling.
+
+    Attributes:
+        server: BIG-IP host.
+        user: BIG-IP username.
+        password: BIG-IP password.
+        session: Whether a single-worker run uses session support.
+        max_workers: Maximum number of concurrent workers.
+        fields: List of field names to fetch, or None for all fields.
+        timing: Whether to record per-field timings.
+        timings: Dictionary of fact category to per-field timings.
+        profile: Dictionary of fact category to iControl round trips and
+            wall time in seconds, recorded when timing is enabled.
+        cache: FactCache to read and store categories through, or None.
+        generation: Device configuration generation for cache entries.
+        cached: List of fact categories served from the cache.
+        writer: FactWriter that categories are streamed to, or None. When
+            set, collected categories are not kept in memory.
+        wsdl_cache_dir: Directory in which bigsuds caches WSDLs, or None.
+        stats_samples: Number of statistics samples to take.
+        stats_interval: Seconds between statistics samples.
+    """
+
+    def __init__(self, server, user, password, session=False, max_workers=1,
+                 fields=None, timing=False, cache=None, generation=None,
+                 writer=None, wsdl_cache_dir=None):
+        self.server = server
+        self.user = user
+        self.password = password
+        self.session = session
+        self.max_workers = max(1, max_workers)
+        self.fields = fields
+        self.timing = timing
+        self.timings = {}
+        self.profile = {}
+        self.cache = cache
+        self.generation = generation
+        self.cached = []
+        self.writer = writer
+        self.wsdl_cache_dir = wsdl_cache_dir
+        self.stats_samples = 1
+        self.stats_interval = 0
+
+    def connect(self, session):
+        f5 = F5(self.server, self.user, self.password, session,
+                self.wsdl_cache_dir)
+        f5.stats_samples = self.stats_samples
+        f5.stats_interval = self.stats_interval
+        if self.timing:
+            f5.api = RoundTripCounter(f5.api)
+        return f5
+
+    def collect_one(self, f5, name, scope):
+        f5.set_query_scope(scope.folder, scope.recursive)
+        f5.fetcher = FieldFetcher(self.fields, self.timing)
+        if self.timing:
+            round_trips = f5.api.round_trips
+            start = time.time()
+        facts = generate_facts(f5, name, scope.regex)
+        if self.timing:
+            self.timings[name] = f5.fetcher.timings
+            self.profile[name] = {
+                'round_trips': f5.api.round_trips - round_trips,
+                'seconds': round(time.time() - start, 4)}
+        if self.cache is not None and name not in RUNTIME_INCLUDES:
+            self.cache.set(name, scope, self.generation, facts)
+        return self.emit(name, facts)
+
+    def emit(self, name, facts):
+        if self.writer is not None:
+            self.writer.write(name, facts)
+            return None
+        return facts
+
+    def collect(self, include, scopes):
+        facts = {}
+        missing = []
+        for name in include:
+            cached_facts = None
+            if self.cache is not None and name not in RUNTIME_INCLUDES:
+                cached_facts = self.cache.get(name, scopes[name], self.generation)
+            if cached_facts is None:
+                missing.append(name)
+            else:
+                self.cached.append(name)
+                facts[name] = self.emit(name, cached_facts)
+        workers = min(self.max_workers, len(missing))
+        if workers == 1:
+            facts.update(self.collect_serial(missing, scopes))
+        elif workers > 1:
+            facts.update(self.collect_concurrent(missing, scopes, workers))
+        return facts
+
+    def collect_serial(self, include, scopes):
+        facts = {}
+        f5 = self.connect(self.session)
+        for name in include:
+            facts[name] = self.collect_one(f5, name, scopes[name])
+        f5.restore_query_state()
+        return facts
+
+    def collect_concurrent(self, include, scopes, workers):
+        pending = Queue.Queue()
+        for name in include:
+            pending.put(name)
+        results = {}
+        errors = {}
+        threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self.worker,
+                                      args=(pending, scopes, results, errors))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        # report the first failure in include order, not completion order
+        for name in include:
+            if name in errors:
+                raise errors[name]
+        facts = {}
+        for name in include:
+            facts[name] = results[name]
+        return facts
+
+    def worker(self, pending, scopes, results, errors):
+        # concurrent workers always use their own session so that active
+        # folder and recursive query state are never shared between them
+        try:
+            f5 = self.connect(True)
+        except Exception, e:
+            f5 = None
+            error = e
+        while True:
+            try:
+                name = pending.get_nowait()
+            except Queue.Empty:
+                break
+            if f5 is None:
+                errors[name] = error
+                continue
+            try:
+                results[name] = self.collect_one(f5, name, scopes[name])
+            except Exception, e:
+                errors[name] = e
+        if f5 is not None:
+            f5.restore_query_state()
+
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
             server = dict(type='str', required=True),
             user = dict(type='str', required=True),
             password = dict(type='str', required=True),
+            wsdl_cache_dir = dict(type='str', required=False),
             session = dict(type='bool', default=False),
             include = dict(type='list', required=True),
             filter = dict(type='str', required=False),
+            exclude = dict(type='str', required=False),
+            include_filter = dict(type='dict', required=False),
+            partition = dict(type='str', required=False),
+            recursive = dict(type='bool', default=True),
+            max_workers = dict(type='int', default=1),
+            fields = dict(type='list', required=False),
+            timing = dict(type='bool', default=False),
+            stats_samples = dict(type='int', default=1),
+            stats_interval = dict(type='int', default=10),
+            cache_dir = dict(type='str', required=False),
+            cache_ttl = dict(type='int', default=300),
+            cache_include_ttl = dict(type='dict', required=False),
+            output_file = dict(type='str', required=False),
+            previous = dict(type='dict', required=False),
+            previous_file = dict(type='str', required=False),
         )
     )
 
@@ -1585,79 +2545,126 @@ def main():
     server = module.params['server']
     user = module.params['user']
     password = module.params['password']
+    wsdl_cache_dir = module.params['wsdl_cache_dir']
     session = module.params['session']
+    max_workers = module.params['max_workers']
+    timing = module.params['timing']
+    stats_samples = module.params['stats_samples']
+    stats_interval = module.params['stats_interval']
+    cache_dir = module.params['cache_dir']
+    cache_ttl = module.params['cache_ttl']
+    cache_include_ttl = module.params['cache_include_ttl']
+    output_file = module.params['output_file']
+    previous = module.params['previous']
+    previous_file = module.params['previous_file']
+    fields = module.params['fields']
+    if fields is not None:
+        fields = map(lambda x: x.lower(), fields)
     fact_filter = module.params['filter']
-    if fact_filter:
-        regex = fnmatch.translate(fact_filter)
-    else:
-        regex = None
+    exclude = module.params['exclude']
+    include_filter = module.params['include_filter'] or {}
+    partition = module.params['partition']
+    recursive = module.params['recursive']
     include = map(lambda x: x.lower(), module.params['include'])
     valid_includes = ('address_class', 'certificate', 'client_ssl_profile',
                       'device_group', 'interface', 'key', 'node', 'pool',
-                      'rule', 'self_ip', 'software', 'system_info',
+                      'rule', 'self_ip', 'software', 'stats', 'system_info',
                       'traffic_group', 'trunk', 'virtual_address',
                       'virtual_server', 'vlan')
     include_test = map(lambda x: x in valid_includes, include)
     if not all(include_test):
         module.fail_json(msg="value of include must be one or more of: %s, got: %s" % (",".join(valid_includes), ",".join(include)))
 
-    try:
-        facts = {}
+    if max_workers < 1:
+        module.fail_json(msg="max_workers must be 1 or greater")
+
+    if stats_samples < 1 or stats_interval < 0:
+        module.fail_json(msg="stats_samples must be 1 or greater and stats_interval 0 or greater")
+
+    if previous is not None and previous_file:
+        module.fail_json(msg="previous and previous_file are mutually exclusive")
+
+    delta_mode = previous is not None or bool(previous_file)
+    if delta_mode and output_file:
+        module.fail_json(msg="output_file cannot be used with previous or previous_file")
+
+    # collect each category once, in the order requested
+    unique_include = []
+    for name in include:
+        if name not in unique_include:
+            unique_include.append(name)
+
+    # push filtering down to the device by scoping list queries to the
+    # partition a category's filter is anchored to
+    scopes = {}
+    for name in unique_include:
+        name_filter = include_filter.get(name, fact_filter)
+        if partition:
+            folder = "/%s" % partition.strip("/")
+            name_recursive = recursive
+        else:
+            folder, name_recursive = get_filter_folder(name_filter)
+            name_recursive = name_recursive and recursive
+        scopes[name] = QueryScope(build_filter_regex(name_filter, exclude),
+                                  folder, name_recursive)
 
-        if len(include) > 0:
-            f5 = F5(server, user, password, session)
-            saved_active_folder = f5.get_active_folder()
-            saved_recursive_query_state = f5.get_recursive_query_state()
-            if saved_active_folder != "/":
-                f5.set_active_folder("/")
-            if saved_recursive_query_state != "STATE_ENABLED":
-                f5.enable_recursive_query_state()
-
-            if 'interface' in include:
-                facts['interface'] = generate_interface_dict(f5, regex)
-            if 'self_ip' in include:
-                facts['self_ip'] = generate_self_ip_dict(f5, regex)
-            if 'trunk' in include:
-                facts['trunk'] = generate_trunk_dict(f5, regex)
-            if 'vlan' in include:
-                facts['vlan'] = generate_vlan_dict(f5, regex)
-            if 'virtual_server' in include:
-                facts['virtual_server'] = generate_vs_dict(f5, regex)
-            if 'pool' in include:
-                facts['pool'] = generate_pool_dict(f5, regex)
-            if 'device' in include:
-                facts['device'] = generate_device_dict(f5, regex)
-            if 'device_group' in include:
-                facts['device_group'] = generate_device_group_dict(f5, regex)
-            if 'traffic_group' in include:
-                facts['traffic_group'] = generate_traffic_group_dict(f5, regex)
-            if 'rule' in include:
-                facts['rule'] = generate_rule_dict(f5, regex)
-            if 'node' in include:
-                facts['node'] = generate_node_dict(f5, regex)
-            if 'virtual_address' in include:
-                facts['virtual_address'] = generate_virtual_address_dict(f5, regex)
-            if 'address_class' in include:
-                facts['address_class'] = generate_address_class_dict(f5, regex)
-            if 'software' in include:
-                facts['software'] = generate_software_list(f5)
-            if 'certificate' in include:
-                facts['certificate'] = generate_certificate_dict(f5, regex)
-            if 'key' in include:
-                facts['key'] = generate_key_dict(f5, regex)
-            if 'client_ssl_profile' in include:
-                facts['client_ssl_profile'] = generate_client_ssl_profile_dict(f5, regex)
-            if 'system_info' in include:
-                facts['system_info'] = generate_system_info_dict(f5)
-
-            # restore saved state
-            if saved_active_folder and saved_active_folder != "/":
-                f5.set_active_folder(saved_active_folder)
-            if saved_recursive_query_state and \
-               saved_recursive_query_state != "STATE_ENABLED":
-                f5.set_recursive_query_state(saved_recursive_query_state)
-
-        result = {'ansible_facts': facts}
+    start = time.time()
+    try:
+        if previous_file:
+            previous = load_snapshot(previous_file)
+        elif previous is not None:
+            previous = unwrap_snapshot(previous)
+
+        cache = None
+        generation = None
+        if cache_dir:
+            cache = FactCache(cache_dir, cache_ttl, cache_include_ttl,
+                              [server, user, fields])
+            f5 = F5(server, user, password, session, wsdl_cache_dir)
+            f5.enable_global_query()
+            generation = get_config_generation(f5)
+            f5.restore_query_state()
+
+        writer = None
+        if output_file:
+            writer = FactWriter(output_file)
+
+        collector = FactCollector(server, user, password, session,
+                                  max_workers, fields, timing, cache,
+                                  generation, writer, wsdl_cache_dir)
+        collector.stats_samples = stats_samples
+        collector.stats_interval = stats_interval
+        try:
+            facts = collector.collect(unique_include, scopes)
+        except:
+            if writer is not None:
+                writer.abort()
+            raise
+
+        if writer is not None:
+            writer.close()
+            result = {'ansible_facts': {}, 'output_file': writer.path,
+                      'rows': writer.rows}
+        elif delta_mode:
+            result = {'ansible_facts': {}, 'delta': {}, 'summary': {},
+                      'digest': {}}
+            for name in unique_include:
+                delta, summary, digest = generate_delta(previous, name,
+                                                        facts[name])
+                result['delta'][name] = delta
+                result['summary'][name] = summary
+                result['digest'][name] = digest
+        else:
+            result = {'ansible_facts': facts}
+        if cache_dir:
+            result['cached'] = collector.cached
+        if timing:
+            result['timing'] = collector.timings
+            result['profile'] = {
+                'categories': collector.profile,
+                'round_trips': sum(x['round_trips'] for x in collector.profile.values()),
+                'seconds': round(time.time() - start, 4),
+                'peak_memory': get_peak_memory()}
 
     except Exception, e:
         module.fail_json(msg="received exception: %s\ntraceback: %s" % (e, traceback.format_exc()))
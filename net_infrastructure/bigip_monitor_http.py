@@ -51,6 +51,14 @@ options:
             - BIG-IP password
         required: true
         default: null
+    wsdl_cache_dir:
+        description:
+            - Directory in which to cache the iControl WSDL files and parsed
+              SOAP client definitions, so that tasks after the first skip
+              downloading and parsing them. Caching is disabled when not set.
+        required: false
+        default: null
+        version_added: "1.9"
     state:
         description:
             - Monitor state
@@ -59,8 +67,8 @@ options:
         choices: ['present', 'absent']
     name:
         description:
-            - Monitor name
-        required: true
+            - Monitor name. Required unless I(monitors) is given.
+        required: false
         default: null
         aliases: ['monitor']
     partition:
@@ -131,6 +139,18 @@ options:
               from the node. The default API setting is 0.
         required: false
         default: none
+    monitors:
+        description:
+            - List of monitors to reconcile over one connection, each a
+              dictionary with C(name) and any of the other monitor options
+              (C(partition), C(state), C(parent), C(send), C(ip), ...), which
+              otherwise default to the task values. The template type,
+              properties and destination of all monitors are read in one
+              batch and only differing values are set. Mutually exclusive
+              with I(name).
+        required: false
+        default: none
+        version_added: "1.9"
 '''
 
 EXAMPLES = '''
@@ -153,8 +173,18 @@ EXAMPLES = '''
     user:               "{{ f5user }}"
     password:           "{{ f5password }}"
     name:               "{{ monitorname }}"
+- name: BIGIP F5 | Reconcile all HTTP Monitors in one task
+  local_action:
+    module:             bigip_monitor_http
+    state:              present
+    server:             "{{ f5server }}"
+    user:               "{{ f5user }}"
+    password:           "{{ f5password }}"
+    monitors:           "{{ f5monitors }}"
 '''
 
+import os
+
 try:
     import bigsuds
 except ImportError:
@@ -171,36 +201,22 @@ DEFAULT_PARENT_TYPE = 'http'
 # these should be re-useable for other monitor types
 #
 
-def bigip_api(bigip, user, password):
+def bigip_api(bigip, user, password, wsdl_cache_dir=None):
 
-    api = bigsuds.BIGIP(hostname=bigip, username=user, password=password)
+    if wsdl_cache_dir:
+        api = bigsuds.BIGIP(hostname=bigip, username=user, password=password,
+                            cachedir=os.path.expanduser(wsdl_cache_dir))
+    else:
+        api = bigsuds.BIGIP(hostname=bigip, username=user, password=password)
     return api
 
 
-def check_monitor_exists(module, api, monitor, parent):
+def create_monitor(api, monitor, template_attributes, template_type=None):
 
-    # hack to determine if monitor exists
-    result = False
+    if template_type is None:
+        template_type = TEMPLATE_TYPE
     try:
-        ttype = api.LocalLB.Monitor.get_template_type(template_names=[monitor])[0]
-        parent2 = api.LocalLB.Monitor.get_parent_template(template_names=[monitor])[0]
-        if ttype == TEMPLATE_TYPE and parent == parent2:
-            result = True
-        else:
-            module.fail_json(msg='Monitor already exists, but has a different type (%s) or parent(%s)' % (ttype, parent))
-    except bigsuds.OperationFailed, e:
-        if "was not found" in str(e):
-            result = False
-        else:
-            # genuine exception
-            raise
-    return result
-
-
-def create_monitor(api, monitor, template_attributes):
-
-    try:
-        api.LocalLB.Monitor.create_template(templates=[{'template_name': monitor, 'template_type': TEMPLATE_TYPE}], template_attributes=[template_attributes])
+        api.LocalLB.Monitor.create_template(templates=[{'template_name': monitor, 'template_type': template_type}], template_attributes=[template_attributes])
     except bigsuds.OperationFailed, e:
         if "already exists" in str(e):
             return False
@@ -224,77 +240,174 @@ def delete_monitor(api, monitor):
     return True
 
 
-def check_string_property(api, monitor, str_property):
+def set_ipport(api, monitor, ipport):
 
     try:
-        return str_property == api.LocalLB.Monitor.get_template_string_property([monitor], [str_property['type']])[0]
+        api.LocalLB.Monitor.set_template_destination(template_names=[monitor], destinations=[ipport])
+        return True, ""
+
     except bigsuds.OperationFailed, e:
-        # happens in check mode if not created yet
-        if "was not found" in str(e):
-            return True
+        if "Cannot modify the address type of monitor" in str(e):
+            return False, "Cannot modify the address type of monitor if already assigned to a pool."
         else:
             # genuine exception
             raise
 
 
-def set_string_property(api, monitor, str_property):
+def get_template_list(api):
 
-    api.LocalLB.Monitor.set_template_string_property(template_names=[monitor], values=[str_property])
+    # get_template_list only covers the active folder, so list the monitors
+    # of every partition from the root folder and restore the session
+    session = api.System.Session
+    active_folder = session.get_active_folder()
+    recursive_query_state = session.get_recursive_query_state()
+    session.set_active_folder(folder="/")
+    session.set_recursive_query_state("STATE_ENABLED")
+    try:
+        return api.LocalLB.Monitor.get_template_list()
+    finally:
+        session.set_recursive_query_state(recursive_query_state)
+        session.set_active_folder(folder=active_folder)
 
 
-def check_integer_property(api, monitor, int_property):
+def get_monitor_states(api, monitors):
 
-    try:
-        return int_property == api.LocalLB.Monitor.get_template_integer_property([monitor], [int_property['type']])[0]
-    except bigsuds.OperationFailed, e:
-        # happens in check mode if not created yet
-        if "was not found" in str(e):
-            return True
-        else:
-            # genuine exception
-            raise
+    # template type and parent of every existing monitor, in two calls
+    templates = dict((x['template_name'], x['template_type'])
+                     for x in get_template_list(api))
+    existing = [x for x in monitors if x in templates]
+    states = {}
+    if existing:
+        parents = api.LocalLB.Monitor.get_parent_template(template_names=existing)
+        for monitor, parent in zip(existing, parents):
+            states[monitor] = (templates[monitor], parent)
+    return states
 
 
+def get_ipports(api, monitors):
 
-def set_integer_property(api, monitor, int_property):
+    if not monitors:
+        return {}
+    return dict(zip(monitors, api.LocalLB.Monitor.get_template_destination(template_names=monitors)))
 
-    api.LocalLB.Monitor.set_template_int_property(template_names=[monitor], values=[int_property])
 
+def get_properties(getter, monitor_properties):
 
-def update_monitor_properties(api, module, monitor, template_string_properties, template_integer_properties):
+    # read any number of (monitor, property) pairs in one call
+    if not monitor_properties:
+        return []
+    return getter([m for m, p in monitor_properties], [p['type'] for m, p in monitor_properties])
 
-    changed = False
-    for str_property in template_string_properties:
-        if str_property['value'] is not None and not check_string_property(api, monitor, str_property):
-            if not module.check_mode:
-                set_string_property(api, monitor, str_property)
-            changed = True
-    for int_property in template_integer_properties:
-        if int_property['value'] is not None and not check_integer_property(api, monitor, int_property):
-            if not module.check_mode:
-                set_integer_property(api, monitor, int_property)
-            changed = True
 
-    return changed
+def set_properties(setter, monitor_properties):
 
+    if monitor_properties:
+        setter(template_names=[m for m, p in monitor_properties], values=[p for m, p in monitor_properties])
 
-def get_ipport(api, monitor):
 
-    return api.LocalLB.Monitor.get_template_destination(template_names=[monitor])[0]
+def create_monitors(api, specs):
 
+    # create every missing monitor in one call; if another task created
+    # some of them in the meantime, fall back to one at a time
+    try:
+        api.LocalLB.Monitor.create_template(templates=[{'template_name': x['monitor'], 'template_type': x['template_type']} for x in specs],
+                                            template_attributes=[x['template_attributes'] for x in specs])
+    except bigsuds.OperationFailed, e:
+        if "already exists" in str(e):
+            return [x['monitor'] for x in specs if create_monitor(api, x['monitor'], x['template_attributes'], x['template_type'])]
+        else:
+            # genuine exception
+            raise
+    return [x['monitor'] for x in specs]
 
-def set_ipport(api, monitor, ipport):
 
-    try:
-        api.LocalLB.Monitor.set_template_destination(template_names=[monitor], destinations=[ipport])
-        return True, ""
+def delete_monitors(api, monitors):
 
+    # maybe some were deleted since we checked
+    try:
+        api.LocalLB.Monitor.delete_template(template_names=monitors)
     except bigsuds.OperationFailed, e:
-        if "Cannot modify the address type of monitor" in str(e):
-            return False, "Cannot modify the address type of monitor if already assigned to a pool."
+        if "was not found" in str(e):
+            return [x for x in monitors if delete_monitor(api, x)]
         else:
             # genuine exception
             raise
+    return monitors
+
+
+def reconcile_monitors(module, api, items, build_monitor):
+
+    # items carry 'monitor', 'parent', 'template_type' and 'state' plus the
+    # monitor specific settings; build_monitor(item, cur_ipport) turns one
+    # into template attributes, properties and ipport. Existence, ipports,
+    # string and integer properties of all monitors are read with one call
+    # each, and only differing values are set, again one call per kind.
+    def check_states(items, states):
+        for item in items:
+            if item['monitor'] in states and states[item['monitor']] != (item['template_type'], item['parent']):
+                module.fail_json(msg='Monitor %s already exists, but has a different type (%s) or parent(%s)' % (item['monitor'], item['template_type'], item['parent']))
+
+    states = get_monitor_states(api, [x['monitor'] for x in items])
+    check_states(items, states)
+
+    absent = [x['monitor'] for x in items if x['state'] == 'absent' and x['monitor'] in states]
+    present = [x for x in items if x['state'] != 'absent']
+    cur_ipports = get_ipports(api, [x['monitor'] for x in present if x['monitor'] in states])
+    specs = [build_monitor(x, cur_ipports.get(x['monitor'])) for x in present]
+    to_create = [x for x in specs if x['monitor'] not in states]
+    existing = [x for x in specs if x['monitor'] in states]
+
+    if to_create and not module.check_mode:
+        created = create_monitors(api, to_create)
+        raced = [x for x in present if x['monitor'] not in states and x['monitor'] not in created]
+        if raced:
+            # created by someone else since the states were read: check
+            # them and reconcile them like the existing monitors
+            raced_states = get_monitor_states(api, [x['monitor'] for x in raced])
+            check_states(raced, raced_states)
+            cur_ipports.update(get_ipports(api, [x['monitor'] for x in raced]))
+            existing += [build_monitor(x, cur_ipports[x['monitor']]) for x in raced]
+        to_create = [x for x in to_create if x['monitor'] in created]
+
+    str_properties = [(x['monitor'], p) for x in existing for p in x['string_properties'] if p['value'] is not None]
+    int_properties = [(x['monitor'], p) for x in existing for p in x['integer_properties'] if p['value'] is not None]
+    cur_str = get_properties(api.LocalLB.Monitor.get_template_string_property, str_properties)
+    cur_int = get_properties(api.LocalLB.Monitor.get_template_integer_property, int_properties)
+    str_changes = [x for x, cur in zip(str_properties, cur_str) if x[1] != cur]
+    int_changes = [x for x, cur in zip(int_properties, cur_int) if x[1] != cur]
+    ipport_changes = [(x['monitor'], x['ipport']) for x in existing if cur_ipports[x['monitor']] != x['ipport']]
+    updated = sorted(set(m for m, p in str_changes + int_changes + ipport_changes))
+
+    # newly created monitors get the rest of their properties set afterwards
+    for x in to_create:
+        str_changes += [(x['monitor'], p) for p in x['string_properties'] if p['value'] is not None]
+        int_changes += [(x['monitor'], p) for p in x['integer_properties'] if p['value'] is not None]
+
+    result = {'changed': bool(absent or to_create or updated),
+              'created': [x['monitor'] for x in to_create],
+              'deleted': absent,
+              'updated': updated}
+    if module.check_mode:
+        return result
+
+    if absent:
+        result['deleted'] = delete_monitors(api, absent)
+    set_properties(api.LocalLB.Monitor.set_template_string_property, str_changes)
+    set_properties(api.LocalLB.Monitor.set_template_int_property, int_changes)
+    if ipport_changes:
+        try:
+            api.LocalLB.Monitor.set_template_destination(template_names=[m for m, i in ipport_changes],
+                                                         destinations=[i for m, i in ipport_changes])
+        except bigsuds.OperationFailed, e:
+            if "Cannot modify the address type of monitor" not in str(e):
+                # genuine exception
+                raise
+            for monitor, ipport in ipport_changes:
+                ok, msg = set_ipport(api, monitor, ipport)
+                if not ok:
+                    module.fail_json(msg="%s: %s" % (monitor, msg))
+    result['changed'] = bool(result['deleted'] or result['created'] or updated)
+    return result
 
 # ===========================================
 # main loop
@@ -302,61 +415,24 @@ def set_ipport(api, monitor, ipport):
 # writing a module for other monitor types should
 # only need an updated main() (and monitor specific functions)
 
-def main():
+MONITOR_OPTIONS = ['partition', 'state', 'name', 'parent', 'parent_partition',
+                   'send', 'receive', 'receive_disable', 'ip', 'port',
+                   'interval', 'timeout', 'time_until_up']
 
-    # begin monitor specific stuff
 
-    module = AnsibleModule(
-        argument_spec = dict(
-            server    = dict(required=True),
-            user      = dict(required=True),
-            password  = dict(required=True),
-            partition = dict(default='Common'),
-            state     = dict(default='present', choices=['present', 'absent']),
-            name      = dict(required=True),
-            parent    = dict(default=DEFAULT_PARENT_TYPE),
-            parent_partition = dict(default='Common'),
-            send      = dict(required=False),
-            receive   = dict(required=False),
-            receive_disable   = dict(required=False),
-            ip        = dict(required=False),
-            port      = dict(required=False, type='int'),
-            interval  = dict(required=False, type='int'),
-            timeout   = dict(required=False, type='int'),
-            time_until_up = dict(required=False, type='int', default=0)
-        ),
-        supports_check_mode=True
-    )
-
-    server = module.params['server']
-    user = module.params['user']
-    password = module.params['password']
-    partition = module.params['partition']
-    parent_partition = module.params['parent_partition']
-    state = module.params['state']
-    name = module.params['name']
-    parent = "/%s/%s" % (parent_partition, module.params['parent'])
-    monitor = "/%s/%s" % (partition, name)
-    send = module.params['send']
-    receive = module.params['receive']
-    receive_disable = module.params['receive_disable']
-    ip = module.params['ip']
-    port = module.params['port']
-    interval = module.params['interval']
-    timeout = module.params['timeout']
-    time_until_up = module.params['time_until_up']
-
-    # end monitor specific stuff
-
-    if not bigsuds_found:
-        module.fail_json(msg="the python bigsuds module is required")
-    api = bigip_api(server, user, password)
-    monitor_exists = check_monitor_exists(module, api, monitor, parent)
+def build_monitor(item, cur_ipport):
 
+    send = item['send']
+    receive = item['receive']
+    receive_disable = item['receive_disable']
+    ip = item['ip']
+    port = item['port']
+    interval = item['interval']
+    timeout = item['timeout']
+    time_until_up = item['time_until_up']
 
     # ipport is a special setting
-    if monitor_exists: # make sure to not update current settings if not asked
-        cur_ipport = get_ipport(api, monitor)
+    if cur_ipport is not None: # make sure to not update current settings if not asked
         if ip is None:
             ip = cur_ipport['ipport']['address']
         if port is None:
@@ -391,7 +467,7 @@ def main():
               'ipport': {'address': ip,
                          'port': port}}
 
-    template_attributes = {'parent_template': parent,
+    template_attributes = {'parent_template': item['parent'],
                            'interval': interval,
                            'timeout': timeout,
                            'dest_ipport': ipport,
@@ -413,45 +489,76 @@ def main():
                                    {'type': 'ITYPE_TIME_UNTIL_UP',
                                     'value': time_until_up}]
 
+    return {'monitor': item['monitor'],
+            'template_type': item['template_type'],
+            'template_attributes': template_attributes,
+            'string_properties': template_string_properties,
+            'integer_properties': template_integer_properties,
+            'ipport': ipport}
+
+
+def main():
+
+    # begin monitor specific stuff
+
+    module = AnsibleModule(
+        argument_spec = dict(
+            server    = dict(required=True),
+            user      = dict(required=True),
+            password  = dict(required=True),
+            wsdl_cache_dir = dict(required=False),
+            partition = dict(default='Common'),
+            state     = dict(default='present', choices=['present', 'absent']),
+            name      = dict(required=False),
+            parent    = dict(default=DEFAULT_PARENT_TYPE),
+            parent_partition = dict(default='Common'),
+            send      = dict(required=False),
+            receive   = dict(required=False),
+            receive_disable   = dict(required=False),
+            ip        = dict(required=False),
+            port      = dict(required=False, type='int'),
+            interval  = dict(required=False, type='int'),
+            timeout   = dict(required=False, type='int'),
+            time_until_up = dict(required=False, type='int', default=0),
+            monitors  = dict(required=False, type='list')
+        ),
+        required_one_of=[['name', 'monitors']],
+        mutually_exclusive=[['name', 'monitors']],
+        supports_check_mode=True
+    )
+
+    server = module.params['server']
+    user = module.params['user']
+    password = module.params['password']
+    wsdl_cache_dir = module.params['wsdl_cache_dir']
+    monitors = module.params['monitors']
+
+    # every monitor takes the task options, overridden by its own entry
+    items = []
+    for entry in monitors or [{}]:
+        item = dict((x, entry.get(x, module.params[x])) for x in MONITOR_OPTIONS)
+        if not item['name']:
+            module.fail_json(msg="each monitor must have a name")
+        if item['state'] not in ('present', 'absent'):
+            module.fail_json(msg="invalid state %s for monitor %s" % (item['state'], item['name']))
+        for x in ('port', 'interval', 'timeout', 'time_until_up'):
+            if item[x] is not None:
+                item[x] = int(item[x])
+        item['monitor'] = "/%s/%s" % (item['partition'], item['name'])
+        item['parent'] = "/%s/%s" % (item['parent_partition'], item['parent'])
+        item['template_type'] = TEMPLATE_TYPE
+        items.append(item)
+
+    # end monitor specific stuff
+
+    if not bigsuds_found:
+        module.fail_json(msg="the python bigsuds module is required")
+
     # main logic, monitor generic
 
     try:
-        result = {'changed': False}  # default
-
-
-        if state == 'absent':
-            if monitor_exists:
-                if not module.check_mode:
-                    # possible race condition if same task
-                    # on other node deleted it first
-                    result['changed'] |= delete_monitor(api, monitor)
-                else:
-                    result['changed'] |= True
-
-        else: # state present
-            ## check for monitor itself
-            if not monitor_exists: # create it
-                if not module.check_mode:
-                    # again, check changed status here b/c race conditions
-                    # if other task already created it
-                    result['changed'] |= create_monitor(api, monitor, template_attributes)
-                else:
-                    result['changed'] |= True
-
-            ## check for monitor parameters
-            # whether it already existed, or was just created, now update
-            # the update functions need to check for check mode but
-            # cannot update settings if it doesn't exist which happens in check mode
-            result['changed'] |= update_monitor_properties(api, module, monitor,
-                                                    template_string_properties,
-                                                    template_integer_properties)
-
-            # we just have to update the ipport if monitor already exists and it's different
-            if monitor_exists and cur_ipport != ipport:
-                set_ipport(api, monitor, ipport)
-                result['changed'] |= True
-            #else: monitor doesn't exist (check mode) or ipport is already ok
-
+        api = bigip_api(server, user, password, wsdl_cache_dir)
+        result = reconcile_monitors(module, api, items, build_monitor)
 
     except Exception, e:
         module.fail_json(msg="received exception: %s" % e)
@@ -461,4 +568,3 @@ def main():
 # import module snippets
 from ansible.module_utils.basic import *
 main()
-
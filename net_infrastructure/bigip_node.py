@@ -54,6 +54,16 @@ options:
         default: null
         choices: []
         aliases: []
+    wsdl_cache_dir:
+        description:
+            - Directory in which to cache the iControl WSDL files and parsed
+              SOAP client definitions, so that tasks after the first skip
+              downloading and parsing them. Caching is disabled when not set.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
     state:
         description:
             - Pool member state
@@ -139,6 +149,8 @@ EXAMPLES = '''
 
 '''
 
+import os
+
 try:
     import bigsuds
 except ImportError:
@@ -150,8 +162,12 @@ else:
 # bigip_node module specific
 #
 
-def bigip_api(bigip, user, password):
-    api = bigsuds.BIGIP(hostname=bigip, username=user, password=password)
+def bigip_api(bigip, user, password, wsdl_cache_dir=None):
+    if wsdl_cache_dir:
+        api = bigsuds.BIGIP(hostname=bigip, username=user, password=password,
+                            cachedir=os.path.expanduser(wsdl_cache_dir))
+    else:
+        api = bigsuds.BIGIP(hostname=bigip, username=user, password=password)
     return api
 
 def node_exists(api, address):
@@ -212,6 +228,7 @@ def main():
             server = dict(type='str', required=True),
             user = dict(type='str', required=True),
             password = dict(type='str', required=True),
+            wsdl_cache_dir = dict(type='str'),
             state = dict(type='str', default='present', choices=['present', 'absent']),
             partition = dict(type='str', default='Common'),
             name = dict(type='str', required=True),
@@ -227,6 +244,7 @@ def main():
     server = module.params['server']
     user = module.params['user']
     password = module.params['password']
+    wsdl_cache_dir = module.params['wsdl_cache_dir']
     state = module.params['state']
     partition = module.params['partition']
     host = module.params['host']
@@ -238,7 +256,7 @@ def main():
         module.fail_json(msg="host parameter invalid when state=absent")
 
     try:
-        api = bigip_api(server, user, password)
+        api = bigip_api(server, user, password, wsdl_cache_dir)
         result = {'changed': False}  # default
 
         if state == 'absent':
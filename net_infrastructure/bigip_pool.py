@@ -54,6 +54,16 @@ options:
         default: null
         choices: []
         aliases: []
+    wsdl_cache_dir:
+        description:
+            - Directory in which to cache the iControl WSDL files and parsed
+              SOAP client definitions, so that tasks after the first skip
+              downloading and parsing them. Caching is disabled when not set.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
     state:
         description:
             - Pool/pool member state
@@ -63,8 +73,8 @@ options:
         aliases: []
     name:
         description:
-            - Pool name
-        required: true
+            - Pool name. Required unless I(pools) is given.
+        required: false
         default: null
         choices: []
         aliases: ['pool']
@@ -146,6 +156,23 @@ options:
         default: null
         choices: []
         aliases: []
+    pools:
+        description:
+            - List of pools to reconcile in one task, each a dictionary with
+              C(name) and optionally C(partition), C(state), C(lb_method),
+              C(monitors), C(monitor_type), C(quorum), C(slow_ramp_time),
+              C(service_down_action) and C(members). C(partition) and
+              C(state) default to the task values. C(members) is a list of
+              C(host)/C(port) dictionaries; when given, the pool membership
+              is made to match it exactly. All pool attributes and
+              memberships are read in one batch and only the differences
+              are pushed, using one list call per attribute. Pools that are
+              not listed are left alone. Mutually exclusive with I(name).
+        required: False
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
 '''
 
 EXAMPLES = '''
@@ -206,6 +233,29 @@ EXAMPLES = '''
       host="{{ ansible_default_ipv4["address"] }}"
       port=80
 
+- hosts: localhost
+  tasks:
+  - name: Reconcile several pools and their members in one task
+    local_action:
+      module: bigip_pool
+      server: lb.mydomain.com
+      user: admin
+      password: mysecret
+      partition: matthite
+      pools:
+        - name: web-pool
+          lb_method: least_connection_member
+          monitors: ['/Common/http']
+          members:
+            - host: 10.0.0.1
+              port: 80
+            - host: 10.0.0.2
+              port: 80
+        - name: api-pool
+          slow_ramp_time: 60
+        - name: old-pool
+          state: absent
+
 - hosts: localhost
   tasks:
   - name: Delete pool
@@ -220,6 +270,8 @@ EXAMPLES = '''
 
 '''
 
+import os
+
 try:
     import bigsuds
 except ImportError:
@@ -231,8 +283,12 @@ else:
 # bigip_pool module specific support methods.
 #
 
-def bigip_api(bigip, user, password):
-    api = bigsuds.BIGIP(hostname=bigip, username=user, password=password)
+def bigip_api(bigip, user, password, wsdl_cache_dir=None):
+    if wsdl_cache_dir:
+        api = bigsuds.BIGIP(hostname=bigip, username=user, password=password,
+                            cachedir=os.path.expanduser(wsdl_cache_dir))
+    else:
+        api = bigsuds.BIGIP(hostname=bigip, username=user, password=password)
     return api
 
 def pool_exists(api, pool):
@@ -336,6 +392,220 @@ def add_pool_member(api, pool, address, port):
     members = [{'address': address, 'port': port}]
     api.LocalLB.Pool.add_member_v2(pool_names=[pool], members=[members])
 
+def check_monitors(module, monitors, monitor_type, quorum):
+    # returns the monitor type and quorum to use for a monitor list
+    if monitors:
+        if len(monitors) == 1:
+            # set default required values for single monitor
+            quorum = 0
+            monitor_type = 'single'
+        elif len(monitors) > 1:
+            if not monitor_type:
+                module.fail_json(msg="monitor_type required for monitors > 1")
+            if monitor_type == 'm_of_n' and not quorum:
+                module.fail_json(msg="quorum value required for monitor_type m_of_n")
+            if monitor_type != 'm_of_n':
+                quorum = 0
+    elif monitor_type:
+        # no monitors specified but monitor_type exists
+        module.fail_json(msg="monitor_type require monitors parameter")
+    elif quorum is not None:
+        # no monitors specified but quorum exists
+        module.fail_json(msg="quorum requires monitors parameter")
+    return (monitor_type, quorum)
+
+def full_path(partition, name):
+    if "/" in name:
+        return name
+    return "/%s/%s" % (partition, name)
+
+# bulk pool operations, used by the pools list mode
+
+def get_pool_list(api):
+    # get_list only covers the active folder, so list the pools of every
+    # partition from the root folder and restore the session afterwards
+    session = api.System.Session
+    active_folder = session.get_active_folder()
+    recursive_query_state = session.get_recursive_query_state()
+    session.set_active_folder(folder="/")
+    session.set_recursive_query_state("STATE_ENABLED")
+    try:
+        return api.LocalLB.Pool.get_list()
+    finally:
+        session.set_recursive_query_state(recursive_query_state)
+        session.set_active_folder(folder=active_folder)
+
+def create_pools(api, pools, lb_methods):
+    # create every missing pool in one call; if another task created
+    # some of them in the meantime, fall back to one at a time and
+    # return only the pools this call created
+    try:
+        api.LocalLB.Pool.create_v2(pool_names=pools,
+                                   lb_methods=["LB_METHOD_%s" % x.upper() for x in lb_methods],
+                                   members=[[] for x in pools])
+    except bigsuds.OperationFailed, e:
+        if "already exists" not in str(e):
+            # genuine exception
+            raise
+        created = []
+        for pool, lb_method in zip(pools, lb_methods):
+            try:
+                create_pool(api, pool, lb_method)
+                created.append(pool)
+            except bigsuds.OperationFailed, e:
+                if "already exists" not in str(e):
+                    raise
+        return created
+    return pools
+
+def get_pool_states(api, pools):
+    # read every managed attribute of the given pools, one call each
+    states = dict((pool, {}) for pool in pools)
+    if not pools:
+        return states
+    lb_methods = api.LocalLB.Pool.get_lb_method(pool_names=pools)
+    associations = api.LocalLB.Pool.get_monitor_association(pool_names=pools)
+    slow_ramp_times = api.LocalLB.Pool.get_slow_ramp_time(pool_names=pools)
+    actions = api.LocalLB.Pool.get_action_on_service_down(pool_names=pools)
+    members = api.LocalLB.Pool.get_member_v2(pool_names=pools)
+    for i, pool in enumerate(pools):
+        rule = associations[i]['monitor_rule']
+        states[pool] = {
+            'lb_method': lb_methods[i].strip().replace('LB_METHOD_', '').lower(),
+            'monitor_type': rule['type'].split("MONITOR_RULE_TYPE_")[-1].lower(),
+            'quorum': rule['quorum'],
+            'monitors': rule['monitor_templates'],
+            'slow_ramp_time': slow_ramp_times[i],
+            'service_down_action': actions[i].split("SERVICE_DOWN_ACTION_")[-1].lower(),
+            'members': [(x['address'], int(x['port'])) for x in members[i]],
+        }
+    return states
+
+def to_members(keys):
+    return [{'address': address, 'port': port} for address, port in keys]
+
+def reconcile_pools(module, api, partition, state, desired):
+    """Diff the desired pools against the device and apply the changes.
+
+    Reads the pool list and every managed attribute of the listed pools in
+    one call apiece, then pushes each kind of change as a single list call.
+    """
+    lb_method_choices = module.argument_spec['lb_method']['choices']
+    service_down_choices = module.argument_spec['service_down_action']['choices']
+    existing = set(get_pool_list(api))
+
+    wanted = {}
+    unwanted = []
+    for item in desired:
+        if not item.get('name'):
+            module.fail_json(msg="each pool must have a name")
+        item_partition = item.get('partition') or partition
+        pool = full_path(item_partition, item['name'])
+        if item.get('state', state) == 'absent':
+            if pool in existing:
+                unwanted.append(pool)
+            continue
+        spec = {}
+        if item.get('lb_method'):
+            spec['lb_method'] = item['lb_method'].lower()
+            if spec['lb_method'] not in lb_method_choices:
+                module.fail_json(msg="invalid lb_method %s for pool %s" % (item['lb_method'], pool))
+        if item.get('monitors'):
+            spec['monitors'] = [full_path(item_partition, x) for x in item['monitors']]
+        monitor_type = item.get('monitor_type')
+        if monitor_type:
+            monitor_type = monitor_type.lower()
+        quorum = item.get('quorum')
+        if quorum is not None:
+            quorum = int(quorum)
+        spec['monitor_type'], spec['quorum'] = check_monitors(module, spec.get('monitors'), monitor_type, quorum)
+        if item.get('slow_ramp_time'):
+            spec['slow_ramp_time'] = int(item['slow_ramp_time'])
+        if item.get('service_down_action'):
+            spec['service_down_action'] = item['service_down_action'].lower()
+            if spec['service_down_action'] not in service_down_choices:
+                module.fail_json(msg="invalid service_down_action %s for pool %s" % (item['service_down_action'], pool))
+        if item.get('members') is not None:
+            spec['members'] = []
+            for member in item['members']:
+                if not member.get('host') or not member.get('port'):
+                    module.fail_json(msg="each member of pool %s must have a host and a port" % pool)
+                spec['members'].append((full_path(item_partition, member['host']), int(member['port'])))
+        wanted[pool] = spec
+
+    to_create = sorted(x for x in wanted if x not in existing)
+    if to_create and not module.check_mode:
+        # pools created by someone else since the list was read are
+        # treated as existing ones below
+        to_create = create_pools(api, to_create,
+                                 [wanted[x].get('lb_method', 'round_robin') for x in to_create])
+    current = get_pool_states(api, sorted(x for x in wanted if x not in to_create))
+    for pool in to_create:
+        current[pool] = {'lb_method': wanted[pool].get('lb_method', 'round_robin'),
+                         'members': []}
+
+    changes = {'lb_method': [], 'monitors': [], 'slow_ramp_time': [],
+               'service_down_action': [], 'add_members': [],
+               'remove_members': []}
+    for pool in sorted(wanted):
+        spec = wanted[pool]
+        now = current[pool]
+        for attribute in ('lb_method', 'slow_ramp_time', 'service_down_action'):
+            if spec.get(attribute) and spec[attribute] != now.get(attribute):
+                changes[attribute].append((pool, spec[attribute]))
+        if spec.get('monitors'):
+            if (spec['monitor_type'] != now.get('monitor_type')) or \
+               (spec['quorum'] != now.get('quorum')) or \
+               (set(spec['monitors']) != set(now.get('monitors', []))):
+                changes['monitors'].append((pool, spec))
+        if 'members' in spec:
+            add = [x for x in spec['members'] if x not in now['members']]
+            remove = [x for x in now['members'] if x not in spec['members']]
+            if add:
+                changes['add_members'].append((pool, add))
+            if remove:
+                changes['remove_members'].append((pool, remove))
+
+    updated = set()
+    for attribute in changes:
+        updated.update(pool for pool, value in changes[attribute]
+                       if pool not in to_create)
+    result = {'changed': bool(to_create or unwanted or updated),
+              'created': to_create, 'deleted': sorted(unwanted),
+              'updated': sorted(updated)}
+
+    if module.check_mode:
+        return result
+
+    if unwanted:
+        api.LocalLB.Pool.delete_pool(pool_names=unwanted)
+    # lb_method of created pools was set by create_v2
+    lb_methods = [(x, v) for x, v in changes['lb_method'] if x not in to_create]
+    if lb_methods:
+        api.LocalLB.Pool.set_lb_method(pool_names=[x for x, v in lb_methods],
+                                       lb_methods=["LB_METHOD_%s" % v.upper() for x, v in lb_methods])
+    if changes['monitors']:
+        associations = []
+        for pool, spec in changes['monitors']:
+            monitor_rule = {'type': "MONITOR_RULE_TYPE_%s" % spec['monitor_type'].upper(),
+                            'quorum': spec['quorum'],
+                            'monitor_templates': spec['monitors']}
+            associations.append({'pool_name': pool, 'monitor_rule': monitor_rule})
+        api.LocalLB.Pool.set_monitor_association(monitor_associations=associations)
+    if changes['slow_ramp_time']:
+        api.LocalLB.Pool.set_slow_ramp_time(pool_names=[x for x, v in changes['slow_ramp_time']],
+                                            values=[v for x, v in changes['slow_ramp_time']])
+    if changes['service_down_action']:
+        api.LocalLB.Pool.set_action_on_service_down(pool_names=[x for x, v in changes['service_down_action']],
+                                                    actions=["SERVICE_DOWN_ACTION_%s" % v.upper() for x, v in changes['service_down_action']])
+    if changes['remove_members']:
+        api.LocalLB.Pool.remove_member_v2(pool_names=[x for x, v in changes['remove_members']],
+                                          members=[to_members(v) for x, v in changes['remove_members']])
+    if changes['add_members']:
+        api.LocalLB.Pool.add_member_v2(pool_names=[x for x, v in changes['add_members']],
+                                       members=[to_members(v) for x, v in changes['add_members']])
+    return result
+
 def main():
     lb_method_choices = ['round_robin', 'ratio_member',
                          'least_connection_member', 'observed_member',
@@ -359,8 +629,9 @@ def main():
             server = dict(type='str', required=True),
             user = dict(type='str', required=True),
             password = dict(type='str', required=True),
+            wsdl_cache_dir = dict(type='str'),
             state = dict(type='str', default='present', choices=['present', 'absent']),
-            name = dict(type='str', required=True, aliases=['pool']),
+            name = dict(type='str', aliases=['pool']),
             partition = dict(type='str', default='Common'),
             lb_method = dict(type='str', choices=lb_method_choices),
             monitor_type = dict(type='str', choices=monitor_type_choices),
@@ -369,8 +640,11 @@ def main():
             slow_ramp_time = dict(type='int'),
             service_down_action = dict(type='str', choices=service_down_choices),
             host = dict(type='str', aliases=['address']),
-            port = dict(type='int')
+            port = dict(type='int'),
+            pools = dict(type='list')
         ),
+        required_one_of=[['name', 'pools']],
+        mutually_exclusive=[['name', 'pools']],
         supports_check_mode=True
     )
 
@@ -380,10 +654,12 @@ def main():
     server = module.params['server']
     user = module.params['user']
     password = module.params['password']
+    wsdl_cache_dir = module.params['wsdl_cache_dir']
     state = module.params['state']
     name = module.params['name']
     partition = module.params['partition']
     pool = "/%s/%s" % (partition, name)
+    pools = module.params['pools']
     lb_method = module.params['lb_method']
     if lb_method:
         lb_method = lb_method.lower()
@@ -415,30 +691,16 @@ def main():
     if 1 > port > 65535:
         module.fail_json(msg="valid ports must be in range 1 - 65535")
 
-    if monitors:
-        if len(monitors) == 1:
-            # set default required values for single monitor
-            quorum = 0
-            monitor_type = 'single'
-        elif len(monitors) > 1:
-            if not monitor_type:
-                module.fail_json(msg="monitor_type required for monitors > 1")
-            if monitor_type == 'm_of_n' and not quorum:
-                module.fail_json(msg="quorum value required for monitor_type m_of_n")
-            if monitor_type != 'm_of_n':
-                quorum = 0
-    elif monitor_type:
-        # no monitors specified but monitor_type exists
-        module.fail_json(msg="monitor_type require monitors parameter")
-    elif quorum is not None:
-        # no monitors specified but quorum exists
-        module.fail_json(msg="quorum requires monitors parameter")
+    monitor_type, quorum = check_monitors(module, monitors, monitor_type, quorum)
 
     try:
-        api = bigip_api(server, user, password)
+        api = bigip_api(server, user, password, wsdl_cache_dir)
         result = {'changed': False}  # default
 
-        if state == 'absent':
+        if pools is not None:
+            result = reconcile_pools(module, api, partition, state, pools)
+
+        elif state == 'absent':
             if host and port and pool:
                 # member removal takes precedent
                 if pool_exists(api, pool) and member_exists(api, pool, address, port):
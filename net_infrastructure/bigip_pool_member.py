@@ -56,6 +56,16 @@ options:
         default: null
         choices: []
         aliases: []
+    wsdl_cache_dir:
+        description:
+            - Directory in which to cache the iControl WSDL files and parsed
+              SOAP client definitions, so that tasks after the first skip
+              downloading and parsing them. Caching is disabled when not set.
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
     state:
         description:
             - Pool member state
@@ -79,18 +89,40 @@ options:
         aliases: []
     host:
         description:
-            - Pool member IP
-        required: true
+            - Pool member IP. Required unless I(members) is given.
+        required: false
         default: null
         choices: []
         aliases: ['address', 'name']
     port:
         description:
-            - Pool member port
-        required: true
+            - Pool member port. Required unless I(members) is given.
+        required: false
         default: null
         choices: []
         aliases: []
+    members:
+        description:
+            - List of pool members to manage in one task, each a dictionary
+              with C(host) and C(port) and optionally C(connection_limit),
+              C(description), C(rate_limit), C(ratio) and C(state). Member
+              C(state) defaults to the task I(state). The pool membership
+              and member attributes are read in bulk once, and adds,
+              removes and attribute changes are each applied in a single
+              batched call. Mutually exclusive with I(host) and I(port).
+        required: false
+        default: null
+        choices: []
+        aliases: []
+        version_added: "1.9"
+    purge:
+        description:
+            - With I(members), remove pool members that are not listed.
+        required: false
+        default: false
+        choices: ['yes', 'no']
+        aliases: []
+        version_added: "1.9"
     connection_limit:
         description:
             - Pool member connection limit. Setting this to 0 disables the limit.
@@ -172,8 +204,31 @@ EXAMPLES = '''
       host="{{ ansible_default_ipv4["address"] }}"
       port=80
 
+  - name: Reconcile the full membership of a pool in one task
+    local_action:
+      module: bigip_pool_member
+      server: lb.mydomain.com
+      user: admin
+      password: mysecret
+      state: present
+      pool: matthite-pool
+      partition: matthite
+      purge: yes
+      members:
+        - host: 10.0.0.1
+          port: 80
+          ratio: 2
+        - host: 10.0.0.2
+          port: 80
+          description: "canary"
+        - host: 10.0.0.3
+          port: 80
+          state: absent
+
 '''
 
+import os
+
 try:
     import bigsuds
 except ImportError:
@@ -185,8 +240,12 @@ else:
 # bigip_pool_member module specific support methods.
 #
 
-def bigip_api(bigip, user, password):
-    api = bigsuds.BIGIP(hostname=bigip, username=user, password=password)
+def bigip_api(bigip, user, password, wsdl_cache_dir=None):
+    if wsdl_cache_dir:
+        api = bigsuds.BIGIP(hostname=bigip, username=user, password=password,
+                            cachedir=os.path.expanduser(wsdl_cache_dir))
+    else:
+        api = bigsuds.BIGIP(hostname=bigip, username=user, password=password)
     return api
 
 def pool_exists(api, pool):
@@ -276,22 +335,143 @@ def set_ratio(api, pool, address, port, ratio):
     members = [{'address': address, 'port': port}]
     api.LocalLB.Pool.set_member_ratio(pool_names=[pool], members=[members], ratios=[[ratio]])
 
+# bulk member operations, used by the members list mode
+
+MEMBER_ATTRIBUTES = {
+    'connection_limit': ('get_member_connection_limit', 'set_member_connection_limit', 'limits'),
+    'description': ('get_member_description', 'set_member_description', 'descriptions'),
+    'rate_limit': ('get_member_rate_limit', 'set_member_rate_limit', 'limits'),
+    'ratio': ('get_member_ratio', 'set_member_ratio', 'ratios'),
+}
+
+def get_members(api, pool):
+    return api.LocalLB.Pool.get_member_v2(pool_names=[pool])[0]
+
+def get_member_attributes(api, pool, members, attribute):
+    getter = getattr(api.LocalLB.Pool, MEMBER_ATTRIBUTES[attribute][0])
+    return getter(pool_names=[pool], members=[members])[0]
+
+def set_member_attributes(api, pool, members, attribute, values):
+    setter = getattr(api.LocalLB.Pool, MEMBER_ATTRIBUTES[attribute][1])
+    kwargs = {MEMBER_ATTRIBUTES[attribute][2]: [values]}
+    setter(pool_names=[pool], members=[members], **kwargs)
+
+def add_pool_members(api, pool, members):
+    api.LocalLB.Pool.add_member_v2(pool_names=[pool], members=[members])
+
+def remove_pool_members(api, pool, members):
+    api.LocalLB.Pool.remove_member_v2(pool_names=[pool], members=[members])
+
+def delete_node_addresses(api, addresses):
+    # try all nodes in one call; if any is still referenced by another
+    # pool the whole call fails, so fall back to one node at a time
+    try:
+        api.LocalLB.NodeAddressV2.delete_node_address(nodes=addresses)
+        return addresses
+    except bigsuds.OperationFailed, e:
+        if "is referenced by a member of pool" not in str(e):
+            raise
+    return [x for x in addresses if delete_node_address(api, x)]
+
+def member_key(member):
+    return (member['address'], int(member['port']))
+
+def member_name(member):
+    return "%s:%s" % member_key(member)
+
+def reconcile_members(module, api, pool, partition, desired, state, purge):
+    """Diff the desired members against the pool and apply the changes.
+
+    Reads the current membership and each managed attribute in one call
+    apiece, then issues at most one add, one remove and one set call per
+    attribute.
+    """
+    current = [{'address': x['address'], 'port': x['port']} for x in get_members(api, pool)]
+    current_keys = set(member_key(x) for x in current)
+
+    wanted = {}
+    unwanted = set()
+    for item in desired:
+        if not item.get('host') or not item.get('port'):
+            module.fail_json(msg="each member must have a host and a port")
+        port = int(item['port'])
+        if not 1 <= port <= 65535:
+            module.fail_json(msg="valid ports must be in range 1 - 65535")
+        member = {'address': "/%s/%s" % (partition, item['host']), 'port': port}
+        if item.get('state', state) == 'absent':
+            unwanted.add(member_key(member))
+        else:
+            wanted[member_key(member)] = (member, item)
+
+    to_add = [m for k, (m, item) in sorted(wanted.items()) if k not in current_keys]
+    to_remove = [m for m in current if member_key(m) in unwanted or
+                 (purge and member_key(m) not in wanted)]
+
+    # read attributes of existing members in bulk, only for attributes
+    # that are actually being managed
+    existing = [m for m in current if member_key(m) in wanted]
+    changes = {}
+    for attribute in sorted(MEMBER_ATTRIBUTES):
+        managed = [(m, item) for m, item in wanted.values()
+                   if item.get(attribute) is not None]
+        if not managed:
+            continue
+        current_values = {}
+        if existing:
+            values = get_member_attributes(api, pool, existing, attribute)
+            current_values = dict(zip([member_key(m) for m in existing], values))
+        for member, item in managed:
+            value = item[attribute]
+            if attribute != 'description':
+                value = int(value)
+            if current_values.get(member_key(member)) != value:
+                changes.setdefault(attribute, []).append((member, value))
+
+    updated = set()
+    for attribute in changes:
+        updated.update(member_name(m) for m, value in changes[attribute]
+                       if member_key(m) in current_keys)
+    result = {'changed': bool(to_add or to_remove or updated),
+              'added': [member_name(m) for m in to_add],
+              'removed': [member_name(m) for m in to_remove],
+              'updated': sorted(updated)}
+
+    if module.check_mode:
+        return result
+
+    if to_remove:
+        remove_pool_members(api, pool, to_remove)
+        addresses = sorted(set(m['address'] for m in to_remove))
+        result['deleted'] = delete_node_addresses(api, addresses)
+    if to_add:
+        add_pool_members(api, pool, to_add)
+    for attribute in sorted(changes):
+        members = [m for m, value in changes[attribute]]
+        values = [value for m, value in changes[attribute]]
+        set_member_attributes(api, pool, members, attribute, values)
+    return result
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
             server = dict(type='str', required=True),
             user = dict(type='str', required=True),
             password = dict(type='str', required=True),
+            wsdl_cache_dir = dict(type='str'),
             state = dict(type='str', default='present', choices=['present', 'absent']),
             pool = dict(type='str', required=True),
             partition = dict(type='str', default='Common'),
-            host = dict(type='str', required=True, aliases=['address', 'name']),
-            port = dict(type='int', required=True),
+            host = dict(type='str', aliases=['address', 'name']),
+            port = dict(type='int'),
+            members = dict(type='list'),
+            purge = dict(type='bool', default=False),
             connection_limit = dict(type='int'),
             description = dict(type='str'),
             rate_limit = dict(type='int'),
             ratio = dict(type='int')
         ),
+        required_one_of=[['host', 'members']],
+        mutually_exclusive=[['host', 'members'], ['port', 'members']],
         supports_check_mode=True
     )
 
@@ -301,6 +481,7 @@ def main():
     server = module.params['server']
     user = module.params['user']
     password = module.params['password']
+    wsdl_cache_dir = module.params['wsdl_cache_dir']
     state = module.params['state']
     partition = module.params['partition']
     pool = "/%s/%s" % (partition, module.params['pool'])
@@ -311,22 +492,29 @@ def main():
     host = module.params['host']
     address = "/%s/%s" % (partition, host)
     port = module.params['port']
+    members = module.params['members']
+    purge = module.params['purge']
 
     # sanity check user supplied values
 
-    if (host and not port) or (port and not host):
-        module.fail_json(msg="both host and port must be supplied")
+    if members is None:
+        if (host and not port) or (port and not host):
+            module.fail_json(msg="both host and port must be supplied")
 
-    if 1 > port > 65535:
-        module.fail_json(msg="valid ports must be in range 1 - 65535")
+        if 1 > port > 65535:
+            module.fail_json(msg="valid ports must be in range 1 - 65535")
 
     try:
-        api = bigip_api(server, user, password)
+        api = bigip_api(server, user, password, wsdl_cache_dir)
         if not pool_exists(api, pool):
             module.fail_json(msg="pool %s does not exist" % pool)
         result = {'changed': False}  # default
 
-        if state == 'absent':
+        if members is not None:
+            result = reconcile_members(module, api, pool, partition, members,
+                                       state, purge)
+
+        elif state == 'absent':
             if member_exists(api, pool, address, port):
                 if not module.check_mode:
                     remove_pool_member(api, pool, address, port)
@@ -92,6 +92,20 @@ options:
     required: false
     default: null
 
+  records:
+    description:
+      - List of records to sync in one task, each a dictionary with C(name), C(type) and C(value), and optionally C(ttl) (defaults to I(ttl)) and C(priority). With state=present the records listed for a name and type become the complete set for that name and type; existing records with other values are updated to the listed values or deleted. With state=absent the listed records are deleted. The zone is read once and only the differences are sent; the planned creates, updates and deletes are returned in C(plan), also in check mode. Mutually exclusive with I(record) and I(record_ids).
+    required: false
+    default: null
+    version_added: "1.9"
+
+  purge:
+    description:
+      - With I(records) and state=present, also delete the records whose name and type are not listed at all. System records such as SOA and the DNSimple name servers are never deleted.
+    required: false
+    default: no
+    version_added: "1.9"
+
 requirements: [ dnsimple ]
 author: Alex Coomans
 '''
@@ -127,6 +141,17 @@ EXAMPLES = '''
 # and delete the record
 - local_action: dnsimpledomain=my.com record= type=CNAME value=example.com state=absent
 
+# make the www and mail records of my.com match a list, and remove all others
+- local_action:
+    module: dnsimple
+    domain: my.com
+    state: present
+    purge: yes
+    records:
+      - { name: www, type: A, value: 192.168.0.1 }
+      - { name: www, type: A, value: 192.168.0.2 }
+      - { name: '', type: MX, value: mail.my.com, priority: 10 }
+
 '''
 
 import os
@@ -137,6 +162,74 @@ except ImportError:
     print "failed=True msg='dnsimple required for this module'"
     sys.exit(1)
 
+def index_records(records):
+    '''
+    Indexes records by (name, type, content) and by (name, type), so that
+    lookups do not have to scan the whole zone.
+    '''
+    by_value = {}
+    by_type = {}
+    for r in records:
+        by_value.setdefault((r['name'], r['record_type'], r['content']), r)
+        by_type.setdefault((r['name'], r['record_type']), []).append(r)
+    return by_value, by_type
+
+def plan_records(records, desired, state, purge):
+    '''
+    Diffs the desired records against the zone and returns the records to
+    create, the updates to make (as record id, data and resulting record)
+    and the records to delete.
+    '''
+    by_value, by_type = index_records(records)
+    create = []
+    update = []
+    delete = []
+
+    if state == 'absent':
+        for d in desired:
+            rr = by_value.get((d['name'], d['record_type'], d['content']))
+            if rr:
+                delete.append(rr)
+        return create, update, delete
+
+    wanted = {}
+    for d in desired:
+        wanted.setdefault((d['name'], d['record_type']), []).append(d)
+
+    for key, group in wanted.items():
+        existing = {}
+        for r in by_type.get(key, []):
+            existing.setdefault(r['content'], []).append(r)
+        unmatched = []
+        for d in group:
+            matches = existing.get(d['content'])
+            if not matches:
+                unmatched.append(d)
+                continue
+            rr = matches.pop()
+            # an unspecified priority leaves the current one alone
+            if rr['ttl'] != d['ttl'] or (d['prio'] is not None and rr['prio'] != d['prio']):
+                data = dict((k, d[k]) for k in ('ttl', 'prio') if d[k] is not None)
+                update.append((rr['id'], data, dict(rr, **data)))
+        # reuse leftover records of the same name and type for the
+        # remaining values before creating new ones
+        leftover = [r for matches in existing.values() for r in matches]
+        for d in unmatched:
+            if leftover:
+                rr = leftover.pop()
+                data = dict((k, d[k]) for k in ('content', 'ttl', 'prio') if d[k] is not None)
+                update.append((rr['id'], data, dict(rr, **data)))
+            else:
+                create.append(dict((k, v) for k, v in d.items() if v is not None))
+        delete.extend(leftover)
+
+    if purge:
+        for key, group in by_type.items():
+            if key not in wanted:
+                delete.extend(r for r in group if not r.get('system_record') and r['record_type'] != 'SOA')
+
+    return create, update, delete
+
 def main():
     module = AnsibleModule(
         argument_spec = dict(
@@ -151,10 +244,13 @@ def main():
             priority          = dict(required=False, type='int'), 
             state             = dict(required=False, choices=['present', 'absent']),
             solo              = dict(required=False, type='bool'),
+            records           = dict(required=False, type='list'),
+            purge             = dict(required=False, default=False, type='bool'),
         ),
         required_together = (
             ['record', 'value']
         ),
+        mutually_exclusive = [['records', 'record'], ['records', 'record_ids']],
         supports_check_mode = True,
     )
 
@@ -169,6 +265,8 @@ def main():
     priority          = module.params.get('priority')
     state             = module.params.get('state')
     is_solo           = module.params.get('solo')
+    desired_records   = module.params.get('records')
+    purge             = module.params.get('purge')
 
     if account_email and account_api_token:
         client = DNSimple(email=account_email, api_token=account_api_token)
@@ -186,7 +284,7 @@ def main():
             module.exit_json(changed=False, result=[d['domain'] for d in domains])
 
         # Domain & No record
-        if domain and record is None and not record_ids:
+        if domain and record is None and not record_ids and desired_records is None:
             domains = [d['domain'] for d in client.domains()]
             if domain.isdigit():
                 dr = next((d for d in domains if d['id'] == int(domain)), None)
@@ -210,6 +308,39 @@ def main():
             else:
                 module.fail_json(msg="'%s' is an unknown value for the state argument" % state)
 
+        # sync a list of records against a single read of the zone
+        if domain and desired_records is not None:
+            if state not in ('present', 'absent'):
+                module.fail_json(msg="'%s' is an unknown value for the state argument" % state)
+
+            desired = []
+            for item in desired_records:
+                if 'name' not in item or not item.get('type') or not item.get('value'):
+                    module.fail_json(msg="each record must have a name, type and value")
+                desired.append({
+                    'name':        item['name'],
+                    'record_type': item['type'].upper(),
+                    'content':     str(item['value']),
+                    'ttl':         int(item.get('ttl', ttl)),
+                    'prio':        None,
+                })
+                if item.get('priority') is not None:
+                    desired[-1]['prio'] = int(item['priority'])
+
+            records = [r['record'] for r in client.records(str(domain))]
+            create, update, delete = plan_records(records, desired, state, purge)
+            plan = dict(create=create, update=[u[2] for u in update], delete=delete)
+            changed = bool(create or update or delete)
+
+            if not module.check_mode:
+                for rr in delete:
+                    client.delete_record(str(domain), rr['id'])
+                for rid, data, rr in update:
+                    client.update_record(str(domain), str(rid), data)
+                for data in create:
+                    client.add_record(str(domain), data)
+            module.exit_json(changed=changed, plan=plan)
+
         # need the not none check since record could be an empty string
         if domain and record is not None:
             records = [r['record'] for r in client.records(str(domain))]
@@ -220,13 +351,14 @@ def main():
             if not value:
                 module.fail_json(msg="Missing the record value")
 
-            rr = next((r for r in records if r['name'] == record and r['record_type'] == record_type and r['content'] == value), None)
+            by_value, by_type = index_records(records)
+            rr = by_value.get((record, record_type, value))
 
             if state == 'present':
                 changed = False
                 if is_solo:
                     # delete any records that have the same name and record type
-                    same_type = [r['id'] for r in records if r['name'] == record and r['record_type'] == record_type]
+                    same_type = [r['id'] for r in by_type.get((record, record_type), [])]
                     if rr:
                         same_type = [rid for rid in same_type if rid != rr['id']]
                     if same_type:
@@ -82,9 +82,46 @@ options:
     choices: ['yes', 'no']
     version_added: 1.5.1
 
+  cache_dir:
+    description:
+      - Directory on the control host in which the domain list of the account and the record list of each domain are cached, so that consecutive tasks do not download them again. Records created, updated or deleted by this module are applied to the cache in place; changes made elsewhere are only seen once the cache expires.
+    required: false
+    default: null
+    version_added: "1.9"
+
+  cache_ttl:
+    description:
+      - Seconds after which the cached domain and record lists are downloaded again.
+    required: false
+    default: 300
+    version_added: "1.9"
+
+  records:
+    description:
+      - List of records to reconcile in one task, each a dictionary with C(name), C(type) and C(value), and optionally C(ttl) (defaults to I(record_ttl)). The records listed for a name and type are the complete set for that name and type; existing ones with other values are updated to the listed values or deleted. The domain's records are read once and the changes are sent through the multi-record create, update and delete calls. Mutually exclusive with I(record_name).
+    required: false
+    default: null
+    version_added: "1.9"
+
+  purge:
+    description:
+      - With I(records), also delete the records whose name and type are not listed at all.
+    required: false
+    default: 'no'
+    choices: ['yes', 'no']
+    version_added: "1.9"
+
+  rate_limit:
+    description:
+      - Maximum number of API requests per five minutes. Requests are delayed rather than rejected once the limit is reached, and the limit is lowered to what the API reports as remaining.
+    required: false
+    default: 150
+    version_added: "1.9"
+
 notes:
   - The DNS Made Easy service requires that machines interacting with the API have the proper time and timezone set. Be sure you are within a few seconds of actual time by using NTP. 
   - This module returns record(s) in the "result" element when 'state' is set to 'present'. This value can be be registered and used in your playbooks.
+  - With I(records), the created, updated and deleted records are returned in "created", "updated" and "deleted".
   
 requirements: [ urllib, urllib2, hashlib, hmac ]
 author: Brice Burgess
@@ -107,6 +144,23 @@ EXAMPLES = '''
   
 # delete a record / ensure it is absent
 - dnsmadeeasy: account_key=key account_secret=secret domain=my.com state=absent record_name="test"
+
+# make the A and MX records of a domain match a list, removing all others
+- local_action:
+    module: dnsmadeeasy
+    account_key: key
+    account_secret: secret
+    domain: my.com
+    state: present
+    purge: yes
+    records:
+      - { name: www, type: A, value: 192.168.0.1 }
+      - { name: www, type: A, value: 192.168.0.2 }
+      - { name: '', type: MX, value: mail.my.com., ttl: 3600 }
+
+# create many records, downloading the record list only once
+- local_action: dnsmadeeasy account_key=key account_secret=secret domain=my.com state=present record_name="{{ item.name }}" record_type="A" record_value="{{ item.ip }}" cache_dir=~/.ansible/dnsmadeeasy
+  with_items: hosts
 '''
 
 # ============================================
@@ -119,13 +173,55 @@ try:
     from time import strftime, gmtime
     import hashlib
     import hmac
+    import os
+    import tempfile
+    import time
+    import fcntl
 except ImportError, e:
     IMPORT_ERROR = str(e)
 
+class RateLimiter:
+    """Token bucket allowing rate requests per period seconds.
+
+    Waits for a token instead of letting the API reject the request, and
+    drops its tokens to what the API reports as remaining so that requests
+    made by other clients of the account are accounted for.
+    """
+
+    def __init__(self, rate, period=300):
+        self.capacity = float(rate)
+        self.fill_rate = float(rate) / period
+        self.tokens = self.capacity
+        self.timestamp = time.time()
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.fill_rate)
+        self.timestamp = now
+
+    def consume(self):
+        self._refill()
+        if self.tokens < 1:
+            time.sleep((1 - self.tokens) / self.fill_rate)
+            self._refill()
+        self.tokens -= 1
+
+    def remaining(self, count):
+        self._refill()
+        self.tokens = min(self.tokens, float(count))
+
+
+# records sent per multi-record request; multi-delete passes the IDs in the
+# query string, which keeps URLs at a reasonable length
+MULTI_BATCH_SIZE = 200
+
 class DME2:
 
-    def __init__(self, apikey, secret, domain, module):
+    def __init__(self, apikey, secret, domain, module, cache_dir=None, cache_ttl=300, rate_limit=150):
         self.module = module
+        self.limiter = RateLimiter(rate_limit)
+        self.cache_dir = cache_dir and os.path.expanduser(cache_dir)
+        self.cache_ttl = cache_ttl
 
         self.api = apikey
         self.secret = secret
@@ -161,7 +257,10 @@ class DME2:
         if data and not isinstance(data, basestring):
             data = urllib.urlencode(data)
 
+        self.limiter.consume()
         response, info = fetch_url(self.module, url, data=data, method=method, headers=self._headers())
+        if 'x-dnsme-requestsremaining' in info:
+            self.limiter.remaining(int(info['x-dnsme-requestsremaining']))
         if info['status'] not in (200, 201, 204):
             self.module.fail_json(msg="%s returned %s, with body: %s" % (url, info['status'], info['msg']))
 
@@ -201,12 +300,21 @@ class DME2:
         return self.query(self.record_url, 'GET')['data']
 
     def _instMap(self, type):
-        #@TODO cache this call so it's executed only once per ansible execution
+        entries = None
+        if self.cache_dir:
+            cache = self._readCache(type)
+            if cache is not None:
+                entries = cache['data']
+
+        if entries is None:
+            # e.g. self.getDomains() || self.getRecords()
+            entries = getattr(self, 'get' + type.title() + 's')()
+            if self.cache_dir:
+                self._writeCache(type, {'expires': time.time() + self.cache_ttl, 'data': entries})
+
         map = {}
         results = {}
-
-        # iterate over e.g. self.getDomains() || self.getRecords()
-        for result in getattr(self, 'get' + type.title() + 's')():
+        for result in entries:
 
             map[result['name']] = result['id']
             results[result['id']] = result
@@ -215,20 +323,168 @@ class DME2:
         setattr(self, type + '_map', map)
         setattr(self, type + 's', results)  # e.g. self.domains || self.records
 
+    def _cachePath(self, type):
+        # keyed by account, and by domain ID for records
+        account = hashlib.sha1(self.api).hexdigest()
+        if type == 'domain':
+            name = 'dnsmadeeasy-%s-domains.json' % account
+        else:
+            name = 'dnsmadeeasy-%s-%s-records.json' % (account, self.domain)
+        return os.path.join(self.cache_dir, name)
+
+    def _readCache(self, type):
+        try:
+            f = open(self._cachePath(type))
+            try:
+                cache = json.load(f)
+            finally:
+                f.close()
+        except (IOError, ValueError):
+            return None
+
+        if cache.get('expires', 0) < time.time():
+            return None
+        return cache
+
+    def _writeCache(self, type, cache):
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir, 0700)
+
+        # write to a temporary file and rename it so that readers never see
+        # a partially written cache
+        fd, path = tempfile.mkstemp(dir=self.cache_dir)
+        f = os.fdopen(fd, 'w')
+        try:
+            json.dump(cache, f)
+        finally:
+            f.close()
+        os.rename(path, self._cachePath(type))
+
+    def _cacheRecord(self, record_id, record):
+        # apply a created or updated record, or a deleted one if record is
+        # None, to the maps and the cache without refetching the domain
+        if record is None:
+            self._cacheRecords([record_id], [])
+        else:
+            self._cacheRecords([record_id], [record])
+
+    def _cacheRecords(self, record_ids, records):
+        # drop the records with the given IDs, then add the given records
+        record_ids = set(record_ids)
+        if self.record_map is not None:
+            for name, id in self.record_map.items():
+                if id in record_ids:
+                    del self.record_map[name]
+            for record_id in record_ids:
+                self.records.pop(record_id, None)
+            for record in records:
+                self.record_map[record['name']] = record['id']
+                self.records[record['id']] = record
+
+        if not self.cache_dir:
+            return
+
+        # hold a lock across the read and the write so that tasks running in
+        # parallel against the same domain do not lose each other's changes
+        lock = open(self._cachePath('record') + '.lock', 'w')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            cache = self._readCache('record')
+            if cache is None:
+                return
+            cache['data'] = [r for r in cache['data'] if r['id'] not in record_ids]
+            cache['data'].extend(records)
+            self._writeCache('record', cache)
+        finally:
+            lock.close()
+
     def prepareRecord(self, data):
         return json.dumps(data, separators=(',', ':'))
 
     def createRecord(self, data):
-        #@TODO update the cache w/ resultant record + id when impleneted
-        return self.query(self.record_url, 'POST', data)
+        record = self.query(self.record_url, 'POST', data)
+        if record.get('id'):
+            self._cacheRecord(record['id'], record)
+        return record
 
     def updateRecord(self, record_id, data):
-        #@TODO update the cache w/ resultant record + id when impleneted
-        return self.query(self.record_url + '/' + str(record_id), 'PUT', data)
+        result = self.query(self.record_url + '/' + str(record_id), 'PUT', data)
+        record = dict(self.getRecord(record_id) or {})
+        record.update(json.loads(data))
+        record['id'] = record_id
+        self._cacheRecord(record_id, record)
+        return result
 
     def deleteRecord(self, record_id):
-        #@TODO remove record from the cache when impleneted
-        return self.query(self.record_url + '/' + str(record_id), 'DELETE')
+        result = self.query(self.record_url + '/' + str(record_id), 'DELETE')
+        self._cacheRecord(record_id, None)
+        return result
+
+    def createRecords(self, records):
+        created = []
+        for i in range(0, len(records), MULTI_BATCH_SIZE):
+            batch = records[i:i + MULTI_BATCH_SIZE]
+            created.extend(self.query(self.record_url + '/createMulti', 'POST', self.prepareRecord(batch)))
+        self._cacheRecords([], created)
+        return created
+
+    def updateRecords(self, records):
+        for i in range(0, len(records), MULTI_BATCH_SIZE):
+            batch = records[i:i + MULTI_BATCH_SIZE]
+            self.query(self.record_url + '/updateMulti', 'PUT', self.prepareRecord(batch))
+        self._cacheRecords([r['id'] for r in records], records)
+
+    def deleteRecords(self, record_ids):
+        for i in range(0, len(record_ids), MULTI_BATCH_SIZE):
+            batch = record_ids[i:i + MULTI_BATCH_SIZE]
+            self.query(self.record_url + '?' + urllib.urlencode([('ids', x) for x in batch]), 'DELETE')
+        self._cacheRecords(record_ids, [])
+
+    def reconcileRecords(self, desired, purge=False):
+        # diff the desired records against one read of the domain, grouped
+        # by name and type, and return the records to create, update and
+        # delete
+        if not self.record_map:
+            self._instMap('record')
+
+        current = {}
+        for record in self.records.values():
+            current.setdefault((record['name'], record['type']), []).append(record)
+        wanted = {}
+        for record in desired:
+            wanted.setdefault((record['name'], record['type']), []).append(record)
+
+        create = []
+        update = []
+        delete = []
+        for key, records in wanted.items():
+            existing = {}
+            for r in current.get(key, []):
+                existing.setdefault(str(r['value']), []).append(r)
+            unmatched = []
+            for record in records:
+                matches = existing.get(str(record['value']))
+                if not matches:
+                    unmatched.append(record)
+                    continue
+                match = matches.pop()
+                if str(match['ttl']) != str(record['ttl']):
+                    update.append(dict(match, ttl=record['ttl']))
+            # reuse leftover records of the same name and type for the
+            # remaining values before creating new ones
+            leftover = [r for matches in existing.values() for r in matches]
+            for record in unmatched:
+                if leftover:
+                    update.append(dict(leftover.pop(), value=record['value'], ttl=record['ttl']))
+                else:
+                    create.append(record)
+            delete.extend(leftover)
+        if purge:
+            for key, records in current.items():
+                if key not in wanted:
+                    delete.extend(records)
+
+        return create, update, delete
 
 
 # ===========================================
@@ -249,20 +505,50 @@ def main():
             record_value=dict(required=False),
             record_ttl=dict(required=False, default=1800, type='int'),
             validate_certs = dict(default='yes', type='bool'),
+            cache_dir=dict(required=False),
+            cache_ttl=dict(required=False, default=300, type='int'),
+            records=dict(required=False, type='list'),
+            purge=dict(required=False, default='no', type='bool'),
+            rate_limit=dict(required=False, default=150, type='int'),
         ),
         required_together=(
             ['record_value', 'record_ttl', 'record_type']
-        )
+        ),
+        mutually_exclusive=[['record_name', 'records']]
     )
 
     if IMPORT_ERROR:
         module.fail_json(msg="Import Error: " + IMPORT_ERROR)
 
     DME = DME2(module.params["account_key"], module.params[
-               "account_secret"], module.params["domain"], module)
+               "account_secret"], module.params["domain"], module,
+               module.params["cache_dir"], module.params["cache_ttl"],
+               module.params["rate_limit"])
     state = module.params["state"]
     record_name = module.params["record_name"]
 
+    if module.params["records"] is not None:
+        if state != 'present':
+            module.fail_json(msg="records can only be used with state=present")
+
+        desired = []
+        for item in module.params["records"]:
+            if 'name' not in item or not item.get('type') or not item.get('value'):
+                module.fail_json(msg="each record must have a name, type and value")
+            desired.append({'name': item['name'], 'type': item['type'].upper(),
+                            'value': item['value'],
+                            'ttl': int(item.get('ttl', module.params["record_ttl"]))})
+
+        create, update, delete = DME.reconcileRecords(desired, module.params["purge"])
+        if delete:
+            DME.deleteRecords([r['id'] for r in delete])
+        if update:
+            DME.updateRecords(update)
+        if create:
+            create = DME.createRecords(create)
+        module.exit_json(changed=bool(create or update or delete),
+                         created=create, updated=update, deleted=delete)
+
     # Follow Keyword Controlled Behavior
     if not record_name:
         domain_records = DME.getRecords()
@@ -66,6 +66,16 @@ options:
     required: true
     default: hostname
     aliases: []
+  names:
+    description:
+      - list of entity names to perform the action on in a single NITRO bulk
+        request instead of one request per task. Every entity is attempted
+        even if some fail, and the outcome for each is returned in
+        C(results). When given, I(name) is ignored.
+    required: false
+    default: null
+    aliases: []
+    version_added: "1.9"
   type:
     description:
       - type of the entity
@@ -94,6 +104,15 @@ ansible host -m netscaler -a "nsc_host=nsc.example.com user=apiuser password=api
 
 # Disable the service local:8080
 ansible host -m netscaler -a "nsc_host=nsc.example.com user=apiuser password=apipass name=local:8080 type=service action=disable"
+
+# Drain every web backend in one request
+- local_action:
+    module: netscaler
+    nsc_host: nsc.example.com
+    user: apiuser
+    password: apipass
+    action: disable
+    names: "{{ groups['webservers'] }}"
 '''
 
 
@@ -108,6 +127,7 @@ class netscaler(object):
 
     def __init__(self, module):
         self.module = module
+        self._headers = None
 
     def http_request(self, api_endpoint, data_json={}):
         request_url = self._nsc_protocol + '://' + self._nsc_host + self._nitro_base_url + api_endpoint
@@ -116,13 +136,14 @@ class netscaler(object):
         if not len(data_json):
             data_json = None
 
-        auth = base64.encodestring('%s:%s' % (self._nsc_user, self._nsc_pass)).replace('\n', '').strip()
-        headers = {
-            'Authorization': 'Basic %s' % auth,
-            'Content-Type' : 'application/x-www-form-urlencoded',
-        }
+        if self._headers is None:
+            auth = base64.encodestring('%s:%s' % (self._nsc_user, self._nsc_pass)).replace('\n', '').strip()
+            self._headers = {
+                'Authorization': 'Basic %s' % auth,
+                'Content-Type' : 'application/x-www-form-urlencoded',
+            }
 
-        response, info = fetch_url(self.module, request_url, data=data_json, headers=headers)
+        response, info = fetch_url(self.module, request_url, data=data_json, headers=self._headers)
 
         return json.load(response)
 
@@ -140,6 +161,47 @@ class netscaler(object):
 
         return resp
 
+    def prepare_bulk_request(self, action):
+        # one config request carrying an array of entities; onerror=continue
+        # makes NITRO attempt all of them and report on each
+        resp = self.http_request(
+            'config',
+            {
+                "object": json.dumps({
+                    "params": {"action": action, "onerror": "continue"},
+                    self._type: [{"name": name} for name in self._names]
+                })
+            }
+        )
+
+        # a fully successful bulk request only carries the overall outcome,
+        # a partially failed one carries one response per entity in order
+        responses = resp.get('response')
+        if not isinstance(responses, list):
+            responses = [resp] * len(self._names)
+
+        results = {}
+        for name, r in zip(self._names, responses):
+            results[name] = {'errorcode': r.get('errorcode', 0),
+                             'message': r.get('message', '')}
+        return resp, results
+
+
+def core_bulk(module):
+    n = netscaler(module)
+    n._nsc_host = module.params.get('nsc_host')
+    n._nsc_user = module.params.get('user')
+    n._nsc_pass = module.params.get('password')
+    n._nsc_protocol = module.params.get('nsc_protocol')
+    n._names = module.params.get('names')
+    n._type = module.params.get('type')
+    action = module.params.get('action')
+
+    r, results = n.prepare_bulk_request(action)
+
+    failed = sorted(name for name in results if results[name]['errorcode'] != 0)
+    return failed, results
+
 
 def core(module):
     n = netscaler(module)
@@ -166,11 +228,26 @@ def main():
             password = dict(required=True),
             action = dict(default='enable', choices=['enable','disable']),
             name = dict(default=socket.gethostname()),
+            names = dict(type='list'),
             type = dict(default='server', choices=['service', 'server']),
             validate_certs=dict(default='yes', type='bool'),
         )
     )
 
+    if module.params.get('names') is not None:
+        if not module.params['names']:
+            module.exit_json(changed=False, results={})
+        try:
+            failed, results = core_bulk(module)
+        except Exception, e:
+            module.fail_json(msg=str(e))
+
+        changed = len(failed) < len(results)
+        if failed:
+            module.fail_json(msg="failed to %s %d of %d entities: %s" % (module.params['action'], len(failed), len(results), ', '.join(failed)),
+                             changed=changed, failed_names=failed, results=results)
+        module.exit_json(changed=changed, results=results)
+
     rc = 0
     try:
         rc, result = core(module)
@@ -85,17 +85,32 @@ import sys
 
 PACMAN_PATH = "/usr/bin/pacman"
 
-def query_package(module, name, state="present"):
-    # pacman -Q returns 0 if the package is installed,
-    # 1 if it is not installed
-    if state == "present":
-        cmd = "pacman -Q %s" % (name)
-        rc, stdout, stderr = module.run_command(cmd, check_rc=False)
+def query_installed(module):
+    # one pacman -Qq lists the names of all installed packages,
+    # instead of opening the package db once per package
+    cmd = "pacman -Qq"
+    rc, stdout, stderr = module.run_command(cmd, check_rc=False)
+
+    if rc != 0:
+        module.fail_json(msg="could not list installed packages", stderr=stderr)
+
+    return set(stdout.split())
 
-        if rc == 0:
-            return True
 
-        return False
+def query_missing(module, packages):
+    # one pacman -T prints the packages that nothing installed
+    # satisfies, either by name or through what it provides
+    if not packages:
+        return set()
+
+    cmd = "pacman -T %s" % (" ".join(packages))
+    rc, stdout, stderr = module.run_command(cmd, check_rc=False)
+
+    # 127 means some of them are missing
+    if rc not in (0, 127):
+        module.fail_json(msg="could not query packages", stderr=stderr)
+
+    return set(stdout.split())
 
 
 def update_package_db(module):
@@ -114,48 +129,49 @@ def remove_packages(module, packages):
     else:
         args = "R"
 
-    remove_c = 0
-    # Using a for loop incase of error, we can report the package that failed
-    for package in packages:
-        # Query the package first, to see if we even need to remove
-        if not query_package(module, package):
-            continue
+    # only the packages that are installed, removed in one transaction
+    installed = query_installed(module)
+    packages = [package for package in packages if package in installed]
 
-        cmd = "pacman -%s %s --noconfirm" % (args, package)
+    if packages:
+        cmd = "pacman -%s %s --noconfirm" % (args, " ".join(packages))
         rc, stdout, stderr = module.run_command(cmd, check_rc=False)
 
         if rc != 0:
-            module.fail_json(msg="failed to remove %s" % (package))
-
-        remove_c += 1
-
-    if remove_c > 0:
+            module.fail_json(msg="failed to remove %s" % (" ".join(packages)), stderr=stderr)
 
-        module.exit_json(changed=True, msg="removed %s package(s)" % remove_c)
+        module.exit_json(changed=True, msg="removed %s package(s)" % len(packages))
 
     module.exit_json(changed=False, msg="package(s) already absent")
 
 
 def install_packages(module, packages, package_files):
-    install_c = 0
+    missing = query_missing(module, packages)
 
+    # everything missing from the repositories goes into one -S
+    # transaction, and all package files into one -U transaction
+    to_install = []
+    to_upgrade = []
     for i, package in enumerate(packages):
-        if query_package(module, package):
+        if package not in missing:
             continue
 
         if package_files[i]:
-            params = '-U %s' % package_files[i]
+            to_upgrade.append(package_files[i])
         else:
-            params = '-S %s' % package
+            to_install.append(package)
+
+    for params, targets in (('-S --needed', to_install), ('-U', to_upgrade)):
+        if not targets:
+            continue
 
-        cmd = "pacman %s --noconfirm" % (params)
+        cmd = "pacman %s %s --noconfirm" % (params, " ".join(targets))
         rc, stdout, stderr = module.run_command(cmd, check_rc=False)
 
         if rc != 0:
-            module.fail_json(msg="failed to install %s" % (package))
-
-        install_c += 1
+            module.fail_json(msg="failed to install %s" % (" ".join(targets)), stderr=stderr)
 
+    install_c = len(to_install) + len(to_upgrade)
     if install_c > 0:
         module.exit_json(changed=True, msg="installed %s package(s)" % (install_c))
 
@@ -164,18 +180,23 @@ def install_packages(module, packages, package_files):
 
 def check_packages(module, packages, state):
     would_be_changed = []
+    if state == "present":
+        missing = query_missing(module, packages)
+    else:
+        installed = query_installed(module)
+
     for package in packages:
-        installed = query_package(module, package)
-        if ((state == "present" and not installed) or
-                (state == "absent" and installed)):
+        if ((state == "present" and package in missing) or
+                (state == "absent" and package in installed)):
             would_be_changed.append(package)
+
     if would_be_changed:
         if state == "absent":
             state = "removed"
         module.exit_json(changed=True, msg="%s package(s) would be %s" % (
             len(would_be_changed), state))
     else:
-        module.exit_json(change=False, msg="package(s) already %s" % state)
+        module.exit_json(changed=False, msg="package(s) already %s" % state)
 
 
 def main():
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# This file is part of Ansible
+#
+# Ansible is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Ansible is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Ansible.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Offline benchmark for the bigip_facts module.
+
+Runs the bigip_facts fact collection engine against a stub iControl
+endpoint instead of a BIG-IP, so that a change to the module can be
+measured without a device. The stub stands in for bigsuds: every call
+sleeps for the configured latency, then answers with a synthetic response
+sized by the configured object count, or with a recorded response.
+
+Recorded responses are read from a JSON file mapping the iControl method
+path to its response, e.g.
+
+    {"LocalLB.VirtualServer.get_list": ["/Common/vs1", "/Common/vs2"],
+     "LocalLB.VirtualServer.get_destination": [...]}
+
+Methods that are not in the file fall back to synthetic responses.
+
+For every fact category the wall time and the number of iControl round
+trips are reported, followed by the totals, the number of calls the stub
+answered including session setup, and the peak resident memory of the
+process.
+
+Usage:
+    python test/bigip_facts_bench.py --objects 500 --latency 20 \\
+        --include virtual_server,pool --workers 4
+"""
+
+import imp
+import optparse
+import os
+import sys
+import threading
+import time
+import types
+try:
+    import json
+except ImportError:
+    import simplejson as json
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '..', 'net_infrastructure', 'bigip_facts.py')
+
+INCLUDES = ('address_class', 'certificate', 'client_ssl_profile',
+            'device_group', 'interface', 'key', 'node', 'pool', 'rule',
+            'self_ip', 'software', 'stats', 'system_info', 'traffic_group',
+            'trunk', 'virtual_address', 'virtual_server', 'vlan')
+
+# iControl methods returning the object names of a fact category
+LIST_METHODS = ('get_list', 'get_address_class_list')
+
+
+class MethodNotFound(Exception):
+    pass
+
+
+class OperationFailed(Exception):
+    pass
+
+
+class StubEndpoint(object):
+    """Stub iControl endpoint class.
+
+    Answers iControl calls with recorded or synthetic responses after a
+    fixed latency, counting the calls made.
+
+    Attributes:
+        objects: Number of objects in every object list.
+        latency: Seconds each call takes.
+        recorded: Dictionary of method path to recorded response.
+        calls: Number of calls answered.
+    """
+
+    def __init__(self, objects=100, latency=0, recorded=None):
+        self.objects = objects
+        self.latency = latency
+        self.recorded = recorded or {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def call(self, path, args, kwargs):
+        self.lock.acquire()
+        try:
+            self.calls += 1
+        finally:
+            self.lock.release()
+        if self.latency:
+            time.sleep(self.latency)
+        method = '.'.join(path)
+        if method in self.recorded:
+            return self.recorded[method]
+        return self.respond(path[-1], list(args) + list(kwargs.values()))
+
+    def respond(self, name, args):
+        if name in LIST_METHODS:
+            return ['/Common/object_%d' % i for i in range(self.objects)]
+        if name == 'get_active_folder':
+            return '/Common'
+        if name == 'get_recursive_query_state':
+            return 'STATE_DISABLED'
+        if name.startswith('set_'):
+            return None
+        if name == 'get_certificate_list':
+            return [{'certificate': {'cert_info': {'id': 'cert_%d' % i}},
+                     'file_name': 'cert_%d.crt' % i}
+                    for i in range(self.objects)]
+        if name == 'get_key_list':
+            return [{'key_info': {'id': 'key_%d' % i}, 'file_name': 'key_%d.key' % i}
+                    for i in range(self.objects)]
+        if name == 'get_all_software_status':
+            return [{'installation_id': {'install_volume': 'HD1.%d' % i},
+                     'status': 'complete'} for i in range(self.objects)]
+        if name == 'query_rule':
+            return [{'rule_name': x, 'rule_definition': 'when HTTP_REQUEST {}'}
+                    for x in args[0]]
+        if name == 'get_address_class':
+            return [{'name': x, 'members': [{'address': '10.0.0.1',
+                                             'netmask': '255.255.255.255'}]}
+                    for x in args[0]]
+        if name == 'get_address_class_member_data_value':
+            return [['value'] for x in args[0]]
+        if name == 'get_statistics':
+            return {'statistics': [{'virtual_server': {'name': x},
+                                    'statistics': self.statistics()}
+                                   for x in args[0]]}
+        if name == 'get_all_member_statistics':
+            return [{'statistics': [{'member': {'address': '10.0.0.1', 'port': 80},
+                                     'statistics': self.statistics()}]}
+                    for x in args[0]]
+        if name == 'get_global_cpu_usage_extended_information':
+            return {'statistics': [{'type': 'STATISTIC_CPU_INFO_ONE_MIN_AVG_USER',
+                                    'value': {'high': 0, 'low': 10}}]}
+        if args and isinstance(args[0], list):
+            return ['%s %s' % (name[4:], x) for x in args[0]]
+        return name[4:]
+
+    def statistics(self):
+        return [{'type': 'STATISTIC_TOTAL_REQUESTS',
+                 'value': {'high': 0, 'low': int(time.time())}}]
+
+
+class StubInterface(object):
+    """Stub iControl namespace, interface or method."""
+
+    def __init__(self, endpoint, path):
+        self.endpoint = endpoint
+        self.path = path
+
+    def __getattr__(self, name):
+        return StubInterface(self.endpoint, self.path + [name])
+
+    def __call__(self, *args, **kwargs):
+        return self.endpoint.call(self.path, args, kwargs)
+
+
+def install_stub_bigsuds(endpoint):
+    """Make the bigsuds and suds imports of bigip_facts use the stub."""
+    bigsuds = types.ModuleType('bigsuds')
+    suds = types.ModuleType('suds')
+
+    class BIGIP(StubInterface):
+        def __init__(self, hostname=None, username=None, password=None, **kwargs):
+            StubInterface.__init__(self, endpoint, [])
+
+        def with_session_id(self, session_id=None):
+            return self
+
+    bigsuds.BIGIP = BIGIP
+    bigsuds.OperationFailed = OperationFailed
+    suds.MethodNotFound = MethodNotFound
+    sys.modules['bigsuds'] = bigsuds
+    sys.modules['suds'] = suds
+
+
+def load_bigip_facts(path):
+    # the module calls main() at import time, as all modules do; load it
+    # without that call so that its classes can be driven directly
+    source = open(path).read()
+    source = source[:source.rindex('\nmain()')]
+    module = imp.new_module('bigip_facts')
+    module.__file__ = path
+    exec compile(source, path, 'exec') in module.__dict__
+    return module
+
+
+def run(bigip_facts, endpoint, include, workers):
+    collector = bigip_facts.FactCollector('bench', 'admin', 'admin',
+                                          max_workers=workers, timing=True)
+    scopes = dict((name, bigip_facts.QueryScope()) for name in include)
+    start = time.time()
+    facts = collector.collect(include, scopes)
+    elapsed = time.time() - start
+    report = {'categories': {}, 'seconds': round(elapsed, 4),
+              'round_trips': 0, 'calls': endpoint.calls,
+              'peak_memory': bigip_facts.get_peak_memory()}
+    for name in include:
+        profile = dict(collector.profile[name], objects=len(facts[name]))
+        report['categories'][name] = profile
+        report['round_trips'] += profile['round_trips']
+    return report
+
+
+def print_report(report, include):
+    print '%-20s %8s %12s %10s' % ('category', 'objects', 'round trips', 'seconds')
+    for name in include:
+        profile = report['categories'][name]
+        print '%-20s %8d %12d %10.4f' % (name, profile['objects'],
+                                         profile['round_trips'], profile['seconds'])
+    print '%-20s %8s %12d %10.4f' % ('total', '', report['round_trips'],
+                                     report['seconds'])
+    print 'iControl calls including session setup: %d' % report['calls']
+    if report['peak_memory'] is not None:
+        print 'peak memory: %.1f MiB' % (report['peak_memory'] / 1048576.0)
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option('--objects', type='int', default=100,
+                      help='objects per fact category (default: %default)')
+    parser.add_option('--latency', type='float', default=10,
+                      help='milliseconds per iControl call (default: %default)')
+    parser.add_option('--include', default=','.join(INCLUDES),
+                      help='comma separated fact categories (default: all)')
+    parser.add_option('--workers', type='int', default=1,
+                      help='max_workers of the collector (default: %default)')
+    parser.add_option('--replay', metavar='FILE',
+                      help='JSON file of recorded responses by method path')
+    parser.add_option('--module', default=MODULE_PATH,
+                      help='path of the bigip_facts module to measure')
+    parser.add_option('--json', action='store_true', default=False,
+                      help='print the report as JSON')
+    options, args = parser.parse_args()
+
+    include = [x.strip() for x in options.include.split(',') if x.strip()]
+    unknown = [x for x in include if x not in INCLUDES]
+    if unknown:
+        parser.error('unknown fact categories: %s' % ','.join(unknown))
+
+    recorded = None
+    if options.replay:
+        recorded = json.load(open(options.replay))
+
+    endpoint = StubEndpoint(options.objects, options.latency / 1000.0, recorded)
+    install_stub_bigsuds(endpoint)
+    bigip_facts = load_bigip_facts(options.module)
+    report = run(bigip_facts, endpoint, include, options.workers)
+
+    if options.json:
+        print json.dumps(report, indent=4, sort_keys=True)
+    else:
+        print_report(report, include)
+
+
+if __name__ == '__main__':
+    main()